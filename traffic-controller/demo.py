@@ -2,9 +2,7 @@
 Quick demo script to see the simulation in action.
 Runs a short 5-minute simulation with both controllers.
 """
-from simulation.models import Direction, ArrivalProcess
-from simulation.controllers import FixedTimerController, AdaptiveCountController
-from simulation.simulator import TrafficSimulator
+from simulation.scenario import load_scenario
 
 
 def run_demo():
@@ -15,13 +13,9 @@ def run_demo():
     print("\nThis demo runs a 5-minute simulation with both controllers.")
     print("For full experiments and visualizations, run: python run_experiments.py\n")
     
-    # Define traffic scenario
-    arrival_rates = {
-        Direction.NORTH: 0.4,   # Busy direction
-        Direction.SOUTH: 0.3,   # Moderate
-        Direction.EAST: 0.2,    # Light
-        Direction.WEST: 0.15,   # Light
-    }
+    # Traffic scenario: NS busier than EW (scenarios/asymmetric.json)
+    scenario = load_scenario('asymmetric')
+    arrival_rates = scenario.arrival_rates
     
     print("Traffic Arrival Rates (vehicles/second):")
     for direction, rate in arrival_rates.items():
@@ -35,14 +29,7 @@ def run_demo():
     print("Running Fixed-Timer Controller...")
     print("-" * 70)
     
-    controller_fixed = FixedTimerController(green_time=20.0, yellow_time=3.0)
-    arrival_process_fixed = ArrivalProcess(arrival_rates, seed=42)
-    sim_fixed = TrafficSimulator(
-        controller=controller_fixed,
-        arrival_process=arrival_process_fixed,
-        saturation_flow=1.0,
-        dt=1.0
-    )
+    sim_fixed = scenario.build_simulator('fixed', seed=scenario.seeds[0])
     sim_fixed.run(duration)
     sim_fixed.print_summary()
     
@@ -51,21 +38,7 @@ def run_demo():
     print("Running Adaptive Controller...")
     print("-" * 70)
     
-    controller_adaptive = AdaptiveCountController(
-        min_green=5.0,
-        max_green=30.0,
-        yellow_time=3.0,
-        extension_threshold=2,
-        max_wait_time=90.0,
-        max_skips=3
-    )
-    arrival_process_adaptive = ArrivalProcess(arrival_rates, seed=42)
-    sim_adaptive = TrafficSimulator(
-        controller=controller_adaptive,
-        arrival_process=arrival_process_adaptive,
-        saturation_flow=1.0,
-        dt=1.0
-    )
+    sim_adaptive = scenario.build_simulator('adaptive', seed=scenario.seeds[0])
     sim_adaptive.run(duration)
     sim_adaptive.print_summary()
     
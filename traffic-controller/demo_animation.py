@@ -2,10 +2,10 @@
 Demo script for animated traffic signal simulation.
 Shows real-time visualization of both Fixed-Timer and Adaptive AI controllers.
 """
-from simulation.models import Direction, ArrivalProcess
-from simulation.controllers import FixedTimerController, AdaptiveCountController
-from simulation.simulator import TrafficSimulator
+from simulation.models import Direction
+from simulation.scenario import load_scenario, list_scenarios, DEFAULT_SCENARIO
 from simulation.animation import create_animation
+from simulation.comparison_animation import render_scenario_comparison
 import sys
 import time
 
@@ -20,51 +20,36 @@ def print_banner():
 
 
 def get_traffic_scenario():
-    """Let user select a predefined traffic scenario."""
+    """Let user select a scenario file from scenarios/ (or custom rates)."""
+    names = list_scenarios()
+    scenarios = [load_scenario(name) for name in names]
+    default = str(names.index(DEFAULT_SCENARIO) + 1) if DEFAULT_SCENARIO in names else "1"
+    
     print("\n" + "-"*70)
     print("SELECT TRAFFIC SCENARIO:")
     print("-"*70)
-    print("  1. Balanced Traffic (all directions equal)")
-    print("  2. Rush Hour North (heavy northbound traffic)")
-    print("  3. Asymmetric (varying loads)")
-    print("  4. Light Traffic (low volume)")
-    print("  5. Custom (enter your own rates)")
-    
-    scenario_choice = input("\nEnter scenario (1-5) [default: 3]: ").strip() or "3"
-    
-    scenarios = {
-        "1": {
-            "name": "Balanced Traffic",
-            "rates": {Direction.NORTH: 0.3, Direction.SOUTH: 0.3, 
-                     Direction.EAST: 0.3, Direction.WEST: 0.3}
-        },
-        "2": {
-            "name": "Rush Hour North",
-            "rates": {Direction.NORTH: 0.6, Direction.SOUTH: 0.2, 
-                     Direction.EAST: 0.15, Direction.WEST: 0.15}
-        },
-        "3": {
-            "name": "Asymmetric Traffic",
-            "rates": {Direction.NORTH: 0.4, Direction.SOUTH: 0.3, 
-                     Direction.EAST: 0.2, Direction.WEST: 0.15}
-        },
-        "4": {
-            "name": "Light Traffic",
-            "rates": {Direction.NORTH: 0.1, Direction.SOUTH: 0.1, 
-                     Direction.EAST: 0.1, Direction.WEST: 0.1}
-        }
-    }
-    
-    if scenario_choice == "5":
+    for i, scenario in enumerate(scenarios, 1):
+        print(f"  {i}. {scenario.title} ({scenario.description.lower()})")
+    custom_choice = str(len(scenarios) + 1)
+    print(f"  {custom_choice}. Custom (enter your own rates)")
+    
+    scenario_choice = input(f"\nEnter scenario (1-{custom_choice}) [default: {default}]: ").strip() or default
+    
+    if scenario_choice == custom_choice:
         print("\nEnter arrival rates (vehicles/second):")
         rates = {}
         for direction in Direction:
             rate_input = input(f"  {direction.value}: ").strip()
             rates[direction] = float(rate_input) if rate_input else 0.3
-        return "Custom Scenario", rates
+        scenario = load_scenario(DEFAULT_SCENARIO)
+        scenario.arrival_rates = rates
+        return "Custom Scenario", rates, scenario
     
-    scenario = scenarios.get(scenario_choice, scenarios["3"])
-    return scenario["name"], scenario["rates"]
+    index = int(scenario_choice) - 1 if scenario_choice.isdigit() else -1
+    if not 0 <= index < len(scenarios):
+        index = int(default) - 1
+    scenario = scenarios[index]
+    return scenario.title, scenario.arrival_rates, scenario
 
 
 def get_controller_choice():
@@ -74,7 +59,7 @@ def get_controller_choice():
     print("-"*70)
     print("  1. Fixed-Timer Controller (traditional)")
     print("  2. Adaptive AI Controller (intelligent)")
-    print("  3. Side-by-Side Comparison (both sequential)")
+    print("  3. Side-by-Side Comparison (one GIF, panels rendered in parallel)")
     
     choice = input("\nEnter choice (1/2/3) [default: 3]: ").strip() or "3"
     return choice
@@ -92,7 +77,7 @@ def get_simulation_parameters():
     speed_input = input("  Animation speed multiplier (1.0=real-time, 2.0=2x) [default: 1.5]: ").strip()
     speed = float(speed_input) if speed_input else 1.5
     
-    save_choice = input("  Save animation as GIF? (y/n) [default: n]: ").strip().lower()
+    save_choice = input("  Save animation as GIF? (y/n, comparisons are always saved) [default: n]: ").strip().lower()
     save_animation = save_choice == 'y'
     
     return duration, speed, save_animation
@@ -111,21 +96,15 @@ def print_scenario_info(scenario_name, arrival_rates, duration, speed):
     print(f"{'='*70}\n")
 
 
-def run_simulation(controller, arrival_rates, duration, speed, save_path, controller_name):
-    """Run a single simulation with given parameters."""
+def run_simulation(scenario, label, duration, speed, save_path, controller_name):
+    """Run one of the scenario's controllers on its first seed."""
     print(f"\n{'─'*70}")
     print(f"▶ Running: {controller_name}")
     print(f"{'─'*70}")
     
     start_time = time.time()
     
-    arrival_process = ArrivalProcess(arrival_rates, seed=42)
-    simulator = TrafficSimulator(
-        controller=controller,
-        arrival_process=arrival_process,
-        saturation_flow=1.0,
-        dt=1.0
-    )
+    simulator = scenario.build_simulator(label, seed=scenario.seeds[0])
     
     animator = create_animation(simulator, duration, speed, save_path)
     
@@ -143,6 +122,27 @@ def run_simulation(controller, arrival_rates, duration, speed, save_path, contro
     return simulator.metrics
 
 
+def run_comparison(scenario, duration, speed, save_path):
+    """Render both controllers side by side on one shared arrival stream."""
+    print(f"\n{'─'*70}")
+    print(f"▶ Rendering: Fixed-Timer vs Adaptive AI (in parallel)")
+    print(f"{'─'*70}")
+    
+    start_time = time.time()
+    
+    metrics_fixed, metrics_adaptive = render_scenario_comparison(
+        scenario, ['fixed', 'adaptive'], duration, save_path,
+        seed=scenario.seeds[0],
+        titles=["Fixed-Timer Controller", "Adaptive AI Controller"],
+        speed_multiplier=speed
+    )
+    
+    elapsed = time.time() - start_time
+    print(f"\n✓ Comparison saved to {save_path}")
+    print(f"Execution Time: {elapsed:.1f}s")
+    return metrics_fixed, metrics_adaptive
+
+
 def print_comparison(metrics_fixed, metrics_adaptive):
     """Print comparison between two controllers."""
     print(f"\n{'='*70}")
@@ -189,7 +189,7 @@ def main():
     print_banner()
     
     # Get user inputs
-    scenario_name, arrival_rates = get_traffic_scenario()
+    scenario_name, arrival_rates, scenario = get_traffic_scenario()
     choice = get_controller_choice()
     duration, speed, save_animation = get_simulation_parameters()
     
@@ -200,26 +200,22 @@ def main():
     metrics_fixed = None
     metrics_adaptive = None
     
-    if choice in ['1', '3']:
-        controller = FixedTimerController(green_time=20.0, yellow_time=3.0)
+    if choice == '3':
+        metrics_fixed, metrics_adaptive = run_comparison(
+            scenario, duration, speed, "comparison_animation.gif"
+        )
+    
+    if choice == '1':
         save_path = "fixed_timer_animation.gif" if save_animation else None
         metrics_fixed = run_simulation(
-            controller, arrival_rates, duration, speed, save_path,
+            scenario, 'fixed', duration, speed, save_path,
             "Fixed-Timer Controller"
         )
     
-    if choice in ['2', '3']:
-        controller = AdaptiveCountController(
-            min_green=5.0,
-            max_green=30.0,
-            yellow_time=3.0,
-            extension_threshold=2,
-            max_wait_time=90.0,
-            max_skips=3
-        )
+    if choice == '2':
         save_path = "adaptive_animation.gif" if save_animation else None
         metrics_adaptive = run_simulation(
-            controller, arrival_rates, duration, speed, save_path,
+            scenario, 'adaptive', duration, speed, save_path,
             "Adaptive AI Controller"
         )
     
@@ -230,7 +226,7 @@ def main():
     # Final message
     print("\n" + "="*70)
     print("✓ SIMULATION COMPLETE!")
-    if save_animation:
+    if save_animation or choice == '3':
         print("\n📁 Animation(s) saved as GIF file(s) in the current directory.")
     print("\n💡 Tip: Try different scenarios to see how controllers adapt!")
     print("="*70 + "\n")
@@ -0,0 +1,243 @@
+"""
+Interactive scenario explorer.
+
+Pick a scenario and controller and move the parameter sliders; each setting
+is served from the run cache (results/run_cache) when it has been simulated
+before, and otherwise simulated in background worker processes while the
+window stays responsive. Plots update as runs arrive, and neighbouring
+slider values are prefetched, so sweeping a parameter costs one fast run per
+new value instead of one animation.
+
+Usage:
+    python explore.py                 # open the explorer
+    python explore.py --precompute    # fill the cache with a parameter grid first
+"""
+import argparse
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.widgets import RadioButtons, Slider
+from simulation.run_cache import RunCache, RunSpec, BackgroundRunner
+from simulation.scenario import load_scenario, list_scenarios, DEFAULT_SCENARIO
+
+# Arrival rates of the scenarios in scenarios/, by title
+SCENARIOS = {scenario.title: scenario.arrival_rates for scenario in map(load_scenario, list_scenarios())}
+
+# Slider definitions per controller: name -> (min, max, default, step)
+PARAMETERS = {
+    'fixed': {
+        'green_time': (5.0, 60.0, 20.0, 1.0),
+    },
+    'adaptive': {
+        'min_green': (2.0, 20.0, 5.0, 1.0),
+        'max_green': (10.0, 90.0, 30.0, 5.0),
+        'extension_threshold': (0.0, 10.0, 2.0, 1.0),
+    },
+}
+# Parameter on the x axis of the sweep plot
+SWEEP_PARAMETER = {'fixed': 'green_time', 'adaptive': 'max_green'}
+DURATIONS = (300.0, 3600.0, 1800.0, 300.0)
+POLL_INTERVAL_MS = 150
+HISTORY = 5  # Previous variants kept (faded) on the queue plot
+
+
+def parameter_grid(controller: str):
+    """Values of the sweep parameter, other parameters at their defaults."""
+    sweep = SWEEP_PARAMETER[controller]
+    low, high, _, step = PARAMETERS[controller][sweep]
+    defaults = {name: spec[2] for name, spec in PARAMETERS[controller].items()}
+    return [dict(defaults, **{sweep: value}) for value in np.arange(low, high + step / 2, step)]
+
+
+def precompute(runner: BackgroundRunner, duration: float, seed: int = 0):
+    """Simulate the sweep grid of every scenario and controller into the cache."""
+    specs = [
+        RunSpec.create(controller, params, rates, duration, seed)
+        for rates in SCENARIOS.values()
+        for controller in PARAMETERS
+        for params in parameter_grid(controller)
+    ]
+    missing = [spec for spec in specs if spec not in runner.cache]
+    print(f"{len(specs) - len(missing)} of {len(specs)} runs cached; simulating {len(missing)}...")
+    runner.prefetch(missing)
+    done = 0
+    while runner.pending:
+        done += len(runner.poll())
+        time.sleep(0.2)
+    print(f"Done ({done} new runs).")
+
+
+class Explorer:
+    """Widgets, plots and the polling loop of the explorer window."""
+
+    def __init__(self, runner: BackgroundRunner):
+        self.runner = runner
+        self.history = []  # Recently shown results, newest last
+        self.fig = plt.figure(figsize=(14, 8))
+        self.fig.canvas.manager.set_window_title('Traffic Signal Scenario Explorer')
+
+        # Controls on the left
+        self.scenario_radio = RadioButtons(self.fig.add_axes([0.02, 0.68, 0.18, 0.22]),
+                                           list(SCENARIOS),
+                                           active=list(SCENARIOS).index(load_scenario(DEFAULT_SCENARIO).title))
+        self.controller_radio = RadioButtons(self.fig.add_axes([0.02, 0.52, 0.18, 0.12]),
+                                             list(PARAMETERS), active=1)
+        self.sliders = {}
+        slot = 0
+        for controller, parameters in PARAMETERS.items():
+            for name, (low, high, default, step) in parameters.items():
+                ax = self.fig.add_axes([0.12, 0.44 - 0.05 * slot, 0.09, 0.03])
+                self.sliders[controller, name] = Slider(ax, name, low, high, valinit=default, valstep=step)
+                slot += 1
+        low, high, default, step = DURATIONS
+        self.duration_slider = Slider(self.fig.add_axes([0.12, 0.44 - 0.05 * slot, 0.09, 0.03]),
+                                      'duration', low, high, valinit=default, valstep=step)
+        self.seed_slider = Slider(self.fig.add_axes([0.12, 0.39 - 0.05 * slot, 0.09, 0.03]),
+                                  'seed', 0, 9, valinit=0, valstep=1)
+
+        # Plots on the right
+        self.ax_queue = self.fig.add_axes([0.28, 0.56, 0.68, 0.36])
+        self.ax_cdf = self.fig.add_axes([0.28, 0.08, 0.31, 0.38])
+        self.ax_sweep = self.fig.add_axes([0.65, 0.08, 0.31, 0.38])
+        self.status = self.fig.text(0.28, 0.97, '', fontsize=10, family='monospace')
+
+        self.scenario_radio.on_clicked(lambda _: self.refresh())
+        self.controller_radio.on_clicked(lambda _: self.refresh())
+        for slider in (*self.sliders.values(), self.duration_slider, self.seed_slider):
+            slider.on_changed(lambda _: self.refresh())
+
+        self.timer = self.fig.canvas.new_timer(interval=POLL_INTERVAL_MS)
+        self.timer.add_callback(self.poll)
+        self.timer.start()
+        self.refresh()
+
+    # Specs -------------------------------------------------------------
+
+    def current_params(self, controller: str = None) -> dict:
+        controller = controller or self.controller_radio.value_selected
+        return {name: self.sliders[controller, name].val for name in PARAMETERS[controller]}
+
+    def spec_for(self, params: dict, controller: str = None) -> RunSpec:
+        return RunSpec.create(
+            controller or self.controller_radio.value_selected,
+            params,
+            SCENARIOS[self.scenario_radio.value_selected],
+            self.duration_slider.val,
+            int(self.seed_slider.val),
+        )
+
+    def sweep_specs(self):
+        """Specs along the sweep parameter around the current setting."""
+        controller = self.controller_radio.value_selected
+        sweep = SWEEP_PARAMETER[controller]
+        low, high, _, step = PARAMETERS[controller][sweep]
+        params = self.current_params()
+        return [self.spec_for(dict(params, **{sweep: value}))
+                for value in np.arange(low, high + step / 2, step)]
+
+    # Updates -----------------------------------------------------------
+
+    def refresh(self):
+        """Show the current setting, simulating it in the background if needed."""
+        self.current = self.spec_for(self.current_params())
+        result = self.runner.request(self.current)
+        if result is not None:
+            self.show(result)
+        # Prefetch the neighbouring values of the sweep parameter
+        sweep = self.sweep_specs()
+        index = next((i for i, spec in enumerate(sweep) if spec == self.current), None)
+        if index is not None:
+            self.runner.prefetch(sweep[max(0, index - 1):index + 2])
+        self.draw_sweep()
+        self.update_status(result)
+
+    def poll(self):
+        """Timer callback: pick up finished background runs."""
+        finished = self.runner.poll()
+        if not finished:
+            return
+        for result in finished:
+            if result.spec == self.current:
+                self.show(result)
+        self.draw_sweep()
+        self.update_status(self.runner.cache.get(self.current))
+
+    def update_status(self, result):
+        if result is None:
+            state = 'simulating...'
+        else:
+            state = 'from cache' if result.cached else 'simulated'
+        self.status.set_text(f'Current run: {state}    background runs pending: {self.runner.pending}')
+        self.fig.canvas.draw_idle()
+
+    def show(self, result):
+        """Redraw the queue and wait-time plots for a result."""
+        self.history = [r for r in self.history if r.spec != result.spec][-(HISTORY - 1):] + [result]
+
+        self.ax_queue.clear()
+        for age, previous in enumerate(reversed(self.history)):
+            times = np.arange(len(previous.queue_totals)) * previous.dt
+            label = ', '.join(f'{k}={v:g}' for k, v in previous.spec.params)
+            self.ax_queue.plot(times, previous.queue_totals, linewidth=1.2 if age == 0 else 0.8,
+                               alpha=1.0 if age == 0 else 0.35,
+                               label=f'{previous.spec.controller}: {label}')
+        self.ax_queue.set_xlabel('Time (s)')
+        self.ax_queue.set_ylabel('Total queue (vehicles)')
+        summary = result.summary
+        self.ax_queue.set_title(
+            f"{self.scenario_radio.value_selected}: avg wait {summary['avg_wait_time']:.1f}s, "
+            f"p95 {summary['p95_wait_time']:.1f}s, max queue {summary['max_queue_total']}, "
+            f"throughput {summary['throughput']:.3f} veh/s", fontsize=10)
+        self.ax_queue.legend(fontsize=8, loc='upper left')
+        self.ax_queue.grid(True, alpha=0.3)
+
+        self.ax_cdf.clear()
+        for age, previous in enumerate(reversed(self.history)):
+            histogram = previous.wait_histogram
+            self.ax_cdf.step(histogram.values(), np.cumsum(histogram.counts) / max(1, histogram.count), where='post',
+                             alpha=1.0 if age == 0 else 0.35, linewidth=1.2 if age == 0 else 0.8)
+        self.ax_cdf.set_xlabel('Wait time (s)')
+        self.ax_cdf.set_ylabel('Fraction of vehicles')
+        self.ax_cdf.set_title('Wait-time CDF', fontsize=10)
+        self.ax_cdf.grid(True, alpha=0.3)
+
+    def draw_sweep(self):
+        """Average wait along the sweep parameter, for every value already available."""
+        controller = self.controller_radio.value_selected
+        sweep = SWEEP_PARAMETER[controller]
+        points = []
+        for spec in self.sweep_specs():
+            result = self.runner.cache.get(spec) if spec in self.runner.cache else None
+            if result is not None:
+                points.append((dict(spec.params)[sweep], result.summary['avg_wait_time']))
+        self.ax_sweep.clear()
+        if points:
+            x, y = np.array(points).T
+            self.ax_sweep.plot(x, y, 'o-', markersize=4)
+        current = dict(self.current.params)[sweep]
+        self.ax_sweep.axvline(current, color='gray', linestyle='--', linewidth=1)
+        self.ax_sweep.set_xlabel(sweep)
+        self.ax_sweep.set_ylabel('Avg wait (s)')
+        self.ax_sweep.set_title(f'Sweep of {sweep} ({len(points)} runs available)', fontsize=10)
+        self.ax_sweep.grid(True, alpha=0.3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cache', default='results/run_cache', help='Run cache directory')
+    parser.add_argument('--workers', type=int, default=None, help='Background worker processes')
+    parser.add_argument('--precompute', action='store_true',
+                        help='Simulate the parameter grid of every scenario before opening')
+    parser.add_argument('--duration', type=float, default=DURATIONS[2],
+                        help='Run duration for --precompute (seconds)')
+    args = parser.parse_args()
+
+    with BackgroundRunner(RunCache(args.cache), workers=args.workers) as runner:
+        if args.precompute:
+            precompute(runner, args.duration)
+        Explorer(runner)
+        plt.show()
+
+
+if __name__ == "__main__":
+    main()
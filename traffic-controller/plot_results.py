@@ -1,37 +1,104 @@
 """
 Visualize traffic signal simulation results.
 """
+import glob
+import os
+from collections import defaultdict
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
 import numpy as np
 from simulation.models import Direction
-from simulation.controllers import FixedTimerController, AdaptiveCountController
-from simulation.simulator import TrafficSimulator
-from simulation.models import ArrivalProcess
+from simulation.analysis import ReplicationAggregate, mean_confidence_interval
+from simulation.results_store import read_results
+from simulation.trajectory import TrajectoryReader
+from run_experiments import SCENARIO
 
+RESULTS_DATASET = 'results/experiment_results'
+RESULTS_CSV = 'results/experiment_results.csv'
+CONTROLLER_COLORS = {'fixed': '#FF6B6B', 'adaptive': '#4ECDC4'}
 
-def plot_queue_lengths(simulators: dict, duration: int = 600):
+
+def minmax_envelope(x: np.ndarray, y: np.ndarray, n_bins: int):
+    """
+    Reduce a series to the min/max envelope of n_bins equal-count buckets.
+    
+    Drawn as a filled band at one bucket per pixel, the envelope looks like
+    the full series (peaks included) at a fraction of the drawing cost.
+    
+    Args:
+        x: Sample positions (increasing)
+        y: Values, shape (n,) or (n, k) for k series sharing x
+        n_bins: Buckets (about the plot width in pixels)
+        
+    Returns:
+        (bucket start positions, minima, maxima), minima and maxima shaped
+        (n_bins,) or (n_bins, k) like y
+    """
+    n = len(x)
+    per_bin = max(1, -(-n // n_bins))
+    n_bins = -(-n // per_bin)
+    values = y.reshape(n, -1)
+    # Pad with the last value so padding never becomes a bucket's min or max
+    padded = np.concatenate([values, np.repeat(values[-1:], n_bins * per_bin - n, axis=0)])
+    buckets = padded.reshape(n_bins, per_bin, values.shape[1])
+    lo, hi = buckets.min(axis=1), buckets.max(axis=1)
+    if y.ndim == 1:
+        lo, hi = lo[:, 0], hi[:, 0]
+    return x[::per_bin], lo, hi
+
+
+def _queue_series(source, duration: float = None):
+    """Times and (n, 4) queue array from a simulator or TrajectoryReader."""
+    if isinstance(source, TrajectoryReader):
+        n = len(source) if duration is None else min(len(source), int(duration / source.dt))
+        return source.read('time', 0, n), source.read('queues', 0, n)
+    queues = source.get_metrics().queue_array()
+    n = len(queues) if duration is None else min(len(queues), int(duration / source.dt))
+    return np.arange(n) * source.dt, queues[:n]
+
+
+def _phase_series(source):
+    """Times, phase indices, phase names and state codes from a simulator or TrajectoryReader."""
+    if isinstance(source, TrajectoryReader):
+        states = np.asarray(source.states)[source['state']]
+        return source['time'], source['phase'].astype(np.int64), source.phases, states
+    names = [phase.name for phase in source.phase_plan.phases]
+    return source.get_metrics().phase_arrays(names)
+
+
+def _pixel_width(ax, dpi: float = 150) -> int:
+    """Approximate width of an axes in pixels of an image saved at dpi."""
+    return max(100, int(ax.get_window_extent().width / ax.figure.dpi * dpi))
+
+
+def plot_queue_lengths(simulators: dict, duration: int = 600, path: str = 'results/queue_lengths.png'):
     """
     Plot queue lengths over time for both controllers.
     
+    Histories longer than the plot is wide are reduced to a per-pixel
+    min/max envelope and drawn as bands.
+    
     Args:
-        simulators: Dictionary with 'fixed' and 'adaptive' simulators
-        duration: Time window to plot (seconds)
+        simulators: Simulators (or TrajectoryReaders) by controller name
+        duration: Time window to plot (seconds; None plots everything)
+        path: Output image
     """
-    fig, axes = plt.subplots(2, 1, figsize=(14, 8))
+    fig, axes = plt.subplots(len(simulators), 1, figsize=(14, 4 * len(simulators)), squeeze=False)
     
-    for idx, (controller_name, simulator) in enumerate(simulators.items()):
-        ax = axes[idx]
-        metrics = simulator.get_metrics()
-        
-        # Extract queue history (limit to duration)
-        n_steps = min(duration, len(metrics.queue_history))
-        time_steps = np.arange(n_steps)
+    for ax, (controller_name, source) in zip(axes[:, 0], simulators.items()):
+        times, queues = _queue_series(source, duration)
+        n_pixels = _pixel_width(ax)
         
-        # Plot each direction
-        for direction in Direction:
-            queue_data = [metrics.queue_history[i][direction] for i in range(n_steps)]
-            ax.plot(time_steps, queue_data, label=direction.value, linewidth=1.5)
+        # Plot each direction; beyond two samples per pixel draw the envelope
+        if len(times) <= 2 * n_pixels:
+            for column, direction in enumerate(Direction):
+                ax.plot(times, queues[:, column], label=direction.value, linewidth=1.5)
+        else:
+            starts, lo, hi = minmax_envelope(times, queues, n_pixels)
+            for column, direction in enumerate(Direction):
+                ax.fill_between(starts, lo[:, column], hi[:, column], label=direction.value,
+                                alpha=0.6, linewidth=0)
         
         ax.set_xlabel('Time (seconds)', fontsize=11)
         ax.set_ylabel('Queue Length (vehicles)', fontsize=11)
@@ -41,66 +108,95 @@ def plot_queue_lengths(simulators: dict, duration: int = 600):
         ax.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('results/queue_lengths.png', dpi=150, bbox_inches='tight')
-    print("Saved: results/queue_lengths.png")
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    print(f"Saved: {path}")
     plt.close()
 
 
-def plot_phase_timeline(simulators: dict, duration: int = 300):
+def phase_spans(times: np.ndarray, phases: np.ndarray, states: np.ndarray, phase: int, dt: float):
+    """
+    Merge a phase's per-step signal into intervals of constant color.
+    
+    Args:
+        times: Step start times
+        phases: Active phase index per step
+        states: Signal state value ('G', 'Y', 'R') per step
+        phase: Phase index to extract
+        dt: Step duration
+        
+    Returns:
+        (spans as (start, width) pairs, state value per span); the phase
+        shows red whenever it is not the active phase
+    """
+    if len(times) == 0:
+        return [], []
+    status = np.where(phases == phase, states, 'R')
+    starts = np.flatnonzero(np.r_[True, status[1:] != status[:-1]])
+    ends = np.r_[starts[1:], len(times)]
+    begin = times[starts]
+    width = times[ends - 1] + dt - begin
+    return list(zip(begin.tolist(), width.tolist())), status[starts].tolist()
+
+
+def _phase_strip(times: np.ndarray, phases: np.ndarray, states: np.ndarray,
+                 phase: int, n_pixels: int) -> np.ndarray:
+    """Per-pixel RGB of a phase row, mixing colors by time spent in each state."""
+    status = np.where(phases == phase, states, 'R')
+    bucket = np.minimum((np.arange(len(times)) * n_pixels) // len(times), n_pixels - 1)
+    rgb = np.zeros((n_pixels, 3))
+    for value, color in (('G', (0.0, 0.5, 0.0)), ('Y', (1.0, 1.0, 0.0)), ('R', (1.0, 0.0, 0.0))):
+        share = np.bincount(bucket, weights=status == value, minlength=n_pixels)
+        rgb += share[:, None] * np.asarray(color)
+    counts = np.bincount(bucket, minlength=n_pixels)[:, None]
+    return rgb / np.maximum(counts, 1)
+
+
+def plot_phase_timeline(simulators: dict, duration: int = 300, path: str = 'results/phase_timeline.png'):
     """
     Plot signal phase timeline showing green/yellow/red periods.
     
+    Each phase is one row of merged intervals (broken_barh), so the cost
+    depends on the number of signal changes rather than the run length.
+    
     Args:
-        simulators: Dictionary with 'fixed' and 'adaptive' simulators
-        duration: Time window to plot (seconds)
+        simulators: Simulators (or TrajectoryReaders) by controller name
+        duration: Time window to plot (seconds; None plots everything)
+        path: Output image
     """
-    fig, axes = plt.subplots(2, 1, figsize=(14, 6))
+    fig, axes = plt.subplots(len(simulators), 1, figsize=(14, 3 * len(simulators)), squeeze=False)
     
     colors = {'G': 'green', 'Y': 'yellow', 'R': 'red'}
     
-    for idx, (controller_name, simulator) in enumerate(simulators.items()):
-        ax = axes[idx]
-        metrics = simulator.get_metrics()
-        
-        # Extract phase history (limit to duration)
-        phase_history = [p for p in metrics.phase_history if p[0] <= duration]
+    for ax, (controller_name, source) in zip(axes[:, 0], simulators.items()):
+        times, phases, names, states = _phase_series(source)
+        if duration is not None:
+            keep = times <= duration
+            times, phases, states = times[keep], phases[keep], states[keep]
+        dt = source.dt
         
-        # Plot NS phase
-        ns_times = []
-        ns_colors = []
-        for time, phase, state in phase_history:
-            if phase == 'NS':
-                ns_times.append(time)
-                ns_colors.append(colors[state])
+        # One row per phase, first phase on top
+        n_pixels = _pixel_width(ax)
+        for row, name in enumerate(names):
+            spans, span_states = phase_spans(times, phases, states, row, dt)
+            y = len(names) - 1 - row
+            if len(spans) <= n_pixels:
+                ax.broken_barh(spans, (y - 0.4, 0.8), facecolors=[colors[s] for s in span_states])
             else:
-                ns_times.append(time)
-                ns_colors.append('red')
-        
-        # Plot EW phase
-        ew_times = []
-        ew_colors = []
-        for time, phase, state in phase_history:
-            if phase == 'EW':
-                ew_times.append(time)
-                ew_colors.append(colors[state])
-            else:
-                ew_times.append(time)
-                ew_colors.append('red')
-        
-        # Create scatter plots
-        ax.scatter(ns_times, [1]*len(ns_times), c=ns_colors, s=10, marker='s', label='NS Phase')
-        ax.scatter(ew_times, [0]*len(ew_times), c=ew_colors, s=10, marker='s', label='EW Phase')
+                # Spans narrower than a pixel: draw each pixel's color mix instead
+                ax.imshow(_phase_strip(times, phases, states, row, n_pixels)[None, :, :],
+                          extent=(times[0], times[-1] + dt, y - 0.4, y + 0.4),
+                          aspect='auto', interpolation='nearest')
+        ax.set_ylim(-0.5, len(names) - 0.5)
         
         ax.set_xlabel('Time (seconds)', fontsize=11)
-        ax.set_yticks([0, 1])
-        ax.set_yticklabels(['EW', 'NS'])
+        ax.set_yticks(range(len(names)))
+        ax.set_yticklabels(names[::-1])
         ax.set_title(f'{controller_name.capitalize()} Controller - Signal Phase Timeline', 
                     fontsize=12, fontweight='bold')
-        ax.set_xlim(0, duration)
+        ax.set_xlim(0, duration if duration is not None else (times[-1] + dt if len(times) else 1))
         ax.grid(True, alpha=0.3, axis='x')
         
         # Add legend for colors
-        from matplotlib.patches import Patch
         legend_elements = [
             Patch(facecolor='green', label='Green'),
             Patch(facecolor='yellow', label='Yellow'),
@@ -109,8 +205,8 @@ def plot_phase_timeline(simulators: dict, duration: int = 300):
         ax.legend(handles=legend_elements, loc='upper right')
     
     plt.tight_layout()
-    plt.savefig('results/phase_timeline.png', dpi=150, bbox_inches='tight')
-    print("Saved: results/phase_timeline.png")
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    print(f"Saved: {path}")
     plt.close()
 
 
@@ -121,14 +217,14 @@ def plot_comparison_bars(df: pd.DataFrame):
     Args:
         df: DataFrame with experiment results
     """
-    grouped = df.groupby('controller').mean()
-    
     metrics = [
         ('avg_wait_time', 'Avg Wait Time (s)', False),
         ('p95_wait_time', '95th %ile Wait (s)', False),
         ('max_queue_total', 'Max Queue Length', False),
         ('throughput', 'Throughput (veh/s)', True),
     ]
+    grouped = df.groupby('controller', observed=True)[[m for m, _, _ in metrics]]
+    intervals = grouped.agg(lambda values: mean_confidence_interval(values.to_numpy(dtype=float)))
     
     fig, axes = plt.subplots(2, 2, figsize=(12, 8))
     axes = axes.flatten()
@@ -136,11 +232,14 @@ def plot_comparison_bars(df: pd.DataFrame):
     for idx, (metric, label, higher_better) in enumerate(metrics):
         ax = axes[idx]
         
-        fixed_val = grouped.loc['fixed', metric]
-        adaptive_val = grouped.loc['adaptive', metric]
+        fixed_val, fixed_hw = intervals.loc['fixed', metric]
+        adaptive_val, adaptive_hw = intervals.loc['adaptive', metric]
         
+        # Error bars are 95% confidence intervals of the mean across seeds
         bars = ax.bar(['Fixed Timer', 'Adaptive'], 
                      [fixed_val, adaptive_val],
+                     yerr=np.nan_to_num([fixed_hw, adaptive_hw]),
+                     capsize=6,
                      color=['#FF6B6B', '#4ECDC4'],
                      edgecolor='black',
                      linewidth=1.5)
@@ -182,10 +281,11 @@ def plot_wait_time_distribution(simulators: dict):
     
     for controller_name, simulator in simulators.items():
         metrics = simulator.get_metrics()
-        wait_times = metrics.wait_times
+        histogram = metrics.wait_histogram
         
         # Plot histogram
-        ax.hist(wait_times, bins=50, alpha=0.6, label=controller_name.capitalize(),
+        ax.hist(histogram.values(), bins=50, weights=histogram.counts, alpha=0.6,
+               label=controller_name.capitalize(),
                edgecolor='black', linewidth=0.5)
     
     ax.set_xlabel('Wait Time (seconds)', fontsize=11)
@@ -200,34 +300,157 @@ def plot_wait_time_distribution(simulators: dict):
     plt.close()
 
 
-def recreate_simulators():
-    """Recreate simulators from first seed for visualization."""
-    arrival_rates = {
-        Direction.NORTH: 0.4,
-        Direction.SOUTH: 0.3,
-        Direction.EAST: 0.2,
-        Direction.WEST: 0.15,
-    }
+def aggregate_replications(n_seeds: int = 50, duration: float = 1800.0,
+                           bin_width: float = 10.0) -> dict:
+    """
+    Run replications of both controllers and reduce them as they finish.
     
-    simulators = {}
+    Each simulator is folded into its controller's aggregate and discarded,
+    so memory does not grow with the number of seeds.
     
-    # Fixed controller
-    controller_fixed = FixedTimerController(green_time=20.0, yellow_time=3.0)
-    arrival_process_fixed = ArrivalProcess(arrival_rates, seed=0)
-    sim_fixed = TrafficSimulator(controller_fixed, arrival_process_fixed, saturation_flow=1.0, dt=1.0)
-    sim_fixed.run(1800.0)
-    simulators['fixed'] = sim_fixed
-    
-    # Adaptive controller
-    controller_adaptive = AdaptiveCountController(
-        min_green=5.0, max_green=30.0, yellow_time=3.0,
-        extension_threshold=2, max_wait_time=90.0, max_skips=3
-    )
-    arrival_process_adaptive = ArrivalProcess(arrival_rates, seed=0)
-    sim_adaptive = TrafficSimulator(controller_adaptive, arrival_process_adaptive, saturation_flow=1.0, dt=1.0)
-    sim_adaptive.run(1800.0)
-    simulators['adaptive'] = sim_adaptive
+    Args:
+        n_seeds: Replications per controller
+        duration: Simulation duration per replication (seconds)
+        bin_width: Time bucket width of the queue bands (seconds)
+        
+    Returns:
+        Dictionary of controller name -> ReplicationAggregate
+    """
+    aggregates = {name: ReplicationAggregate(duration, bin_width) for name in ('fixed', 'adaptive')}
+    for seed in range(n_seeds):
+        for controller_name, aggregate in aggregates.items():
+            simulator = SCENARIO.build_simulator(controller_name, seed=seed)
+            simulator.run(duration)
+            aggregate.add(simulator)
+    return aggregates
+
+
+def aggregate_trajectories(directory: str, bin_width: float = 10.0) -> dict:
+    """
+    Reduce stored trajectory files (``{controller}_seed*.traj.zip``), chunk by chunk.
+    
+    Trajectories hold queues but not per-vehicle waits, so the aggregates
+    support queue bands only.
+    
+    Args:
+        directory: Directory written by run_experiments(trajectory_dir=...)
+        bin_width: Time bucket width of the queue bands (seconds)
+        
+    Returns:
+        Dictionary of controller name -> ReplicationAggregate
+    """
+    readers = defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(directory, '*.traj.zip'))):
+        readers[os.path.basename(path).split('_seed')[0]].append(path)
+    aggregates = {}
+    for controller_name, paths in readers.items():
+        for path in paths:
+            with TrajectoryReader(path) as reader:
+                if controller_name not in aggregates:
+                    aggregates[controller_name] = ReplicationAggregate(len(reader) * reader.dt, bin_width)
+                aggregates[controller_name].add(reader)
+    return aggregates
+
+
+def plot_queue_bands(aggregates: dict, path: str = 'results/queue_bands.png'):
+    """
+    Plot mean total queue over time with 25-75% and 5-95% bands across replications.
+    
+    Args:
+        aggregates: Dictionary of controller name -> ReplicationAggregate
+        path: Output image path
+    """
+    fig, ax = plt.subplots(figsize=(12, 5))
+    
+    for controller_name, aggregate in aggregates.items():
+        times, mean, bands = aggregate.queue_bands()
+        color = CONTROLLER_COLORS.get(controller_name)
+        line, = ax.plot(times, mean, color=color, linewidth=1.5,
+                        label=f'{controller_name.capitalize()} (n={aggregate.n_replications})')
+        color = line.get_color()
+        ax.fill_between(times, bands[0.05], bands[0.95], color=color, alpha=0.15, linewidth=0)
+        ax.fill_between(times, bands[0.25], bands[0.75], color=color, alpha=0.3, linewidth=0)
+    
+    ax.set_xlabel('Time (seconds)', fontsize=11)
+    ax.set_ylabel('Total Queue Length (vehicles)', fontsize=11)
+    ax.set_title('Total Queue Across Replications (mean, 25-75% and 5-95% bands)',
+                 fontsize=12, fontweight='bold')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    print(f"Saved: {path}")
+    plt.close()
+
+
+def plot_wait_cdfs(aggregates: dict, path: str = 'results/wait_time_cdfs.png'):
+    """
+    Plot pooled wait-time CDFs with the 5-95% band of per-replication CDFs.
     
+    Args:
+        aggregates: Dictionary of controller name -> ReplicationAggregate
+            (with wait times, i.e. built from simulators)
+        path: Output image path
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    x_max = 0.0
+    
+    for controller_name, aggregate in aggregates.items():
+        if not aggregate.wait_rows:
+            continue
+        cdfs = aggregate.wait_cdf_bands()
+        # Clip the axis where every replication's CDF has saturated
+        saturated = np.flatnonzero(cdfs[0.05] >= 0.999)
+        x_max = max(x_max, cdfs['edges'][saturated[0] if len(saturated) else -1])
+        color = CONTROLLER_COLORS.get(controller_name)
+        line, = ax.step(cdfs['edges'], cdfs['pooled'], where='post', color=color, linewidth=1.5,
+                        label=f'{controller_name.capitalize()} (n={aggregate.n_replications})')
+        ax.fill_between(cdfs['edges'], cdfs[0.05], cdfs[0.95], step='post',
+                        color=line.get_color(), alpha=0.25, linewidth=0)
+    
+    ax.set_xlabel('Wait Time (seconds)', fontsize=11)
+    ax.set_ylabel('Fraction of Vehicles', fontsize=11)
+    ax.set_title('Wait Time CDF Across Replications (pooled, 5-95% band)',
+                 fontsize=12, fontweight='bold')
+    ax.set_ylim(0, 1.01)
+    if x_max > 0:
+        ax.set_xlim(0, x_max * 1.05)
+    ax.legend(loc='lower right')
+    ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    print(f"Saved: {path}")
+    plt.close()
+
+
+def load_results(columns=None, filters=None) -> pd.DataFrame:
+    """
+    Load experiment results, preferring the partitioned dataset.
+    
+    Args:
+        columns: Columns to load (None loads all)
+        filters: Partition column -> accepted value(s), e.g. {'controller': 'fixed'}
+        
+    Raises:
+        FileNotFoundError: If run_experiments.py has not produced results
+    """
+    if os.path.isdir(RESULTS_DATASET):
+        return read_results(RESULTS_DATASET, columns=columns, filters=filters)
+    df = pd.read_csv(RESULTS_CSV, usecols=columns)
+    for name, value in (filters or {}).items():
+        df = df[df[name].isin(value if isinstance(value, (list, tuple, set)) else [value])]
+    return df
+
+
+def recreate_simulators():
+    """Recreate simulators from first seed for visualization."""
+    simulators = {}
+    for controller_name in ('fixed', 'adaptive'):
+        simulator = SCENARIO.build_simulator(controller_name, seed=0)
+        simulator.run(SCENARIO.duration)
+        simulators[controller_name] = simulator
     return simulators
 
 
@@ -239,9 +462,10 @@ def main():
     
     # Load results
     try:
-        df = pd.read_csv('results/experiment_results.csv')
+        df = load_results(columns=['controller', 'avg_wait_time', 'p95_wait_time',
+                                   'max_queue_total', 'throughput'])
     except FileNotFoundError:
-        print("Error: results/experiment_results.csv not found.")
+        print("Error: results/experiment_results not found.")
         print("Please run 'python run_experiments.py' first.")
         return
     
@@ -257,12 +481,16 @@ def main():
     plot_phase_timeline(simulators, duration=300)
     plot_wait_time_distribution(simulators)
     
+    print("\nAggregating replications...")
+    aggregates = aggregate_replications(n_seeds=int(os.environ.get('PLOT_REPLICATIONS', 50)))
+    plot_queue_bands(aggregates)
+    plot_wait_cdfs(aggregates)
+    
     print("\n" + "="*70)
     print("All visualizations saved to results/ directory!")
     print("="*70)
 
 
 if __name__ == "__main__":
-    import os
     os.makedirs('results', exist_ok=True)
     main()
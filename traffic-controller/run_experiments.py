@@ -1,17 +1,39 @@
 """
 Run traffic signal simulation experiments comparing Fixed-Timer vs Adaptive controllers.
 """
+import os
+from typing import Sequence
 import numpy as np
 import pandas as pd
-from simulation.models import Direction, ArrivalProcess
-from simulation.controllers import FixedTimerController, AdaptiveCountController
-from simulation.simulator import TrafficSimulator
+from simulation.models import Direction, ArrivalProcess, PresampledArrivalProcess
+from simulation.analysis import (
+    SteadyStateEstimator, mean_confidence_interval, control_variate_interval
+)
+from simulation.scheduler import SequentialComparison
+from simulation.profiling import StepProfiler
+from simulation.monitoring import ProgressMonitor, MetricsServer, JsonLinesWriter
+from simulation.results_store import ResultsWriter
+from simulation.trajectory import TrajectoryWriter
+from simulation.scenario import load_scenario
+from simulation.analytic import estimate_fixed_timer
+
+# Demand, controller settings and simulator settings of the experiments
+SCENARIO = load_scenario('asymmetric')
+
+
+def create_controller(controller_name: str):
+    """Create the experiment configuration of a controller ("fixed" or "adaptive")."""
+    return SCENARIO.build_controller(controller_name)
 
 
 def run_single_experiment(controller_name: str, 
                          arrival_rates: dict,
                          seed: int,
-                         duration: float = 1800.0):
+                         duration: float = 1800.0,
+                         target_precision: float = None,
+                         arrival_process: ArrivalProcess = None,
+                         monitor: ProgressMonitor = None,
+                         trajectory_path: str = None):
     """
     Run a single simulation experiment.
     
@@ -19,48 +41,69 @@ def run_single_experiment(controller_name: str,
         controller_name: "fixed" or "adaptive"
         arrival_rates: Dictionary of arrival rates per direction
         seed: Random seed
-        duration: Simulation duration in seconds (default 30 minutes)
+        duration: Simulation duration in seconds (default 30 minutes); the
+            maximum duration when target_precision is set
+        target_precision: Stop as soon as the steady-state average wait's
+            confidence interval half-width is within this fraction of the mean
+        arrival_process: Arrival stream to use (e.g. a shared replay for
+            common random numbers); defaults to a fresh ArrivalProcess
+        monitor: ProgressMonitor to report live progress to
+        trajectory_path: File to stream the per-tick trajectory to
         
     Returns:
         Dictionary of results
     """
-    # Create controller
-    if controller_name == "fixed":
-        controller = FixedTimerController(green_time=20.0, yellow_time=3.0)
-    else:
-        controller = AdaptiveCountController(
-            min_green=5.0,
-            max_green=30.0,
-            yellow_time=3.0,
-            extension_threshold=2,
-            max_wait_time=90.0,
-            max_skips=3
-        )
-    
     # Create arrival process
-    arrival_process = ArrivalProcess(arrival_rates, seed=seed)
+    if arrival_process is None:
+        arrival_process = ArrivalProcess(arrival_rates, seed=seed)
     
     # Create and run simulator
-    simulator = TrafficSimulator(
-        controller=controller,
-        arrival_process=arrival_process,
-        saturation_flow=1.0,
-        dt=1.0
-    )
+    simulator = SCENARIO.build_simulator(controller_name, arrival_process)
     
-    simulator.run(duration)
+    # Opt-in stage profiling for sweeps, without code changes
+    profile_dir = os.environ.get('SIMULATION_PROFILE_DIR')
+    profiler = StepProfiler().attach(simulator) if profile_dir else None
+    
+    trajectory = TrajectoryWriter(trajectory_path, simulator) if trajectory_path else None
+    
+    if monitor is not None:
+        monitor.task_started((controller_name, seed))
+    if target_precision is None:
+        simulator.estimators = {'wait': SteadyStateEstimator()}  # Streamed per departure
+        simulator.run(duration, monitor=monitor, trajectory=trajectory)
+    else:
+        simulator.run_until_precision(target_precision, metric="wait", max_duration=duration,
+                                      monitor=monitor, trajectory=trajectory)
+        duration = simulator.current_time
+    if monitor is not None:
+        monitor.task_finished((controller_name, seed))
     metrics = simulator.get_metrics()
     
+    if profiler is not None:
+        profiler.detach()
+        os.makedirs(profile_dir, exist_ok=True)
+        stem = os.path.join(profile_dir, f'{controller_name}_seed{seed}')
+        profiler.to_chrome_trace(f'{stem}.trace.json')
+        profiler.to_collapsed_stacks(f'{stem}.folded')
+    
+    # Steady-state estimates with the start-up transient removed (MSER-5)
+    queue_series = [sum(snapshot.values()) for snapshot in metrics.queue_history]
+    queue_estimate = SteadyStateEstimator.from_series(queue_series).estimate()
+    wait_estimate = simulator.estimators['wait'].estimate()
+    
     # Compile results
     results = {
+        'scenario': SCENARIO.name,
         'controller': controller_name,
         'seed': seed,
-        'total_arrived': metrics.total_vehicles_arrived,
-        'total_departed': metrics.total_vehicles_departed,
-        'avg_wait_time': metrics.get_average_wait_time(),
-        'p95_wait_time': metrics.get_percentile_wait_time(95),
-        'max_queue_total': metrics.get_max_queue_length_total(),
-        'throughput': metrics.total_vehicles_departed / duration,
+        **metrics.summary(duration),
+        'duration': duration,
+        'expected_arrivals': sum(arrival_rates.values()) * duration,
+        'warmup_time': queue_estimate.warmup * simulator.dt,
+        'steady_avg_queue': queue_estimate.mean,
+        'steady_avg_queue_hw': queue_estimate.half_width,
+        'steady_avg_wait_time': wait_estimate.mean,
+        'steady_avg_wait_hw': wait_estimate.half_width,
     }
     
     # Add per-direction metrics
@@ -71,24 +114,32 @@ def run_single_experiment(controller_name: str,
     return results, simulator
 
 
-def run_experiments(n_seeds: int = 5, duration: float = 1800.0):
+def run_experiments(seeds: Sequence[int] = None, duration: float = 1800.0, antithetic: bool = False,
+                    monitor: ProgressMonitor = None, writer: ResultsWriter = None,
+                    trajectory_dir: str = None):
     """
     Run multiple experiments with different seeds and controllers.
     
+    Each seed draws one arrival stream that every controller replays, so
+    controller differences are measured under common random numbers.
+    
     Args:
-        n_seeds: Number of random seeds to test
+        seeds: Random seeds to test (defaults to the scenario's seeds)
         duration: Simulation duration in seconds
+        antithetic: Also run every seed on its antithetic stream; the pair
+            counts as one replication in paired comparisons
+        monitor: ProgressMonitor to report live progress to
+        writer: ResultsWriter receiving each result row as soon as it exists
+            (flushed after every replication, so a crash keeps finished ones)
+        trajectory_dir: Directory to write every run's per-tick trajectory to
+            (read back with simulation.trajectory.TrajectoryReader)
         
     Returns:
         DataFrame of results
     """
-    # Define traffic scenario: NS is busier than EW
-    arrival_rates = {
-        Direction.NORTH: 0.4,  # 0.4 vehicles/second
-        Direction.SOUTH: 0.3,  # 0.3 vehicles/second
-        Direction.EAST: 0.2,   # 0.2 vehicles/second
-        Direction.WEST: 0.15,  # 0.15 vehicles/second
-    }
+    # Traffic scenario (scenarios/asymmetric.json): NS is busier than EW
+    arrival_rates = SCENARIO.arrival_rates
+    seeds = list(SCENARIO.seeds if seeds is None else seeds)
     
     print("="*70)
     print("TRAFFIC SIGNAL SIMULATION EXPERIMENTS")
@@ -97,32 +148,61 @@ def run_experiments(n_seeds: int = 5, duration: float = 1800.0):
     for direction, rate in arrival_rates.items():
         print(f"  {direction.value}: {rate}")
     print(f"\nSimulation Duration: {duration/60:.1f} minutes")
-    print(f"Number of Seeds: {n_seeds}")
+    print(f"Seeds: {', '.join(map(str, seeds))}" + (" (+ antithetic pairs)" if antithetic else ""))
     print(f"\nRunning experiments...\n")
     
     all_results = []
     all_simulators = {}
+    if trajectory_dir:
+        os.makedirs(trajectory_dir, exist_ok=True)
+    
+    def trajectory_path(controller_name, seed, is_antithetic):
+        if not trajectory_dir:
+            return None
+        suffix = '_antithetic' if is_antithetic else ''
+        return os.path.join(trajectory_dir, f'{controller_name}_seed{seed}{suffix}.traj.zip')
+    if monitor is not None:
+        monitor.total_replications = len(seeds) * 2 * (2 if antithetic else 1)
     
-    for seed in range(n_seeds):
-        print(f"Seed {seed+1}/{n_seeds}:")
+    for i, seed in enumerate(seeds):
+        print(f"Seed {seed} ({i+1}/{len(seeds)}):")
         
-        # Run fixed-timer
-        print(f"  Running Fixed-Timer controller...")
-        results_fixed, sim_fixed = run_single_experiment(
-            "fixed", arrival_rates, seed, duration
-        )
-        all_results.append(results_fixed)
-        if seed == 0:  # Save first run for visualization
-            all_simulators['fixed'] = sim_fixed
+        # One shared arrival stream per replication (common random numbers)
+        stream = PresampledArrivalProcess(arrival_rates, seed=seed, horizon=duration, dt=SCENARIO.dt)
         
-        # Run adaptive
-        print(f"  Running Adaptive controller...")
-        results_adaptive, sim_adaptive = run_single_experiment(
-            "adaptive", arrival_rates, seed, duration
-        )
-        all_results.append(results_adaptive)
-        if seed == 0:  # Save first run for visualization
-            all_simulators['adaptive'] = sim_adaptive
+        for is_antithetic in ([False, True] if antithetic else [False]):
+            label = " (antithetic)" if is_antithetic else ""
+            
+            # Run fixed-timer
+            print(f"  Running Fixed-Timer controller{label}...")
+            results_fixed, sim_fixed = run_single_experiment(
+                "fixed", arrival_rates, seed, duration,
+                arrival_process=stream.replay(antithetic=is_antithetic),
+                monitor=monitor,
+                trajectory_path=trajectory_path("fixed", seed, is_antithetic)
+            )
+            results_fixed['antithetic'] = is_antithetic
+            all_results.append(results_fixed)
+            if writer is not None:
+                writer.append(results_fixed)
+            if i == 0 and not is_antithetic:  # Save first run for visualization
+                all_simulators['fixed'] = sim_fixed
+            
+            # Run adaptive
+            print(f"  Running Adaptive controller{label}...")
+            results_adaptive, sim_adaptive = run_single_experiment(
+                "adaptive", arrival_rates, seed, duration,
+                arrival_process=stream.replay(antithetic=is_antithetic),
+                monitor=monitor,
+                trajectory_path=trajectory_path("adaptive", seed, is_antithetic)
+            )
+            results_adaptive['antithetic'] = is_antithetic
+            all_results.append(results_adaptive)
+            if writer is not None:
+                writer.append(results_adaptive)
+                writer.flush()  # On disk before the next replication starts
+            if i == 0 and not is_antithetic:  # Save first run for visualization
+                all_simulators['adaptive'] = sim_adaptive
         
         print()
     
@@ -132,6 +212,86 @@ def run_experiments(n_seeds: int = 5, duration: float = 1800.0):
     return df, all_simulators
 
 
+def paired_differences(df: pd.DataFrame, metric: str,
+                       baseline: str = 'fixed', treatment: str = 'adaptive'):
+    """
+    Per-replication differences (treatment - baseline) of a metric.
+    
+    Rows are paired by seed (and antithetic flag when present); antithetic
+    pairs are averaged into a single replication.
+    
+    Returns:
+        (differences, arrival counts, expected arrival count or None),
+        one entry per replication
+    """
+    keys = ['seed'] + (['antithetic'] if 'antithetic' in df.columns else [])
+    wide = df.pivot_table(index=keys, columns='controller', values=metric)
+    diffs = (wide[treatment] - wide[baseline]).groupby(level='seed').mean()
+    
+    if 'expected_arrivals' not in df.columns:
+        return diffs.to_numpy(), None, None
+    arrivals = df[df['controller'] == baseline].groupby('seed')['total_arrived'].mean()
+    expected = df['expected_arrivals'].mean()
+    return diffs.to_numpy(), arrivals.loc[diffs.index].to_numpy(), expected
+
+
+def run_sequential_comparison(configs: dict = None,
+                              arrival_rates: dict = None,
+                              duration: float = 1800.0,
+                              metric: str = 'avg_wait_time',
+                              target_half_width: float = 0.05,
+                              indifference_zone: float = None,
+                              max_replications: int = 50,
+                              workers: int = 1):
+    """
+    Compare controllers with as many replications as the comparison needs.
+    
+    Args:
+        configs: Controllers by name (defaults to fixed vs adaptive)
+        arrival_rates: Dictionary of arrival rates per direction (defaults
+            to the experiment scenario)
+        duration: Simulation duration per replication (seconds)
+        metric: Metric to compare (smaller is better)
+        target_half_width: Relative precision of the paired differences
+        indifference_zone: Smallest difference worth detecting; enables
+            early elimination of inferior controllers
+        max_replications: Upper bound on replications
+        workers: Worker processes
+        
+    Returns:
+        ComparisonResult
+    """
+    if configs is None:
+        configs = {name: create_controller(name) for name in ('fixed', 'adaptive')}
+    if arrival_rates is None:
+        arrival_rates = SCENARIO.arrival_rates
+    
+    def report(n, survivors):
+        print(f"  Replication {n}: {len(survivors)} configuration(s) remaining")
+    
+    comparison = SequentialComparison(
+        configs, arrival_rates,
+        duration=duration,
+        metric=metric,
+        target_half_width=target_half_width,
+        relative=True,
+        stop_on_significance=indifference_zone is None,
+        indifference_zone=indifference_zone,
+        max_replications=max_replications,
+        workers=workers,
+        on_replication=report
+    )
+    result = comparison.run()
+    
+    print(f"\nStopped after {result.n_replications} replications ({result.stop_reason})")
+    print(f"Best by {metric}: {result.best} ({result.means[result.best]:.3f})")
+    for name, (mean, half_width) in result.differences.items():
+        print(f"  {name:10s}: {mean:+8.3f} ± {half_width:6.3f} vs best")
+    for name, n in result.eliminated.items():
+        print(f"  {name:10s}: eliminated after {n} replications")
+    return result
+
+
 def print_comparison(df: pd.DataFrame):
     """Print comparison summary between controllers."""
     print("\n" + "="*70)
@@ -170,6 +330,29 @@ def print_comparison(df: pd.DataFrame):
             improvement = ((fixed_mean - adaptive_mean) / fixed_mean) * 100
             print(f"  {'Improvement':10s}: {improvement:+7.2f}%")
     
+    # Closed-form reference for the fixed-time plan
+    estimate = estimate_fixed_timer(create_controller('fixed'), SCENARIO.arrival_rates,
+                                    SCENARIO.saturation_flow, df['duration'].iloc[0],
+                                    lost_time=SCENARIO.simulator.get('lost_time', 0.0))
+    summary = estimate.summary()
+    print(f"\nAnalytic fixed-timer estimate: delay {summary['avg_wait_time']:.2f}s (HCM), "
+          f"{summary['webster_delay']:.2f}s (Webster), "
+          f"degree of saturation {summary['degree_of_saturation']:.2f}")
+    
+    print("\n" + "="*70)
+    
+    # Paired comparison under common random numbers
+    print("\nPaired Differences (adaptive - fixed, 95% CI):")
+    print("-" * 70)
+    for metric, label in metrics:
+        diffs, controls, control_mean = paired_differences(df, metric)
+        mean, half_width = mean_confidence_interval(diffs)
+        print(f"\n{label}:")
+        print(f"  {'paired':10s}: {mean:+8.3f} ± {half_width:6.3f}  (n={len(diffs)})")
+        if control_mean is not None:
+            cv_mean, cv_half_width, _ = control_variate_interval(diffs, controls, control_mean)
+            print(f"  {'+ control':10s}: {cv_mean:+8.3f} ± {cv_half_width:6.3f}  (arrival-count control variate)")
+    
     print("\n" + "="*70)
     
     # Fairness comparison
@@ -188,19 +371,37 @@ def print_comparison(df: pd.DataFrame):
 
 def main():
     """Main experiment runner."""
-    # Run experiments
-    df, simulators = run_experiments(n_seeds=5, duration=1800.0)
+    # Optional live progress: Prometheus endpoint and/or JSON lines file
+    monitor = ProgressMonitor()
+    exporters = []
+    if os.environ.get('SIMULATION_METRICS_PORT'):
+        exporters.append(MetricsServer(monitor, port=int(os.environ['SIMULATION_METRICS_PORT'])).start())
+        print(f"Serving live metrics on http://127.0.0.1:{exporters[-1].port}/metrics")
+    if os.environ.get('SIMULATION_METRICS_FILE'):
+        exporters.append(JsonLinesWriter(monitor, os.environ['SIMULATION_METRICS_FILE']).start())
+    
+    # Run experiments; rows are stored as they complete, so a crash keeps them
+    writer = ResultsWriter('results/experiment_results', overwrite=True)
+    try:
+        df, simulators = run_experiments(seeds=SCENARIO.seeds, duration=SCENARIO.duration,
+                                         monitor=monitor if exporters else None,
+                                         writer=writer,
+                                         trajectory_dir=os.environ.get('SIMULATION_TRAJECTORY_DIR'))
+    finally:
+        writer.close()
+        for exporter in exporters:
+            exporter.stop()
     
     # Save results
     df.to_csv('results/experiment_results.csv', index=False)
-    print("\nResults saved to: results/experiment_results.csv")
+    print("\nResults saved to: results/experiment_results/ and results/experiment_results.csv")
     
     # Print comparison
     print_comparison(df)
     
     # Print individual summaries for first seed
     print("\n" + "="*70)
-    print("DETAILED SUMMARY (Seed 0)")
+    print(f"DETAILED SUMMARY (Seed {SCENARIO.seeds[0]})")
     print("="*70)
     simulators['fixed'].print_summary()
     simulators['adaptive'].print_summary()
@@ -209,6 +410,5 @@ def main():
 
 
 if __name__ == "__main__":
-    import os
     os.makedirs('results', exist_ok=True)
     main()
@@ -1,17 +1,55 @@
 """
 Traffic signal simulation package with AI-based adaptive control.
+
+The simulation engine (models, controllers, simulator, checkpoints) is
+imported eagerly and depends only on NumPy. Everything else — the matplotlib
+animation, the pandas-backed results store and the optional tooling modules —
+is imported on first attribute access, so worker processes that only run
+simulations never load matplotlib or pandas.
 """
+import importlib
 from .models import (
     Direction, SignalPhase, SignalState, Vehicle,
-    IntersectionState, ArrivalProcess, SimulationMetrics
+    IntersectionState, VehicleStore, ArrivalProcess, SimulationMetrics, WaitHistogram,
+    Turn, Movement, Phase, PhasePlan, Lane, LaneLayout
 )
 from .controllers import TrafficController, FixedTimerController, AdaptiveCountController
 from .simulator import TrafficSimulator
-from .animation import TrafficAnimator, create_animation
+from .checkpoint import save_checkpoint, load_checkpoint
+
+# Name -> submodule providing it, imported on first access
+_LAZY_EXPORTS = {
+    'TrafficAnimator': 'animation',
+    'create_animation': 'animation',
+    'render_comparison': 'comparison_animation',
+    'render_scenario_comparison': 'comparison_animation',
+    'ResultsWriter': 'results_store',
+    'read_results': 'results_store',
+    'TrajectoryWriter': 'trajectory',
+    'TrajectoryReader': 'trajectory',
+    'ProgressMonitor': 'monitoring',
+    'StepProfiler': 'profiling',
+    'SequentialComparison': 'scheduler',
+}
 
 __all__ = [
     'Direction', 'SignalPhase', 'SignalState', 'Vehicle',
-    'IntersectionState', 'ArrivalProcess', 'SimulationMetrics',
+    'IntersectionState', 'VehicleStore', 'ArrivalProcess', 'SimulationMetrics', 'WaitHistogram',
+    'Turn', 'Movement', 'Phase', 'PhasePlan', 'Lane', 'LaneLayout',
     'TrafficController', 'FixedTimerController', 'AdaptiveCountController',
-    'TrafficSimulator', 'TrafficAnimator', 'create_animation'
+    'TrafficSimulator', 'save_checkpoint', 'load_checkpoint',
+    *_LAZY_EXPORTS
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
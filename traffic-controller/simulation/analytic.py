@@ -0,0 +1,247 @@
+"""
+Analytical delay and queue estimates for pretimed signals.
+
+Closed-form queueing results give the expected behaviour of a fixed-time
+plan in microseconds, without simulating:
+
+- Degree of saturation ``x = q / c`` per approach, with capacity
+  ``c = s * g / C`` (saturation flow times the effective green ratio), and
+  the critical degree of saturation of the whole intersection.
+- Webster's delay formula (uniform + random delay, minus his empirical
+  correction). It only holds below saturation and is infinite at x >= 1.
+- The HCM delay model: uniform delay ``d1`` plus incremental delay ``d2``
+  over an analysis period ``T``. Its time-dependent form stays finite when
+  oversaturated, where it approaches deterministic queue growth.
+- Maximum queue: arrivals during red plus the overflow queue. When
+  oversaturated the overflow grows deterministically at ``q - c`` vehicles
+  per second, so the queue at the end of the period is ``(q - c) * T``.
+
+Effective green is the displayed green minus the simulator's start-up lost
+time; the yellow carries no departures in the simulator and counts as lost.
+The estimates are for screening (e.g. skipping plans that are clearly over
+capacity before a sweep simulates them) and as a known-mean reference; they
+assume Poisson arrivals and one signal group per approach, and ignore
+permissive left-turn blocking and finite storage.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+from .models import Direction, PhasePlan, LaneLayout, TWO_PHASE_PLAN, SINGLE_LANE_LAYOUT
+from .controllers import FixedTimerController
+
+HCM_K = 0.5  # Incremental delay factor for pretimed control
+HCM_I = 1.0  # Upstream filtering factor for an isolated intersection
+
+
+@dataclass
+class ApproachEstimate:
+    """Analytical estimates for one approach."""
+    direction: Direction
+    flow: float  # Arrivals per second
+    capacity: float  # Departures per second over a cycle
+    degree_of_saturation: float
+    webster_delay: float  # Seconds per vehicle (inf at or above saturation)
+    hcm_delay: float  # Seconds per vehicle
+    max_queue: float  # Vehicles at the end of red (end of the period when oversaturated)
+
+
+@dataclass
+class SignalEstimate:
+    """Analytical estimates for an intersection under a fixed-time plan."""
+    cycle: float  # Seconds
+    greens: Dict[str, float]  # Displayed green per phase name
+    approaches: Dict[Direction, ApproachEstimate] = field(default_factory=dict)
+    critical_degree_of_saturation: float = 0.0
+
+    @property
+    def oversaturated(self) -> bool:
+        """Whether any approach receives more vehicles than it can discharge."""
+        return any(a.degree_of_saturation >= 1.0 for a in self.approaches.values())
+
+    def average_delay(self, model: str = 'hcm') -> float:
+        """
+        Flow-weighted delay over all approaches.
+
+        Args:
+            model: "hcm" or "webster"
+        """
+        attribute = {'hcm': 'hcm_delay', 'webster': 'webster_delay'}[model]
+        total_flow = sum(a.flow for a in self.approaches.values())
+        if total_flow == 0:
+            return 0.0
+        return sum(a.flow * getattr(a, attribute) for a in self.approaches.values() if a.flow) / total_flow
+
+    def summary(self) -> Dict[str, float]:
+        """Headline values, named like SimulationMetrics.summary where they correspond."""
+        return {
+            'avg_wait_time': self.average_delay('hcm'),
+            'webster_delay': self.average_delay('webster'),
+            'degree_of_saturation': max((a.degree_of_saturation for a in self.approaches.values()), default=0.0),
+            'critical_degree_of_saturation': self.critical_degree_of_saturation,
+            'max_queue': max((a.max_queue for a in self.approaches.values()), default=0.0),
+            'cycle': self.cycle,
+        }
+
+
+def webster_delay(cycle: float, green_ratio: float, flow: float, degree: float) -> float:
+    """
+    Webster's average delay per vehicle.
+
+    Args:
+        cycle: Cycle length (seconds)
+        green_ratio: Effective green / cycle
+        flow: Arrivals per second
+        degree: Degree of saturation
+
+    Returns:
+        Seconds per vehicle (inf at or above saturation)
+    """
+    if degree >= 1.0:
+        return math.inf
+    if flow <= 0:
+        return 0.0
+    uniform = cycle * (1 - green_ratio) ** 2 / (2 * (1 - green_ratio * degree))
+    random = degree ** 2 / (2 * flow * (1 - degree))
+    correction = 0.65 * (cycle / flow ** 2) ** (1 / 3) * degree ** (2 + 5 * green_ratio)
+    return max(0.0, uniform + random - correction)
+
+
+def hcm_delay(cycle: float, green_ratio: float, capacity: float, degree: float,
+              period: float) -> float:
+    """
+    HCM control delay per vehicle (uniform plus incremental, no initial queue).
+
+    Args:
+        cycle: Cycle length (seconds)
+        green_ratio: Effective green / cycle
+        capacity: Departures per second
+        degree: Degree of saturation
+        period: Analysis period (seconds)
+
+    Returns:
+        Seconds per vehicle
+    """
+    uniform = 0.5 * cycle * (1 - green_ratio) ** 2 / (1 - min(1.0, degree) * green_ratio)
+    return uniform + incremental_delay(capacity, degree, period)
+
+
+def incremental_delay(capacity: float, degree: float, period: float) -> float:
+    """
+    HCM incremental (random and oversaturation) delay per vehicle.
+
+    Approaches (degree - 1) * period / 2 when oversaturated, the average
+    extra wait under deterministic queue growth.
+    """
+    if capacity <= 0:
+        return math.inf
+    return period / 4 * (
+        (degree - 1) + math.sqrt((degree - 1) ** 2 + 8 * HCM_K * HCM_I * degree / (capacity * period))
+    )
+
+
+def estimate_signal(greens: Dict[str, float], yellow: float, arrival_rates: Dict[Direction, float],
+                    saturation_flow: float = 1.0, duration: float = 1800.0,
+                    phase_plan: PhasePlan = None, lane_layout: LaneLayout = None,
+                    lost_time: float = 0.0) -> SignalEstimate:
+    """
+    Estimate delay, saturation and queues for a phase split.
+
+    Args:
+        greens: Displayed green per phase name (every phase of the plan)
+        yellow: Yellow after each green (seconds)
+        arrival_rates: Arrivals per second per approach
+        saturation_flow: Departures per second per lane during green
+            (lanes with their own saturation flow use it)
+        duration: Analysis period (seconds), as the simulated duration
+        phase_plan: Phase plan (defaults to two-phase NS/EW)
+        lane_layout: Lane layout (defaults to one shared lane per approach)
+        lost_time: Start-up lost time at the beginning of each green (seconds)
+
+    Raises:
+        ValueError: If a phase of the plan has no green time
+    """
+    plan = phase_plan or TWO_PHASE_PLAN
+    layout = lane_layout or SINGLE_LANE_LAYOUT
+    missing = [p.name for p in plan.phases if p.name not in greens]
+    if missing:
+        raise ValueError(f"No green time for phases {missing}")
+    cycle = sum(greens[p.name] + yellow for p in plan.phases)
+    effective = [max(0.0, greens[p.name] - lost_time) for p in plan.phases]
+    estimate = SignalEstimate(cycle=cycle, greens={p.name: greens[p.name] for p in plan.phases})
+
+    critical: Dict[int, float] = {}  # Highest flow ratio per phase
+    for d in Direction:
+        flow = arrival_rates.get(d, 0.0)
+        served = [i for i, directions in enumerate(plan.directions) if d in directions]
+        green = sum(effective[i] for i in served)
+        lane_flow = sum(
+            layout.lanes[lane].saturation_flow if layout.lanes[lane].saturation_flow is not None
+            else saturation_flow
+            for lane in layout.lanes_by_direction[d]
+        )
+        ratio = green / cycle
+        capacity = lane_flow * ratio
+        degree = flow / capacity if capacity > 0 else (math.inf if flow > 0 else 0.0)
+        red = cycle - green
+        overflow = max(0.0, (flow - capacity) * duration)
+        if capacity > 0 and flow > 0:
+            # Time-dependent overflow queue (the HCM incremental delay times capacity)
+            overflow = max(overflow, capacity * incremental_delay(capacity, degree, duration))
+        estimate.approaches[d] = ApproachEstimate(
+            direction=d,
+            flow=flow,
+            capacity=capacity,
+            degree_of_saturation=degree,
+            webster_delay=webster_delay(cycle, ratio, flow, degree),
+            hcm_delay=hcm_delay(cycle, ratio, capacity, degree, duration) if flow > 0 else 0.0,
+            max_queue=flow * red + overflow,
+        )
+        for i in served:
+            if lane_flow > 0:
+                critical[i] = max(critical.get(i, 0.0), flow / lane_flow)
+    lost = sum(yellow + min(lost_time, greens[p.name]) for p in plan.phases)
+    if cycle > lost:
+        estimate.critical_degree_of_saturation = sum(critical.values()) * cycle / (cycle - lost)
+    else:
+        estimate.critical_degree_of_saturation = math.inf
+    return estimate
+
+
+def estimate_fixed_timer(controller: FixedTimerController, arrival_rates: Dict[Direction, float],
+                         saturation_flow: float = 1.0, duration: float = 1800.0,
+                         phase_plan: PhasePlan = None, lane_layout: LaneLayout = None,
+                         lost_time: float = 0.0) -> SignalEstimate:
+    """
+    Estimate a FixedTimerController's performance (arguments as in estimate_signal).
+    """
+    plan = phase_plan or TWO_PHASE_PLAN
+    greens = {p.name: controller.get_green_time(p) for p in plan.phases}
+    return estimate_signal(greens, controller.yellow_time, arrival_rates, saturation_flow,
+                           duration, plan, lane_layout, lost_time)
+
+
+def screen_splits(splits: Iterable[Dict[str, float]], yellow: float,
+                  arrival_rates: Dict[Direction, float], saturation_flow: float = 1.0,
+                  max_degree: float = 1.0, **kwargs) -> List[Tuple[Dict[str, float], SignalEstimate]]:
+    """
+    Keep the phase splits worth simulating.
+
+    Args:
+        splits: Candidate green times per phase name
+        yellow: Yellow after each green (seconds)
+        arrival_rates: Arrivals per second per approach
+        saturation_flow: Departures per second per lane during green
+        max_degree: Drop splits where any approach's degree of saturation
+            reaches this
+        kwargs: Passed on to estimate_signal
+
+    Returns:
+        (split, estimate) of the remaining splits, lowest HCM delay first
+    """
+    kept = []
+    for split in splits:
+        estimate = estimate_signal(split, yellow, arrival_rates, saturation_flow, **kwargs)
+        if max(a.degree_of_saturation for a in estimate.approaches.values()) < max_degree:
+            kept.append((split, estimate))
+    kept.sort(key=lambda item: item[1].average_delay('hcm'))
+    return kept
@@ -291,11 +291,11 @@ class TrafficAnimator:
         
         # Draw vehicles for each direction
         for direction in Direction:
-            queue = state.queues[direction]
+            # Draw up to max_vehicles_display (to avoid clutter)
+            handles = state.queue_handles(direction, self.max_vehicles_display)
             config = vehicle_configs[direction]
             
-            # Draw up to max_vehicles_display (to avoid clutter)
-            num_to_draw = min(len(queue), self.max_vehicles_display)
+            num_to_draw = len(handles)
             for i in range(num_to_draw):
                 x = config['start_x'] + i * config['dx']
                 y = config['start_y'] + i * config['dy']
@@ -395,7 +395,8 @@ class TrafficAnimator:
             f'Arrived:  {metrics.total_vehicles_arrived:4d}\n'
             f'Departed: {metrics.total_vehicles_departed:4d}\n'
             f'Waiting:  {vehicles_waiting:4d}\n'
-            f'Avg Wait: {avg_wait:5.1f}s'
+            f'Avg Wait: {avg_wait:5.1f}s\n'
+            f'P95 Wait: {metrics.get_percentile_wait_time(95):5.1f}s'
         )
         self.stats_text.set_text(stats_info)
         
@@ -0,0 +1,433 @@
+"""
+Binary checkpoints of simulator state.
+
+A checkpoint holds everything that changes while a simulation runs: the
+intersection state, the controller's internal state, the arrival process RNG
+streams and the metrics recorded so far. Configuration (phase plan, lane
+layout, saturation flows, ...) is not stored; a checkpoint is restored into a
+simulator built with a compatible configuration, which is what allows forking
+a warmed-up state into what-if branches with different controllers.
+
+Checkpoints are compressed NumPy archives (``np.savez_compressed``) holding
+only plain arrays, so loading one never unpickles arbitrary objects.
+
+Per-step histories (queue and phase history, kept wait times, streaming
+estimators' group means) only grow. ``CheckpointWriter``, used by
+``TrafficSimulator.run`` for periodic checkpoints, therefore writes each
+history row once: the checkpoint file holds everything else plus the
+history lengths, and every write adds a segment with just the new rows to
+the ``<path>.history`` directory next to it. ``load_checkpoint`` reads both.
+"""
+import io
+import os
+import shutil
+import uuid
+from dataclasses import fields
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from .models import (
+    IntersectionState, SimulationMetrics, WaitHistogram, ArrivalProcess, SignalState,
+    OverflowBuffer, DIRECTIONS, DIRECTION_INDEX
+)
+from .analysis import SteadyStateEstimator
+
+FORMAT_VERSION = 1
+
+# IntersectionState fields owned by the simulator configuration, or encoded
+# explicitly below, rather than by the generic field encoder
+_STATE_CONFIG_FIELDS = {'phase_plan', 'lane_layout', 'storage_capacity'}
+_STATE_SPECIAL_FIELDS = {'active_phase', 'signal_state', 'lane_queues', 'vehicles', 'overflow'}
+_METRICS_SPECIAL_FIELDS = {'wait_times', 'wait_histogram', 'direction_waits', 'queue_history', 'phase_history'}
+HISTORY_SUFFIX = '.history'  # Directory of history segments next to an incremental checkpoint
+
+
+def _encode_fields(obj, prefix: str, skip: set, arrays: Dict[str, np.ndarray]):
+    """Encode scalar, array and per-direction dict fields of a dataclass."""
+    for f in fields(obj):
+        if f.name in skip:
+            continue
+        value = getattr(obj, f.name)
+        if isinstance(value, dict):
+            value = [value[d] for d in DIRECTIONS]
+        arrays[f'{prefix}{f.name}'] = np.asarray(value)
+
+
+def _decode_fields(obj, prefix: str, skip: set, arrays) -> None:
+    """Inverse of _encode_fields, writing values back onto obj."""
+    for f in fields(obj):
+        key = f'{prefix}{f.name}'
+        if f.name in skip:
+            continue
+        value = arrays[key]
+        current = getattr(obj, f.name)
+        if isinstance(current, dict):
+            setattr(obj, f.name, {d: v for d, v in zip(DIRECTIONS, value.tolist())})
+        elif isinstance(current, np.ndarray):
+            setattr(obj, f.name, value.copy())
+        else:
+            setattr(obj, f.name, value.item())
+
+
+def _encode_state(state: IntersectionState, arrays: Dict[str, np.ndarray]):
+    """Encode intersection state; queued vehicles become packed arrays."""
+    _encode_fields(state, 'state/', _STATE_CONFIG_FIELDS | _STATE_SPECIAL_FIELDS, arrays)
+    arrays['state/active_phase'] = np.asarray(state.active_phase.name)
+    arrays['state/signal_state'] = np.asarray(state.signal_state.value)
+
+    handles = np.concatenate([queue.to_array() for queue in state.lane_queues])
+    arrays['state/lane_lengths'] = np.array([len(q) for q in state.lane_queues], dtype=np.int64)
+    arrays['state/arrival_times'] = state.vehicles.arrival_time[handles]
+    arrays['state/turns'] = state.vehicles.turn[handles]
+
+    for d in DIRECTIONS:
+        buffer = state.overflow[d]
+        arrays[f'state/overflow/{d.value}/arrival_times'] = np.asarray(buffer.arrival_times[buffer.head:])
+        arrays[f'state/overflow/{d.value}/turns'] = np.asarray(buffer.turns[buffer.head:])
+
+
+def _decode_state(state: IntersectionState, arrays):
+    """Restore intersection state encoded by _encode_state."""
+    layout = state.lane_layout
+    lane_lengths = arrays['state/lane_lengths']
+    if len(lane_lengths) != layout.n_lanes:
+        raise ValueError(
+            f"Checkpoint has {len(lane_lengths)} lanes but the simulator has {layout.n_lanes}"
+        )
+    _decode_fields(state, 'state/', _STATE_CONFIG_FIELDS | _STATE_SPECIAL_FIELDS, arrays)
+    state.active_phase = state.phase_plan.get(str(arrays['state/active_phase']))
+    state.signal_state = SignalState(str(arrays['state/signal_state']))
+
+    arrival_times = arrays['state/arrival_times'].tolist()
+    turns = arrays['state/turns'].tolist()
+    allocate = state.vehicles.allocate
+    start = 0
+    for lane_id, length in enumerate(lane_lengths.tolist()):
+        queue = state.lane_queues[lane_id]
+        for handle in queue:
+            state.vehicles.release(handle)
+        queue.clear()
+        direction = DIRECTION_INDEX[layout.lanes[lane_id].direction]
+        for i in range(start, start + length):
+            queue.append(allocate(arrival_times[i], direction, turns[i], lane_id))
+        start += length
+
+    for d in DIRECTIONS:
+        buffer = OverflowBuffer()
+        buffer.arrival_times.fromlist(arrays[f'state/overflow/{d.value}/arrival_times'].tolist())
+        buffer.turns.fromlist(arrays[f'state/overflow/{d.value}/turns'].tolist())
+        state.overflow[d] = buffer
+
+
+def _encode_arrivals(process: ArrivalProcess, arrays: Dict[str, np.ndarray]):
+    """Encode the arrival process state (RNG streams or stream position)."""
+    for key, value in process.get_state().items():
+        arrays[f'arrivals/{key}'] = np.asarray(value)
+
+
+def _decode_arrivals(process: ArrivalProcess, arrays):
+    """Restore arrival process state."""
+    prefix = 'arrivals/'
+    process.set_state({
+        key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)
+    })
+
+
+def _encode_floats(rows: list) -> Dict[str, np.ndarray]:
+    return {'': np.asarray(rows, dtype=float)}
+
+
+def _encode_queue_rows(rows: list) -> Dict[str, np.ndarray]:
+    return {'': np.array([[snapshot[d] for d in DIRECTIONS] for snapshot in rows],
+                         dtype=np.int64).reshape(-1, len(DIRECTIONS))}
+
+
+def _encode_phase_rows(rows: list) -> Dict[str, np.ndarray]:
+    return {
+        '/time': np.array([p[0] for p in rows], dtype=float),
+        '/phase': np.array([p[1] for p in rows], dtype=str),
+        '/state': np.array([p[2] for p in rows], dtype=str),
+    }
+
+
+def _series(simulator) -> Dict[str, Tuple[list, Callable[[list], Dict[str, np.ndarray]]]]:
+    """Growing per-run lists by array key prefix, with an encoder for a slice of rows."""
+    metrics = simulator.metrics
+    series = {
+        'metrics/queue_history': (metrics.queue_history, _encode_queue_rows),
+        'metrics/phase_history': (metrics.phase_history, _encode_phase_rows),
+    }
+    if metrics.wait_times is not None:
+        series['metrics/wait_times'] = (metrics.wait_times, _encode_floats)
+    for name, estimator in simulator.estimators.items():
+        series[f'estimators/{name}/group_means'] = (estimator.group_means, _encode_floats)
+    return series
+
+
+def _encode_series(simulator, arrays: Dict[str, np.ndarray], start: Dict[str, int] = None):
+    """Encode every series from its start row (default: all rows)."""
+    start = start or {}
+    for prefix, (rows, encode) in _series(simulator).items():
+        for suffix, values in encode(rows[start.get(prefix, 0):]).items():
+            arrays[prefix + suffix] = values
+
+
+def _series_prefix(key: str, prefixes) -> str:
+    for prefix in prefixes:
+        if key == prefix or key.startswith(prefix + '/'):
+            return prefix
+    return None
+
+
+def _encode_estimators(estimators: Dict[str, SteadyStateEstimator], arrays: Dict[str, np.ndarray]):
+    """Encode streaming estimators (their group means are a series)."""
+    arrays['estimators/names'] = np.array(list(estimators), dtype=str)
+    for name, estimator in estimators.items():
+        for key, value in estimator.get_state().items():
+            arrays[f'estimators/{name}/{key}'] = np.asarray(value)
+
+
+def _decode_estimators(arrays) -> Dict[str, SteadyStateEstimator]:
+    estimators = {}
+    for name in arrays['estimators/names'].tolist():
+        prefix = f'estimators/{name}/'
+        estimator = SteadyStateEstimator()
+        estimator.set_state({
+            key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)
+        })
+        estimator.group_means = arrays[f'{prefix}group_means'].tolist()
+        estimators[name] = estimator
+    return estimators
+
+
+def _encode_metrics(metrics: SimulationMetrics, arrays: Dict[str, np.ndarray]):
+    """Encode accumulated metrics (histories are encoded as series)."""
+    _encode_fields(metrics, 'metrics/', _METRICS_SPECIAL_FIELDS, arrays)
+    arrays['metrics/wait_histogram/counts'] = np.asarray(metrics.wait_histogram.counts, dtype=np.int64)
+    arrays['metrics/wait_histogram/resolution'] = np.asarray(metrics.wait_histogram.resolution)
+    arrays['metrics/wait_histogram/total'] = np.asarray(metrics.wait_histogram.total)
+    for d in DIRECTIONS:
+        histogram = metrics.direction_waits[d]
+        arrays[f'metrics/direction_waits/{d.value}/counts'] = np.asarray(histogram.counts, dtype=np.int64)
+        arrays[f'metrics/direction_waits/{d.value}/total'] = np.asarray(histogram.total)
+
+
+def _decode_metrics(arrays, metrics: SimulationMetrics) -> SimulationMetrics:
+    """
+    Rebuild metrics encoded by _encode_metrics.
+
+    Args:
+        arrays: Checkpoint arrays
+        metrics: Empty metrics of the target simulator
+    """
+    _decode_fields(metrics, 'metrics/', _METRICS_SPECIAL_FIELDS, arrays)
+    if metrics.wait_times is not None and 'metrics/wait_times' in arrays:  # Kept by the source simulator
+        metrics.wait_times = arrays['metrics/wait_times'].tolist()
+    metrics.wait_histogram = WaitHistogram(
+        float(arrays['metrics/wait_histogram/resolution']),
+        arrays['metrics/wait_histogram/counts'].tolist(),
+        float(arrays['metrics/wait_histogram/total'])
+    )
+    for d in DIRECTIONS:
+        prefix = f'metrics/direction_waits/{d.value}/'
+        metrics.direction_waits[d] = WaitHistogram(
+            metrics.wait_histogram.resolution,
+            arrays[f'{prefix}counts'].tolist(),
+            float(arrays[f'{prefix}total'])
+        )
+    metrics.queue_history = [
+        dict(zip(DIRECTIONS, row)) for row in arrays['metrics/queue_history'].tolist()
+    ]
+    metrics.phase_history = list(zip(
+        arrays['metrics/phase_history/time'].tolist(),
+        arrays['metrics/phase_history/phase'].tolist(),
+        arrays['metrics/phase_history/state'].tolist()
+    ))
+    return metrics
+
+
+def _checkpoint_arrays(simulator) -> Dict[str, np.ndarray]:
+    """Every array of a checkpoint except the series."""
+    arrays = {
+        'format_version': np.asarray(FORMAT_VERSION),
+        'current_time': np.asarray(simulator.current_time),
+        'controller/name': np.asarray(simulator.controller.get_name()),
+    }
+    for key, value in simulator.controller.get_state().items():
+        arrays[f'controller/state/{key}'] = np.asarray(value)
+    _encode_state(simulator.state, arrays)
+    _encode_arrivals(simulator.arrival_process, arrays)
+    _encode_metrics(simulator.metrics, arrays)
+    _encode_estimators(simulator.estimators, arrays)
+    return arrays
+
+
+def _compress(arrays: Dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def encode_checkpoint(simulator) -> bytes:
+    """
+    Serialize a simulator's running state, histories included.
+
+    Args:
+        simulator: TrafficSimulator to snapshot
+
+    Returns:
+        Compressed checkpoint bytes
+    """
+    arrays = _checkpoint_arrays(simulator)
+    _encode_series(simulator, arrays)
+    return _compress(arrays)
+
+
+def _load_arrays(data: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        return {key: archive[key] for key in archive.files}
+
+
+def _segment_path(history_dir: str, generation: str, index: int) -> str:
+    return os.path.join(history_dir, f'{generation}-{index:06d}.npz')
+
+
+def _attach_segments(arrays: Dict[str, np.ndarray], history_dir: str):
+    """Prepend the rows stored in history segments to an incremental checkpoint's series."""
+    generation = str(arrays['history/generation'])
+    lengths = {
+        key[len('history/length/'):]: int(value)
+        for key, value in arrays.items() if key.startswith('history/length/')
+    }
+    parts: Dict[str, List[np.ndarray]] = {}
+    for index in range(int(arrays['history/segments'])):
+        with open(_segment_path(history_dir, generation, index), 'rb') as f:
+            for key, values in _load_arrays(f.read()).items():
+                parts.setdefault(key, []).append(values)
+    for key in list(arrays):
+        prefix = _series_prefix(key, lengths)
+        if prefix is not None:
+            # Segments written after this checkpoint (e.g. before a crash) are cut off
+            arrays[key] = np.concatenate(parts.get(key, []) + [arrays[key]])[:lengths[prefix]]
+
+
+def decode_checkpoint(simulator, data: bytes, restore_controller: bool = True,
+                      history_dir: str = None):
+    """
+    Load a checkpoint into a simulator, replacing its state and metrics.
+
+    Args:
+        simulator: TrafficSimulator with a configuration compatible with
+            the one that produced the checkpoint
+        data: Bytes returned by encode_checkpoint (or a checkpoint file)
+        restore_controller: Also restore the controller's internal state
+            (disable when forking into a different controller)
+        history_dir: History segments of a checkpoint written by
+            CheckpointWriter (load_checkpoint passes it)
+
+    Raises:
+        ValueError: If the checkpoint format or lane layout does not match,
+            or an incremental checkpoint is given without its history
+    """
+    arrays = _load_arrays(data)
+    version = int(arrays['format_version'])
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version: {version}")
+    if 'history/generation' in arrays:
+        if history_dir is None:
+            raise ValueError("Checkpoint keeps its histories in a separate directory; use load_checkpoint")
+        _attach_segments(arrays, history_dir)
+
+    state = simulator._new_state()
+    _decode_state(state, arrays)
+    _decode_arrivals(simulator.arrival_process, arrays)
+    metrics = _decode_metrics(arrays, simulator._new_metrics())
+
+    if restore_controller:
+        prefix = 'controller/state/'
+        simulator.controller.set_state({
+            key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)
+        })
+
+    simulator.state = state
+    simulator.metrics = metrics
+    simulator.current_time = float(arrays['current_time'])
+    simulator.estimators = _decode_estimators(arrays)
+
+
+class CheckpointWriter:
+    """
+    Repeated checkpoints of a run to one file, writing history rows once.
+
+    Each write replaces the checkpoint file (state, controller, arrival
+    streams, accumulated metrics, estimator sums and the history lengths)
+    and adds a segment holding only the history rows recorded since the
+    previous write to the ``<path>.history`` directory, so checkpointing a
+    run k times costs O(run length), not O(k * run length). A new run (or
+    restored metrics) starts a new generation of segments; older ones are
+    deleted once the checkpoint file no longer refers to them.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize writer.
+
+        Args:
+            path: Checkpoint file (history segments go to path + HISTORY_SUFFIX)
+        """
+        self.path = path
+        self.history_dir = path + HISTORY_SUFFIX
+        self._metrics = None  # Metrics object whose histories the segments hold
+        self._generation = None
+        self._written: Dict[str, int] = {}
+        self._segments = 0
+
+    def write(self, simulator):
+        """Checkpoint a simulator."""
+        if simulator.metrics is not self._metrics or set(_series(simulator)) != set(self._written):
+            self._metrics = simulator.metrics
+            self._generation = uuid.uuid4().hex[:12]
+            self._written = {prefix: 0 for prefix in _series(simulator)}
+            self._segments = 0
+        lengths = {prefix: len(rows) for prefix, (rows, _) in _series(simulator).items()}
+
+        if any(lengths[prefix] > self._written[prefix] for prefix in lengths):
+            segment = {}
+            _encode_series(simulator, segment, self._written)
+            os.makedirs(self.history_dir, exist_ok=True)
+            _write_atomic(_segment_path(self.history_dir, self._generation, self._segments),
+                          _compress(segment))
+            self._segments += 1
+            self._written = lengths
+
+        arrays = _checkpoint_arrays(simulator)
+        _encode_series(simulator, arrays, lengths)  # Empty, typed placeholders for the series
+        arrays['history/generation'] = np.asarray(self._generation)
+        arrays['history/segments'] = np.asarray(self._segments)
+        for prefix, length in lengths.items():
+            arrays[f'history/length/{prefix}'] = np.asarray(length)
+        _write_atomic(self.path, _compress(arrays))
+        self._remove_stale_segments()
+
+    def _remove_stale_segments(self):
+        for name in os.listdir(self.history_dir) if os.path.isdir(self.history_dir) else ():
+            if not name.startswith(f'{self._generation}-'):
+                os.remove(os.path.join(self.history_dir, name))
+
+
+def save_checkpoint(simulator, path: str):
+    """Write a self-contained checkpoint of a simulator to a file (atomically replaced)."""
+    _write_atomic(path, encode_checkpoint(simulator))
+    shutil.rmtree(path + HISTORY_SUFFIX, ignore_errors=True)  # Left by an earlier CheckpointWriter
+
+
+def load_checkpoint(simulator, path: str, restore_controller: bool = True):
+    """Restore a simulator from a checkpoint file (self-contained or written by CheckpointWriter)."""
+    with open(path, 'rb') as f:
+        decode_checkpoint(simulator, f.read(), restore_controller, path + HISTORY_SUFFIX)
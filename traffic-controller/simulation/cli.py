@@ -0,0 +1,414 @@
+"""
+Command-line entry point for batch simulation jobs.
+
+    python -m simulation list
+    python -m simulation jobs asymmetric --seeds 100          # JSON lines, one job each
+    python -m simulation run asymmetric --backend batch --seeds 1000 \\
+        --output results/sweep --csv results/sweep.csv
+    python -m simulation serve asymmetric --controller adaptive --port 9200 --intersections 4
+    python -m simulation lockstep asymmetric --controller adaptive --intersections 50 --speed 100x
+    python -m simulation animate asymmetric --controllers fixed,adaptive --duration 120 \
+        --output results/comparison.gif
+    python -m simulation surrogate-fit adaptive --sample 300 --output results/surrogate_adaptive.npz
+    python -m simulation surrogate-query results/surrogate_adaptive.npz --rates 0.3,0.1,0.3,0.1 \
+        --set min_green=5 --set max_green=40 --set extension_threshold=2
+
+``run`` expands a scenario (by name from ``scenarios/`` or by path) into jobs,
+runs them with the chosen backend and appends every result row to a
+partitioned results dataset as it completes.
+
+``serve`` runs the scenario's controllers as a real-time service
+(``simulation.service``) for one or more intersections, fed over TCP or by
+simulated detectors.
+
+``lockstep`` simulates the scenario with its controller running in a separate
+process (``simulation.lockstep``), started automatically or, with
+``--external``, waited for: run ``lockstep-controller`` (or any
+``LockstepClient``) against the printed address.
+
+``animate`` renders the scenario's controllers side by side on one shared
+arrival stream (``simulation.comparison_animation``), one worker process per
+panel.
+
+``surrogate-fit`` trains a ``simulation.surrogate`` model on the run cache,
+optionally simulating a sampled design into it first; ``surrogate-query``
+answers a what-if from a saved model and says when to simulate instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List
+from .scenario import load_scenario, list_scenarios, scenario_path
+from .batch import BACKENDS, expand_jobs, run_jobs
+
+
+def _load(args):
+    scenario = load_scenario(args.scenario)
+    if args.seeds is not None:
+        scenario.seeds = list(range(args.seed_start, args.seed_start + args.seeds))
+    if args.duration is not None:
+        scenario.duration = args.duration
+    controllers = args.controllers.split(',') if args.controllers else None
+    return scenario, expand_jobs(scenario, controllers)
+
+
+def _list(args) -> int:
+    for name in list_scenarios():
+        scenario = load_scenario(name)
+        print(f"{name:20s} {len(scenario.controllers)} controllers x {len(scenario.seeds)} seeds, "
+              f"{scenario.duration:.0f}s  {scenario.title}")
+    return 0
+
+
+def _jobs(args) -> int:
+    scenario, jobs = _load(args)
+    for job in jobs:
+        print(json.dumps(job.to_dict()))
+    return 0
+
+
+def _run(args) -> int:
+    from .results_store import ResultsWriter  # Pulls in pandas; only needed here
+
+    scenario, jobs = _load(args)
+    backend = args.backend
+    if args.workers and backend != 'serial':
+        backend += f", workers={args.workers}"
+    print(f"Scenario {scenario.name} ({scenario_path(args.scenario)}): {len(jobs)} jobs, "
+          f"backend={backend}", file=sys.stderr)
+    rows = []
+    started = time.monotonic()
+    with ResultsWriter(args.output, batch_size=args.batch_size, overwrite=args.overwrite) as writer:
+        for i, row in enumerate(run_jobs(scenario, jobs, args.backend, args.workers), 1):
+            writer.append(row)
+            if args.csv:
+                rows.append(row)
+            if not args.quiet:
+                print(f"[{i}/{len(jobs)}] {row['controller']} seed {row['seed']}: "
+                      f"avg wait {row['avg_wait_time']:.2f}s", file=sys.stderr)
+    elapsed = time.monotonic() - started
+    print(f"Done: {len(jobs)} jobs in {elapsed:.1f}s, results in {args.output}", file=sys.stderr)
+    if args.csv:
+        import pandas as pd
+        pd.DataFrame(rows).sort_values(['seed', 'controller']).to_csv(args.csv, index=False)
+    return 0
+
+
+async def _serve_async(args, scenario):
+    from .service import ControllerService, SimulatedDetectors
+
+    service = ControllerService(tick=args.tick, time_scale=args.time_scale)
+    names = [f'{scenario.name}-{i}' for i in range(args.intersections)]
+    for name in names:
+        service.add_intersection(name, scenario.build_controller(args.controller))
+    if not args.quiet:
+        service.add_listener(lambda c: print(json.dumps(c.to_dict()), flush=True))
+    server = None
+    if args.port is not None:
+        server = await service.serve_tcp(args.host, args.port)
+        port = server.sockets[0].getsockname()[1]
+        print(f"Accepting detector events on {args.host}:{port}", file=sys.stderr)
+    detectors = []
+    if args.simulate:
+        detectors = [
+            SimulatedDetectors(service, name, scenario.arrival_rates, scenario.saturation_flow,
+                               seed=seed).start()
+            for seed, name in enumerate(names)
+        ]
+    try:
+        await service.run(args.duration)
+    finally:
+        for detector in detectors:
+            detector.stop()
+        if server is not None:
+            server.close()
+    latency = service.latency
+    for agent in service.agents.values():
+        waits = list(agent.wait_times)
+        print(f"{agent.name}: {agent.arrivals} arrivals, {agent.departures} departures, "
+              f"avg wait {sum(waits) / len(waits) if waits else 0.0:.1f}s", file=sys.stderr)
+    print(f"Ticks {latency.ticks}, overruns {latency.overruns}, missed {latency.missed_ticks}, "
+          f"p99 latency {latency.percentile(99) * 1000:.2f} ms", file=sys.stderr)
+
+
+def _serve(args) -> int:
+    scenario = load_scenario(args.scenario)
+    _check_controller(scenario, args.controller)
+    if args.port is None and not args.simulate:
+        raise ValueError("Nothing would feed the service: pass --port and/or --simulate")
+    try:
+        asyncio.run(_serve_async(args, scenario))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _parse_address(text: str):
+    """Unix socket path, or host:port for TCP."""
+    match = re.fullmatch(r'([\w.-]*):(\d+)', text)
+    if match:
+        return match.group(1) or '127.0.0.1', int(match.group(2))
+    return text
+
+
+def _format_address(address) -> str:
+    return address if isinstance(address, str) else f'{address[0]}:{address[1]}'
+
+
+def _check_controller(scenario, label: str):
+    if label not in scenario.controllers:
+        raise ValueError(f"Scenario {scenario.name!r} has no controller {label!r}")
+
+
+def _lockstep(args) -> int:
+    from .clock import RealTimeClock, make_clock
+    from .lockstep import ControllerLink, run_lockstep
+
+    scenario = load_scenario(args.scenario)
+    _check_controller(scenario, args.controller)
+    duration = args.duration or scenario.duration
+    clock = make_clock(args.speed)
+    with ControllerLink(args.intersections) as link:
+        address = _format_address(link.listen(_parse_address(args.address) if args.address else None))
+        command = ['lockstep-controller', args.scenario, '--controller', args.controller, '--connect', address]
+        process = None
+        if args.external:
+            print(f"Waiting for the controller process: python -m simulation {' '.join(command)}",
+                  file=sys.stderr)
+        else:
+            package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            env = dict(os.environ)
+            env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+            process = subprocess.Popen([sys.executable, '-m', 'simulation', *command, '--quiet'], env=env)
+        try:
+            link.accept(timeout=args.timeout)
+            simulators = []
+            for i in range(args.intersections):
+                simulator = scenario.build_simulator(args.controller, seed=i)
+                simulator.controller = link.controller(i)
+                simulators.append(simulator)
+            print(f"{args.intersections} intersections, controller {link.controller_name}, clock {clock!r}",
+                  file=sys.stderr)
+            started = time.monotonic()
+            run_lockstep(simulators, duration, clock=clock)
+            elapsed = time.monotonic() - started
+        finally:
+            link.close()
+            if process is not None:
+                process.wait(timeout=10)
+
+    summaries = [simulator.get_metrics().summary(duration) for simulator in simulators]
+    avg_wait = sum(s['avg_wait_time'] for s in summaries) / len(summaries)
+    print(f"Simulated {duration:.0f}s in {elapsed:.2f}s ({duration / elapsed:.0f}x real time), "
+          f"avg wait {avg_wait:.2f}s", file=sys.stderr)
+    print(f"Round trips {link.round_trips}, mean {link.round_trip_time / max(1, link.round_trips) * 1e6:.0f} us, "
+          f"max {link.max_round_trip * 1e6:.0f} us", file=sys.stderr)
+    if isinstance(clock, RealTimeClock):
+        print(f"Late steps {clock.late_steps}, max lateness {clock.max_lateness * 1000:.1f} ms", file=sys.stderr)
+    if args.verify:
+        local = []
+        for i in range(args.intersections):
+            simulator = scenario.build_simulator(args.controller, seed=i)
+            simulator.run(duration)
+            local.append(simulator.get_metrics().summary(duration))
+        if local != summaries:
+            print("Lockstep results differ from the in-process controller", file=sys.stderr)
+            return 1
+        print("Lockstep results match the in-process controller", file=sys.stderr)
+    return 0
+
+
+def _lockstep_controller(args) -> int:
+    from .lockstep import LockstepClient
+
+    scenario = load_scenario(args.scenario)
+    _check_controller(scenario, args.controller)
+    client = LockstepClient(lambda i: scenario.build_controller(args.controller))
+    steps = client.serve(_parse_address(args.connect))
+    if not args.quiet:
+        print(f"Served {steps} steps", file=sys.stderr)
+    return 0
+
+
+def _animate(args) -> int:
+    from .comparison_animation import render_scenario_comparison
+
+    scenario = load_scenario(args.scenario)
+    labels = args.controllers.split(',') if args.controllers else list(scenario.controllers)
+    for label in labels:
+        _check_controller(scenario, label)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    started = time.monotonic()
+    results = render_scenario_comparison(
+        scenario, labels, args.duration, args.output, seed=args.seed, speed_multiplier=args.speed,
+        columns=args.columns, dpi=args.dpi, workers=args.workers
+    )
+    print(f"Rendered {len(labels)} panels x {args.duration:.0f}s to {args.output} in "
+          f"{time.monotonic() - started:.1f}s", file=sys.stderr)
+    for label, metrics in zip(labels, results):
+        print(f"  {label:12s} avg wait {metrics.get_average_wait_time():6.2f}s, "
+              f"p95 {metrics.get_percentile_wait_time(95):6.2f}s, "
+              f"departed {metrics.total_vehicles_departed}", file=sys.stderr)
+    return 0
+
+
+def _surrogate_fit(args) -> int:
+    from .run_cache import BackgroundRunner, RunCache
+    from .surrogate import Surrogate, sample_specs
+
+    cache = RunCache(args.cache)
+    if args.sample:
+        specs = [spec for spec in sample_specs(args.controller, args.sample, duration=args.duration,
+                                               seed=args.seed) if spec not in cache]
+        print(f"Simulating {len(specs)} sampled runs into {args.cache}", file=sys.stderr)
+        with BackgroundRunner(cache, args.workers) as runner:
+            runner.prefetch(specs)
+            while runner.pending:
+                runner.poll()
+                time.sleep(0.2)
+    started = time.monotonic()
+    surrogate = Surrogate.fit(cache.results(), args.controller, max_points=args.max_points, seed=args.seed)
+    print(f"Fitted {args.controller} surrogate on {surrogate.n_training} runs in "
+          f"{time.monotonic() - started:.1f}s", file=sys.stderr)
+    for name, low, high in zip(surrogate.feature_names, surrogate.lower, surrogate.upper):
+        print(f"  {name:20s} {low:g} .. {high:g}", file=sys.stderr)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    surrogate.save(args.output)
+    print(f"Saved to {args.output}", file=sys.stderr)
+    return 0
+
+
+def _surrogate_query(args) -> int:
+    from .models import Direction
+    from .surrogate import METRICS, Surrogate
+
+    surrogate = Surrogate.load(args.model)
+    rates = [float(value) for value in args.rates.split(',')]
+    if len(rates) != len(Direction):
+        raise ValueError(f"--rates needs {len(Direction)} values (N,E,S,W), got {len(rates)}")
+    params = {}
+    for item in args.set:
+        name, _, value = item.partition('=')
+        params[name.strip()] = float(value)
+    prediction = surrogate.predict(dict(zip(Direction, rates)), params, args.duration)
+    for metric in METRICS:
+        print(f"{metric:16s} {prediction.mean[metric]:10.3f} +/- {prediction.std[metric]:.3f} "
+              f"(single run +/- {prediction.noise[metric]:.3f})")
+    if not prediction.in_domain:
+        print(f"Out of domain ({prediction.reason}): simulate this query instead", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m simulation',
+                                     description='Run traffic simulation scenarios in batch.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='List the scenarios in scenarios/').set_defaults(handler=_list)
+
+    def add_scenario_arguments(command):
+        command.add_argument('scenario', help='Scenario name (in scenarios/) or file path')
+        command.add_argument('--seeds', type=int, help='Number of seeds (overrides the scenario)')
+        command.add_argument('--seed-start', type=int, default=0, help='First seed with --seeds')
+        command.add_argument('--duration', type=float, help='Duration in seconds (overrides the scenario)')
+        command.add_argument('--controllers', help='Comma-separated controller labels to run')
+
+    jobs = commands.add_parser('jobs', help='Print the expanded job list as JSON lines')
+    add_scenario_arguments(jobs)
+    jobs.set_defaults(handler=_jobs)
+
+    run = commands.add_parser('run', help='Run a scenario and write its results')
+    add_scenario_arguments(run)
+    run.add_argument('--backend', choices=BACKENDS, default='serial', help='Execution backend')
+    run.add_argument('--workers', type=int, help='Worker processes (pool/batch; default: CPU count)')
+    run.add_argument('--output', default='results/batch_results', help='Results dataset directory')
+    run.add_argument('--overwrite', action='store_true', help='Replace an existing dataset')
+    run.add_argument('--batch-size', type=int, default=256, help='Rows per written file')
+    run.add_argument('--csv', help='Also write all rows to this CSV file')
+    run.add_argument('--quiet', action='store_true', help='Do not print a line per job')
+    run.set_defaults(handler=_run)
+
+    serve = commands.add_parser('serve', help="Run a scenario's controller in real time")
+    serve.add_argument('scenario', help='Scenario name (in scenarios/) or file path')
+    serve.add_argument('--controller', default='adaptive', help='Controller label to serve')
+    serve.add_argument('--intersections', type=int, default=1, help='Intersections to serve')
+    serve.add_argument('--host', default='127.0.0.1', help='Interface for detector feeds')
+    serve.add_argument('--port', type=int, help='TCP port for detector feeds (0 picks one)')
+    serve.add_argument('--simulate', action='store_true',
+                       help="Feed each intersection from simulated detectors (scenario demand)")
+    serve.add_argument('--tick', type=float, default=1.0, help='Wall-clock seconds between decisions')
+    serve.add_argument('--time-scale', type=float, default=1.0,
+                       help='Controller seconds per wall-clock second')
+    serve.add_argument('--duration', type=float, help='Controller seconds to run (default: until Ctrl-C)')
+    serve.add_argument('--quiet', action='store_true', help='Do not print phase commands')
+    serve.set_defaults(handler=_serve)
+
+    lockstep = commands.add_parser('lockstep', help="Simulate against a controller in another process")
+    lockstep.add_argument('scenario', help='Scenario name (in scenarios/) or file path')
+    lockstep.add_argument('--controller', default='adaptive', help='Controller label the process runs')
+    lockstep.add_argument('--intersections', type=int, default=1, help='Intersections to simulate')
+    lockstep.add_argument('--duration', type=float, help='Duration in seconds (overrides the scenario)')
+    lockstep.add_argument('--speed', default='sim',
+                          help="Clock: 'sim' (as fast as possible), 'real', or a speed like '100x'")
+    lockstep.add_argument('--address', help='Unix socket path or host:port to listen on (default: temporary socket)')
+    lockstep.add_argument('--external', action='store_true',
+                          help='Wait for a controller process instead of starting one')
+    lockstep.add_argument('--timeout', type=float, default=60.0, help='Seconds to wait for the controller process')
+    lockstep.add_argument('--verify', action='store_true',
+                          help='Also run the controller in-process and check the results match')
+    lockstep.set_defaults(handler=_lockstep)
+
+    controller = commands.add_parser('lockstep-controller',
+                                     help="Run a scenario's controller for a lockstep simulation")
+    controller.add_argument('scenario', help='Scenario name (in scenarios/) or file path')
+    controller.add_argument('--controller', default='adaptive', help='Controller label to run')
+    controller.add_argument('--connect', required=True, help='Address printed by lockstep')
+    controller.add_argument('--quiet', action='store_true', help='Do not print a summary')
+    controller.set_defaults(handler=_lockstep_controller)
+
+    animate = commands.add_parser('animate', help="Render a scenario's controllers side by side in one video")
+    animate.add_argument('scenario', help='Scenario name (in scenarios/) or file path')
+    animate.add_argument('--controllers', help='Comma-separated controller labels, one panel each (default: all)')
+    animate.add_argument('--duration', type=float, default=120.0, help='Simulated seconds to animate')
+    animate.add_argument('--seed', type=int, default=0, help='Seed of the shared arrival stream')
+    animate.add_argument('--speed', type=float, default=1.0, help='Playback speed (1.0 = real time)')
+    animate.add_argument('--columns', type=int, help='Panels per row (default: one row)')
+    animate.add_argument('--dpi', type=float, default=50, help='Resolution of each panel')
+    animate.add_argument('--workers', type=int, help='Worker processes (default: one per panel)')
+    animate.add_argument('--output', default='results/comparison.gif', help='Video file (.gif, or any ffmpeg format)')
+    animate.set_defaults(handler=_animate)
+
+    fit = commands.add_parser('surrogate-fit', help='Train a surrogate model on cached runs')
+    fit.add_argument('controller', help='Controller type to model (fixed or adaptive)')
+    fit.add_argument('--cache', default='results/run_cache', help='Run cache directory')
+    fit.add_argument('--sample', type=int, default=0, help='First simulate this many sampled runs into the cache')
+    fit.add_argument('--duration', type=float, default=1800.0, help='Duration of sampled runs (seconds)')
+    fit.add_argument('--workers', type=int, help='Worker processes for sampled runs (default: CPU count)')
+    fit.add_argument('--max-points', type=int, default=1000, help='Runs the model conditions on')
+    fit.add_argument('--seed', type=int, default=0, help='Seed of the sampled design and subsets')
+    fit.add_argument('--output', default='results/surrogate.npz', help='Model file to write')
+    fit.set_defaults(handler=_surrogate_fit)
+
+    query = commands.add_parser('surrogate-query', help='Predict metrics with a saved surrogate model')
+    query.add_argument('model', help='Model file written by surrogate-fit')
+    query.add_argument('--rates', required=True, help='Arrival rates N,E,S,W (vehicles per second)')
+    query.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                       help='Controller parameter (repeat for each)')
+    query.add_argument('--duration', type=float, help='Duration in seconds (default: as trained)')
+    query.set_defaults(handler=_surrogate_query)
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except (FileNotFoundError, ValueError, ImportError, RuntimeError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
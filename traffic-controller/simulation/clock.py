@@ -0,0 +1,94 @@
+"""
+Clocks pacing simulated time against wall-clock time.
+
+``TrafficSimulator.run`` and ``run_lockstep`` call ``clock.start(t)`` once and
+``clock.wait_until(t)`` after every step:
+
+- ``SimulatedClock`` never waits: steps run as fast as the host allows.
+- ``RealTimeClock(speed)`` holds each step until its wall-clock deadline, one
+  simulated second taking ``1 / speed`` wall seconds (``speed=1`` is real
+  time, ``speed=100`` is 100x accelerated). Steps that finish after their
+  deadline are counted as late instead of being waited for, so a slow step
+  does not delay the ones after it.
+"""
+import re
+import time
+from typing import Union
+
+
+class Clock:
+    """Interface of simulation clocks."""
+
+    def start(self, sim_time: float):
+        """Anchor the clock at simulated time `sim_time` (called before the first step)."""
+
+    def wait_until(self, sim_time: float):
+        """Block until simulated time `sim_time` is due."""
+
+
+class SimulatedClock(Clock):
+    """Pure simulated time: never waits."""
+
+    def __repr__(self):
+        return 'SimulatedClock()'
+
+
+class RealTimeClock(Clock):
+    """Wall-clock pacing, optionally accelerated."""
+
+    def __init__(self, speed: float = 1.0):
+        """
+        Initialize clock.
+
+        Args:
+            speed: Simulated seconds per wall-clock second
+        """
+        if speed <= 0:
+            raise ValueError(f"Clock speed must be positive, got {speed}")
+        self.speed = speed
+        self.late_steps = 0
+        self.max_lateness = 0.0  # Wall seconds
+        self._origin_wall: float = None
+        self._origin_sim = 0.0
+
+    def __repr__(self):
+        return f'RealTimeClock(speed={self.speed:g})'
+
+    def start(self, sim_time: float):
+        self._origin_wall = time.monotonic()
+        self._origin_sim = sim_time
+        self.late_steps = 0
+        self.max_lateness = 0.0
+
+    def wait_until(self, sim_time: float):
+        if self._origin_wall is None:
+            self.start(sim_time)
+            return
+        delay = self._origin_wall + (sim_time - self._origin_sim) / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.late_steps += 1
+            self.max_lateness = max(self.max_lateness, -delay)
+
+
+def make_clock(spec: Union[str, float, None]) -> Clock:
+    """
+    Clock from a short description.
+
+    Args:
+        spec: "sim" (or None/0) for SimulatedClock, "real" for real time,
+            or a speed such as 100 or "100x" for an accelerated clock
+
+    Raises:
+        ValueError: If the description is not understood
+    """
+    if spec is None or spec == 'sim':
+        return SimulatedClock()
+    if spec == 'real':
+        return RealTimeClock()
+    match = re.fullmatch(r'\s*([0-9.]+)\s*x?\s*', str(spec))
+    if match is None:
+        raise ValueError(f"Unknown clock: {spec!r} (expected 'sim', 'real' or a speed like '100x')")
+    speed = float(match.group(1))
+    return SimulatedClock() if speed == 0 else RealTimeClock(speed)
@@ -1,16 +1,17 @@
 """
 Traffic signal controllers: Fixed-timer and Adaptive AI-based.
 """
+import math
 from abc import ABC, abstractmethod
-from .models import IntersectionState, SignalPhase, SignalState, Direction
-from typing import Tuple
+from .models import IntersectionState, Phase, PhasePlan, SignalState, Direction, TWO_PHASE_PLAN
+from typing import Dict, Optional, Sequence, Tuple
 
 
 class TrafficController(ABC):
     """Base class for traffic signal controllers."""
     
     @abstractmethod
-    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[SignalPhase, SignalState]:
+    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[Phase, SignalState]:
         """
         Decide the signal phase and state for the next time step.
         
@@ -28,29 +29,85 @@ class TrafficController(ABC):
     def get_name(self) -> str:
         """Return controller name."""
         pass
+    
+    def decision_thresholds(self, dt: float) -> Optional[Dict[str, Sequence[float]]]:
+        """
+        Where decide_signal's output can change, for lookup-table compilation.
+        
+        Controllers that decide only from the quantities listed in
+        simulation.lut.QUANTITIES (phase timer, phase queues, opposing
+        waits and skips, besides signal state and phase) return, for each
+        quantity they read, the values at which their decision can flip,
+        as seen before the call (i.e. before the timers advance by dt).
+        
+        Returns:
+            Quantity name -> threshold values, or None if the controller
+            cannot be tabulated
+        """
+        return None
+    
+    def get_state(self) -> Dict[str, object]:
+        """
+        Return internal state that changes during a run, for checkpoints.
+        
+        Controllers that keep everything in IntersectionState (like the
+        built-in ones) have nothing to save; override together with
+        set_state when a controller carries its own running state.
+        """
+        return {}
+    
+    def set_state(self, state: Dict[str, object]):
+        """Restore internal state returned by get_state."""
+        pass
 
 
 class FixedTimerController(TrafficController):
     """Traditional fixed-timer traffic signal controller."""
     
-    def __init__(self, green_time: float = 20.0, yellow_time: float = 3.0):
+    def __init__(self, green_time: float = 20.0, yellow_time: float = 3.0,
+                 green_times: Dict[str, float] = None):
         """
         Initialize fixed-timer controller.
         
         Args:
             green_time: Duration of green light (seconds)
             yellow_time: Duration of yellow light (seconds)
+            green_times: Optional per-phase green durations keyed by phase
+                name; phases not listed use green_time
         """
         self.green_time = green_time
         self.yellow_time = yellow_time
-        self.cycle_time = 2 * (green_time + yellow_time)
+        self.green_times = dict(green_times or {})
+    
+    def get_green_time(self, phase: Phase) -> float:
+        """Get the green duration for a phase."""
+        return self.green_times.get(phase.value, self.green_time)
+    
+    @property
+    def cycle_time(self) -> float:
+        """Cycle length under the two-phase NS/EW plan (see get_cycle_time)."""
+        return self.get_cycle_time()
+    
+    def get_cycle_time(self, phase_plan: PhasePlan = None) -> float:
+        """
+        Get the cycle length: green plus yellow of every phase of a plan.
+        
+        Args:
+            phase_plan: Plan the controller runs (defaults to two-phase NS/EW)
+        """
+        plan = phase_plan or TWO_PHASE_PLAN
+        return sum(self.get_green_time(phase) + self.yellow_time for phase in plan.phases)
     
-    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[SignalPhase, SignalState]:
+    def decision_thresholds(self, dt: float) -> Dict[str, Sequence[float]]:
+        greens = {self.green_time, *self.green_times.values()}
+        return {'timer': [t - dt for t in (*greens, self.yellow_time)]}
+    
+    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[Phase, SignalState]:
         """Fixed-timer decision logic."""
         state.phase_timer += dt
         
         if state.signal_state == SignalState.GREEN:
-            if state.phase_timer >= self.green_time:
+            if state.phase_timer >= self.get_green_time(state.active_phase):
                 # Switch to yellow
                 state.phase_timer = 0.0
                 return state.active_phase, SignalState.YELLOW
@@ -61,7 +118,7 @@ class FixedTimerController(TrafficController):
             if state.phase_timer >= self.yellow_time:
                 # Switch to next phase (green)
                 state.phase_timer = 0.0
-                next_phase = state.get_opposing_phase(state.active_phase)
+                next_phase = state.get_next_phase(state.active_phase)
                 return next_phase, SignalState.GREEN
             else:
                 return state.active_phase, SignalState.YELLOW
@@ -100,13 +157,23 @@ class AdaptiveCountController(TrafficController):
         self.max_wait_time = max_wait_time
         self.max_skips = max_skips
     
-    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[SignalPhase, SignalState]:
+    def decision_thresholds(self, dt: float) -> Dict[str, Sequence[float]]:
+        return {
+            'timer': [self.min_green - dt, self.max_green - dt, self.yellow_time - dt],
+            'queue': [1],
+            'queue_margin': [math.floor(self.extension_threshold) + 1],
+            'opposing_wait': [self.max_wait_time - dt],
+            'opposing_skips': [self.max_skips],
+        }
+    
+    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[Phase, SignalState]:
         """Adaptive decision logic based on vehicle counts and fairness."""
         state.phase_timer += dt
         
         # Update time since green for all directions
+        active_dirs = state.get_phase_directions(state.active_phase)
         for direction in Direction:
-            if direction in state.get_phase_directions(state.active_phase) and state.signal_state == SignalState.GREEN:
+            if direction in active_dirs and state.signal_state == SignalState.GREEN:
                 state.time_since_green[direction] = 0.0
             else:
                 state.time_since_green[direction] += dt
@@ -114,7 +181,7 @@ class AdaptiveCountController(TrafficController):
         if state.signal_state == SignalState.GREEN:
             # Check if we should extend or terminate green
             current_queue = state.get_phase_queue_length(state.active_phase)
-            opposing_phase = state.get_opposing_phase(state.active_phase)
+            opposing_phase = state.get_next_phase(state.active_phase)
             opposing_queue = state.get_phase_queue_length(opposing_phase)
             
             # Check fairness constraints
@@ -142,7 +209,7 @@ class AdaptiveCountController(TrafficController):
                 # Switch to yellow
                 state.phase_timer = 0.0
                 # Update consecutive skips
-                for direction in state.get_phase_directions(state.active_phase):
+                for direction in active_dirs:
                     state.consecutive_skips[direction] = 0
                 for direction in opposing_dirs:
                     state.consecutive_skips[direction] += 1
@@ -154,7 +221,7 @@ class AdaptiveCountController(TrafficController):
             if state.phase_timer >= self.yellow_time:
                 # Switch to next phase (green)
                 state.phase_timer = 0.0
-                next_phase = state.get_opposing_phase(state.active_phase)
+                next_phase = state.get_next_phase(state.active_phase)
                 # Reset consecutive skips for new green phase
                 for direction in state.get_phase_directions(next_phase):
                     state.consecutive_skips[direction] = 0
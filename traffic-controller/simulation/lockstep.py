@@ -0,0 +1,605 @@
+"""
+Lockstep runs against an external controller process (hardware-in-the-loop style).
+
+The simulator and the controller under test run in separate processes and
+advance together, one step at a time:
+
+- A ``SharedStateBlock`` (one ``multiprocessing.shared_memory`` segment) holds
+  a record per intersection: vehicles queued per lane, active phase, signal
+  state and the controller timers (phase timer, time since green and
+  consecutive skips per approach). The simulator publishes its state there,
+  the controller reads and updates it in place through views of the same
+  memory, and the simulator reads the decision back. Nothing is serialized.
+- A local socket (Unix domain, or TCP on localhost) carries one fixed-size
+  36-byte message per step in each direction: ``TICK`` (first intersection,
+  count, step number, time, dt) and ``DONE``. ``run_lockstep`` batches every
+  intersection into a single round trip per step, so the protocol cost does
+  not grow with the number of intersections.
+
+Simulator side::
+
+    link = ControllerLink(n_intersections=50)
+    address = link.listen()               # start the controller process with this
+    link.accept()
+    sims = [TrafficSimulator(link.controller(i), ArrivalProcess(rates, seed=i)) for i in range(50)]
+    run_lockstep(sims, 3600, clock=RealTimeClock(speed=100))
+
+Controller side, in another process::
+
+    LockstepClient(lambda i: AdaptiveCountController()).serve(address)
+
+A single simulator can also run against its ``RemoteController`` with plain
+``TrafficSimulator.run`` (one round trip per step). Either way the results are
+identical to running the same controllers in-process.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple, Union
+import numpy as np
+from .models import (
+    Direction, Phase, SignalState, IntersectionState, PhasePlan, LaneLayout,
+    TWO_PHASE_PLAN, SINGLE_LANE_LAYOUT, DIRECTIONS, DIRECTION_INDEX, SIGNAL_STATES, SIGNAL_INDEX
+)
+from .controllers import TrafficController
+
+if TYPE_CHECKING:
+    from .clock import Clock
+    from .simulator import TrafficSimulator
+
+Address = Union[str, Tuple[str, int]]  # Unix socket path or (host, port)
+
+PROTOCOL_VERSION = 1
+HELLO, TICK, DONE, ERROR, BYE = range(1, 6)
+# kind, first intersection, count (or payload bytes), step number, time, dt
+_MESSAGE = struct.Struct('<B3xIIQdd')
+
+
+# Per-intersection fields of the shared block: (name, array type code, values per intersection)
+def _block_fields(n_lanes: int) -> List[Tuple[str, str, int]]:
+    return [
+        ('lane_queue', 'i', n_lanes),
+        ('phase', 'h', 1),
+        ('signal', 'b', 1),
+        ('phase_timer', 'd', 1),
+        ('time_since_green', 'd', len(DIRECTIONS)),
+        ('consecutive_skips', 'i', len(DIRECTIONS)),
+    ]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment owned by another process without taking over its cleanup."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if multiprocessing.parent_process() is None:
+        # A separate process has its own resource tracker, which would unlink
+        # the owner's segment when this process exits
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedStateBlock:
+    """
+    Queues, phase and controller timers of many intersections in shared memory.
+
+    Each field is a contiguous array in one segment, available as a NumPy
+    view (``block.phase_timer``, shaped per intersection) and as a flat
+    ``memoryview`` (``block.memory['phase_timer']``); the per-step code
+    uses the memoryviews, whose element access is several times cheaper
+    than indexing NumPy arrays one value at a time.
+    """
+
+    def __init__(self, n_intersections: int, n_lanes: int, name: str = None):
+        """
+        Create a block, or attach to an existing one.
+
+        Args:
+            n_intersections: Intersections in the block
+            n_lanes: Lanes per intersection
+            name: Segment to attach to (None creates a new one, owned by
+                this object and removed by close())
+        """
+        fields = _block_fields(n_lanes)
+        layout = []
+        size = 0
+        for field_name, code, width in fields:
+            layout.append((field_name, code, width, size))
+            size += -(-n_intersections * width * np.dtype(code).itemsize // 8) * 8  # Keep 8-byte alignment
+        self.owner = name is None
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, size)) if self.owner else _attach(name)
+        self.name = self._shm.name
+        self.n_intersections = n_intersections
+        self.n_lanes = n_lanes
+        self.memory: Dict[str, memoryview] = {}
+        for field_name, code, width, offset in layout:
+            count = n_intersections * width
+            shape = (n_intersections,) if field_name in ('phase', 'signal', 'phase_timer') else (n_intersections, width)
+            setattr(self, field_name, np.ndarray(shape, dtype=code, buffer=self._shm.buf, offset=offset))
+            nbytes = count * np.dtype(code).itemsize
+            self.memory[field_name] = self._shm.buf[offset:offset + nbytes].cast(code)
+
+    def close(self):
+        """Unmap the block (and remove the segment if this object created it)."""
+        if self._shm is None:
+            return
+        for field_name, view in self.memory.items():
+            view.release()
+            setattr(self, field_name, None)
+        self.memory.clear()
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # NumPy views still held elsewhere; the mapping goes when they do
+        if self.owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+def _send(sock: socket.socket, kind: int, first: int = 0, count: int = 0, tick: int = 0,
+          time: float = 0.0, dt: float = 0.0, payload: bytes = b''):
+    sock.sendall(_MESSAGE.pack(kind, first, count, tick, time, dt) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = sock.recv(size)
+    while len(data) < size:
+        more = sock.recv(size - len(data))
+        if not more:
+            raise ConnectionError("Lockstep peer closed the connection")
+        data += more
+    return data
+
+
+def _recv(sock: socket.socket) -> Tuple[int, int, int, int, float, float]:
+    data = sock.recv(_MESSAGE.size)
+    if not data:
+        raise ConnectionError("Lockstep peer closed the connection")
+    if len(data) < _MESSAGE.size:
+        data += _recv_exact(sock, _MESSAGE.size - len(data))
+    return _MESSAGE.unpack(data)
+
+
+def _send_error(sock: socket.socket, text: str):
+    payload = text.encode()
+    _send(sock, ERROR, count=len(payload), payload=payload)
+
+
+def _new_socket(address: Address) -> socket.socket:
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class RemoteController(TrafficController):
+    """Stand-in controller for one intersection decided by the external process."""
+
+    def __init__(self, link: 'ControllerLink', index: int):
+        """
+        Initialize controller.
+
+        Args:
+            link: Connection to the controller process
+            index: Intersection's record in the link's shared block
+        """
+        self.link = link
+        self.index = index
+
+    def get_name(self) -> str:
+        return f"Remote ({self.link.controller_name or 'external'})"
+
+    def publish(self, state: IntersectionState):
+        """Write the intersection's queues, phase and timers to the shared block."""
+        memory, i = self.link.block.memory, self.index
+        lane_queue = memory['lane_queue']
+        base = i * len(state.lane_queues)
+        for lane, queue in enumerate(state.lane_queues):
+            lane_queue[base + lane] = len(queue)
+        memory['phase'][i] = state.phase_plan.index_of(state.active_phase)
+        memory['signal'][i] = SIGNAL_INDEX[state.signal_state]
+        memory['phase_timer'][i] = state.phase_timer
+        time_since_green = memory['time_since_green']
+        consecutive_skips = memory['consecutive_skips']
+        base = i * len(DIRECTIONS)
+        for k, d in enumerate(DIRECTIONS):
+            time_since_green[base + k] = state.time_since_green[d]
+            consecutive_skips[base + k] = state.consecutive_skips[d]
+
+    def collect(self, state: IntersectionState) -> Tuple[Phase, SignalState]:
+        """
+        Read the controller's decision back into the simulator's state.
+
+        Returns:
+            Tuple of (phase, signal_state), as decide_signal would
+        """
+        memory, i = self.link.block.memory, self.index
+        state.phase_timer = memory['phase_timer'][i]
+        time_since_green = memory['time_since_green']
+        consecutive_skips = memory['consecutive_skips']
+        base = i * len(DIRECTIONS)
+        for k, d in enumerate(DIRECTIONS):
+            state.time_since_green[d] = time_since_green[base + k]
+            state.consecutive_skips[d] = consecutive_skips[base + k]
+        return state.phase_plan.phases[memory['phase'][i]], SIGNAL_STATES[memory['signal'][i]]
+
+    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[Phase, SignalState]:
+        self.publish(state)
+        self.link.request(self.index, 1, current_time, dt)
+        return self.collect(state)
+
+
+class ControllerLink:
+    """Simulator side of a lockstep connection to an external controller process."""
+
+    def __init__(self, n_intersections: int = 1, phase_plan: PhasePlan = None,
+                 lane_layout: LaneLayout = None):
+        """
+        Initialize link and create its shared state block.
+
+        Args:
+            n_intersections: Intersections the controller process decides for
+            phase_plan: Phase plan of every intersection (defaults to two-phase NS/EW)
+            lane_layout: Lane layout of every intersection (defaults to one
+                shared lane per approach)
+        """
+        self.n_intersections = n_intersections
+        self.phase_plan = phase_plan or TWO_PHASE_PLAN
+        self.lane_layout = lane_layout or SINGLE_LANE_LAYOUT
+        self.block = SharedStateBlock(n_intersections, self.lane_layout.n_lanes)
+        self.address: Address = None
+        self.controller_name: str = None  # Reported by the controller process
+        self.round_trips = 0
+        self.round_trip_time = 0.0  # Wall seconds spent waiting on the controller process
+        self.max_round_trip = 0.0
+        self._controllers = [RemoteController(self, i) for i in range(n_intersections)]
+        self._server: socket.socket = None
+        self._sock: socket.socket = None
+        self._socket_dir: str = None
+        self._tick = 0
+
+    def controller(self, index: int) -> RemoteController:
+        """Controller to give the simulator of intersection `index`."""
+        return self._controllers[index]
+
+    def listen(self, address: Address = None) -> Address:
+        """
+        Open the socket the controller process connects to.
+
+        Args:
+            address: Unix socket path, or (host, port) for TCP where port 0
+                picks a free one; defaults to a new Unix socket in a temporary
+                directory (TCP on localhost where Unix sockets are unavailable)
+
+        Returns:
+            Address to give the controller process
+        """
+        if address is None:
+            if hasattr(socket, 'AF_UNIX'):
+                self._socket_dir = tempfile.mkdtemp(prefix='lockstep-')
+                address = os.path.join(self._socket_dir, 'controller.sock')
+            else:
+                address = ('127.0.0.1', 0)
+        server = _new_socket(address)
+        if not isinstance(address, str):
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        server.listen(1)
+        self._server = server
+        self.address = address if isinstance(address, str) else server.getsockname()[:2]
+        return self.address
+
+    def accept(self, timeout: float = 30.0):
+        """
+        Wait for the controller process and exchange the handshake.
+
+        Raises:
+            TimeoutError: If no controller process connects in time
+            RuntimeError: If the controller process rejects the handshake
+        """
+        self._server.settimeout(timeout)
+        sock, _ = self._server.accept()
+        sock.settimeout(None)
+        if sock.family != getattr(socket, 'AF_UNIX', None):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = json.dumps({
+            'version': PROTOCOL_VERSION,
+            'block': self.block.name,
+            'n_intersections': self.n_intersections,
+            'n_lanes': self.block.n_lanes,
+            'phases': [phase.name for phase in self.phase_plan.phases],
+        }).encode()
+        _send(sock, HELLO, count=len(hello), payload=hello)
+        kind, _, size, _, _, _ = _recv(sock)
+        payload = _recv_exact(sock, size) if size else b''
+        if kind != HELLO:
+            sock.close()
+            raise RuntimeError(f"Controller process rejected the handshake: {payload.decode()}")
+        self.controller_name = json.loads(payload).get('controller')
+        self._sock = sock
+
+    def request(self, first: int, count: int, current_time: float, dt: float):
+        """
+        Have the controller process decide for intersections first..first+count-1.
+
+        Their states must already be published to the block; one message
+        goes each way however many intersections are covered.
+
+        Raises:
+            RuntimeError: If no controller is connected, it failed, or the
+                protocol is out of sync
+        """
+        if self._sock is None:
+            raise RuntimeError("No controller process connected; call accept() first")
+        self._tick += 1
+        started = time.perf_counter()
+        _send(self._sock, TICK, first, count, self._tick, current_time, dt)
+        kind, _, size, tick, _, _ = _recv(self._sock)
+        elapsed = time.perf_counter() - started
+        if kind == ERROR:
+            raise RuntimeError(f"Controller process failed: {_recv_exact(self._sock, size).decode()}")
+        if kind != DONE or tick != self._tick:
+            raise RuntimeError(f"Lockstep protocol out of sync (message {kind}, step {tick} != {self._tick})")
+        self.round_trips += 1
+        self.round_trip_time += elapsed
+        self.max_round_trip = max(self.max_round_trip, elapsed)
+
+    def close(self):
+        """Tell the controller process to stop, and release the socket and block."""
+        if self._sock is not None:
+            try:
+                _send(self._sock, BYE)
+            except OSError:
+                pass  # Controller process already gone
+            self._sock.close()
+            self._sock = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+        self.block.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_lockstep(simulators: Sequence['TrafficSimulator'], duration: float,
+                 clock: 'Clock' = None, reset: bool = True):
+    """
+    Run simulators in lockstep with their external controller, one round trip per step.
+
+    Args:
+        simulators: Simulators whose controllers are RemoteControllers of
+            one ControllerLink, covering a contiguous range of its records
+        duration: Simulation duration (seconds)
+        clock: Clock pacing the steps (see simulation.clock); by default
+            steps run as fast as the controller process answers
+        reset: Start from empty intersections; pass False to continue
+
+    Raises:
+        ValueError: If the simulators do not share one link, cover a
+            non-contiguous range, or differ in time step or current time
+    """
+    controllers = [simulator.controller for simulator in simulators]
+    if not controllers or not all(isinstance(c, RemoteController) for c in controllers):
+        raise ValueError("Every simulator needs a RemoteController (see ControllerLink.controller)")
+    link = controllers[0].link
+    if any(c.link is not link for c in controllers):
+        raise ValueError("All simulators must share one ControllerLink")
+    indices = sorted(c.index for c in controllers)
+    if indices != list(range(indices[0], indices[0] + len(indices))):
+        raise ValueError("Simulators must cover a contiguous range of intersections, each once")
+    if len({simulator.dt for simulator in simulators}) != 1:
+        raise ValueError("All simulators must use the same time step")
+    if reset:
+        for simulator in simulators:
+            simulator.reset()
+    if len({simulator.current_time for simulator in simulators}) != 1:
+        raise ValueError("All simulators must be at the same time")
+
+    lead = simulators[0]
+    dt = lead.dt
+    pairs = list(zip(simulators, controllers))
+    if clock is not None:
+        clock.start(lead.current_time)
+    for _ in range(int(duration / dt)):
+        current_time = lead.current_time
+        for simulator, controller in pairs:
+            simulator.step_arrivals()
+            controller.publish(simulator.state)
+        link.request(indices[0], len(indices), current_time, dt)
+        for simulator, controller in pairs:
+            simulator.complete_step(*controller.collect(simulator.state))
+        if clock is not None:
+            clock.wait_until(lead.current_time)
+
+
+class _DirectionRow:
+    """Dictionary-style access by Direction to one intersection's slice of a shared field."""
+
+    __slots__ = ('_memory', '_base')
+
+    def __init__(self, memory: memoryview, base: int):
+        self._memory = memory
+        self._base = base
+
+    def __getitem__(self, direction: Direction):
+        return self._memory[self._base + DIRECTION_INDEX[direction]]
+
+    def __setitem__(self, direction: Direction, value):
+        self._memory[self._base + DIRECTION_INDEX[direction]] = value
+
+    def __iter__(self):
+        return iter(DIRECTIONS)
+
+    def __len__(self) -> int:
+        return len(DIRECTIONS)
+
+    def items(self):
+        return zip(DIRECTIONS, self._memory[self._base:self._base + len(DIRECTIONS)].tolist())
+
+
+class SharedIntersectionState:
+    """
+    View of one intersection in a SharedStateBlock with the IntersectionState
+    interface the controllers use; reads and writes go straight to shared memory.
+    """
+
+    def __init__(self, block: SharedStateBlock, index: int,
+                 phase_plan: PhasePlan, lane_layout: LaneLayout):
+        self.phase_plan = phase_plan
+        self.lane_layout = lane_layout
+        self._index = index
+        self._phase = block.memory['phase']
+        self._signal = block.memory['signal']
+        self._phase_timer = block.memory['phase_timer']
+        self._lane_queue = block.memory['lane_queue']
+        base = index * lane_layout.n_lanes
+        self._direction_lanes = {
+            d: [base + lane for lane in lanes] for d, lanes in lane_layout.lanes_by_direction.items()
+        }
+        self._phase_lanes = [[base + lane for lane in lanes] for lanes in lane_layout.phase_lanes(phase_plan)]
+        self.time_since_green = _DirectionRow(block.memory['time_since_green'], index * len(DIRECTIONS))
+        self.consecutive_skips = _DirectionRow(block.memory['consecutive_skips'], index * len(DIRECTIONS))
+
+    @property
+    def active_phase(self) -> Phase:
+        return self.phase_plan.phases[self._phase[self._index]]
+
+    @active_phase.setter
+    def active_phase(self, phase: Phase):
+        self._phase[self._index] = self.phase_plan.index_of(phase)
+
+    @property
+    def signal_state(self) -> SignalState:
+        return SIGNAL_STATES[self._signal[self._index]]
+
+    @signal_state.setter
+    def signal_state(self, signal_state: SignalState):
+        self._signal[self._index] = SIGNAL_INDEX[signal_state]
+
+    @property
+    def phase_timer(self) -> float:
+        return self._phase_timer[self._index]
+
+    @phase_timer.setter
+    def phase_timer(self, value: float):
+        self._phase_timer[self._index] = value
+
+    def get_queue_length(self, direction: Direction) -> int:
+        queue = self._lane_queue
+        return sum([queue[lane] for lane in self._direction_lanes[direction]])
+
+    def get_queue_lengths(self) -> Dict[Direction, int]:
+        return {d: self.get_queue_length(d) for d in Direction}
+
+    def get_phase_queue_length(self, phase: Phase) -> int:
+        queue = self._lane_queue
+        return sum([queue[lane] for lane in self._phase_lanes[self.phase_plan.index_of(phase)]])
+
+    def get_phase_directions(self, phase: Phase) -> Tuple[Direction, ...]:
+        return self.phase_plan.directions[self.phase_plan.index_of(phase)]
+
+    def get_next_phase(self, phase: Phase) -> Phase:
+        return self.phase_plan.next_phase[self.phase_plan.index_of(phase)]
+
+    def get_opposing_phase(self, phase: Phase) -> Phase:
+        return self.get_next_phase(phase)
+
+
+class LockstepClient:
+    """Controller side: decides for every intersection of a ControllerLink."""
+
+    def __init__(self, make_controller: Callable[[int], TrafficController],
+                 phase_plan: PhasePlan = None, lane_layout: LaneLayout = None):
+        """
+        Initialize client.
+
+        Args:
+            make_controller: Builds the controller of intersection i
+            phase_plan: Phase plan the simulator uses (defaults to two-phase NS/EW)
+            lane_layout: Lane layout the simulator uses (defaults to one
+                shared lane per approach)
+        """
+        self.make_controller = make_controller
+        self.phase_plan = phase_plan or TWO_PHASE_PLAN
+        self.lane_layout = lane_layout or SINGLE_LANE_LAYOUT
+        self.steps = 0
+
+    def serve(self, address: Address) -> int:
+        """
+        Connect to a listening ControllerLink and decide until it closes.
+
+        Returns:
+            Number of steps served
+
+        Raises:
+            ValueError: If the simulator's phase plan or lane count differs
+            RuntimeError: On protocol errors (controller exceptions propagate
+                after being reported to the simulator)
+        """
+        sock = _new_socket(address)
+        sock.connect(address)
+        block = None
+        views: List[SharedIntersectionState] = []
+        try:
+            kind, _, size, _, _, _ = _recv(sock)
+            if kind != HELLO:
+                raise RuntimeError(f"Expected a handshake, got message {kind}")
+            hello = json.loads(_recv_exact(sock, size))
+            phases = [phase.name for phase in self.phase_plan.phases]
+            problem = None
+            if hello['version'] != PROTOCOL_VERSION:
+                problem = f"protocol version {hello['version']} != {PROTOCOL_VERSION}"
+            elif hello['phases'] != phases:
+                problem = f"phase plan {hello['phases']} != {phases}"
+            elif hello['n_lanes'] != self.lane_layout.n_lanes:
+                problem = f"{hello['n_lanes']} lanes != {self.lane_layout.n_lanes}"
+            if problem:
+                _send_error(sock, problem)
+                raise ValueError(f"Simulator does not match the controller: {problem}")
+            block = SharedStateBlock(hello['n_intersections'], hello['n_lanes'], name=hello['block'])
+            views = [SharedIntersectionState(block, i, self.phase_plan, self.lane_layout)
+                     for i in range(block.n_intersections)]
+            controllers = [self.make_controller(i) for i in range(block.n_intersections)]
+            reply = json.dumps({'controller': controllers[0].get_name() if controllers else None}).encode()
+            _send(sock, HELLO, count=len(reply), payload=reply)
+
+            while True:
+                kind, first, count, tick, current_time, dt = _recv(sock)
+                if kind == BYE:
+                    return self.steps
+                if kind != TICK:
+                    raise RuntimeError(f"Expected a step, got message {kind}")
+                try:
+                    for i in range(first, first + count):
+                        view = views[i]
+                        phase, signal_state = controllers[i].decide_signal(view, current_time, dt)
+                        view.active_phase = phase
+                        view.signal_state = signal_state
+                except Exception as e:
+                    _send_error(sock, f"{type(e).__name__}: {e}")
+                    raise
+                _send(sock, DONE, first, count, tick)
+                self.steps += 1
+        finally:
+            sock.close()
+            views.clear()
+            if block is not None:
+                block.close()
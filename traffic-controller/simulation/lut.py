@@ -0,0 +1,422 @@
+"""
+Lookup-table compilation of discrete controllers.
+
+The built-in controllers decide from a handful of discrete quantities besides
+the signal state and active phase: the phase timer, the queues of the active
+and next phase, and the longest wait and most skips among the next phase's
+directions. Their output only changes where one of those crosses a threshold,
+which each controller reports through ``decision_thresholds(dt)``.
+``compile_controller`` bins every quantity at those thresholds, calls
+``decide_signal`` once per combination of bins, stores the decisions in a
+dense NumPy array and checks the result against the original controller on
+random states (``verify_table``).
+
+- ``CompiledController`` is a drop-in ``TrafficController`` backed by a table;
+  runs are identical to the original controller's.
+- ``ControllerBank`` stacks the tables of many controllers of one kind (e.g.
+  a parameter sweep) and advances the signals of any number of
+  intersections, each with its own controller, with a few array operations
+  and a single fancy-indexing lookup per step.
+
+Tables are exact when the thresholds are multiples of ``dt`` (as with the
+scenario files' integer timings and ``dt=1``); with other step sizes the
+accumulated phase timer can land on the other side of a threshold, which
+``verify_table`` does not see but a side-by-side run would.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from .models import (
+    Direction, Phase, SignalState, IntersectionState, PhasePlan, LaneLayout,
+    TWO_PHASE_PLAN, SINGLE_LANE_LAYOUT, DIRECTIONS, DIRECTION_INDEX, THROUGH, SIGNAL_STATES, SIGNAL_INDEX
+)
+from .controllers import TrafficController
+
+# Quantities a table can be indexed by, in axis order
+QUANTITIES = ('timer', 'queue', 'queue_margin', 'opposing_wait', 'opposing_skips')
+GREEN = SIGNAL_INDEX[SignalState.GREEN]
+YELLOW = SIGNAL_INDEX[SignalState.YELLOW]
+
+
+@dataclass
+class ControllerTable:
+    """Decisions of one controller over its binned state space."""
+    name: str  # Name of the compiled controller
+    dt: float
+    phase_plan: PhasePlan
+    lane_layout: LaneLayout
+    quantities: Tuple[str, ...]  # Axes after (signal, phase)
+    edges: Tuple[np.ndarray, ...]  # Bin thresholds per quantity
+    decisions: np.ndarray  # int8 [signal, phase, *bins]: next phase * 3 + next signal
+    tracks_waits: bool  # Controller maintains time_since_green
+    tracks_skips: bool  # Controller maintains consecutive_skips
+
+    @property
+    def size(self) -> int:
+        return self.decisions.size
+
+
+def _quantity(name: str, state, phase_index: int) -> float:
+    """Value of a quantity in a state, before the decision."""
+    plan = state.phase_plan
+    if name == 'timer':
+        return state.phase_timer
+    if name == 'queue':
+        return state.get_phase_queue_length(plan.phases[phase_index])
+    next_phase = plan.next_phase[phase_index]
+    if name == 'queue_margin':
+        return state.get_phase_queue_length(next_phase) - state.get_phase_queue_length(plan.phases[phase_index])
+    directions = state.get_phase_directions(next_phase)
+    if name == 'opposing_wait':
+        # A green resets the waits of the directions it serves before the
+        # controller reads them; with overlapping phases those do not count
+        reset = plan.directions[phase_index] if state.signal_state == SignalState.GREEN else ()
+        return max((state.time_since_green[d] for d in directions if d not in reset), default=-np.inf)
+    return max(state.consecutive_skips[d] for d in directions)
+
+
+def _queue_placeholders(state: IntersectionState, lane: int, n: int):
+    """Queue n vehicles on a lane (controllers only see the queue length)."""
+    direction = DIRECTION_INDEX[state.lane_layout.lanes[lane].direction]
+    state.lane_queues[lane].extend(state.vehicles.allocate(0.0, direction, THROUGH, lane) for _ in range(n))
+
+
+def _representative(index: Tuple[int, ...], table: ControllerTable) -> IntersectionState:
+    """A state falling in a table cell: every quantity at its bin's lower edge."""
+    plan = table.phase_plan
+    signal, phase = index[0], index[1]
+    values = {'timer': 0.0, 'queue': 0, 'queue_margin': 0, 'opposing_wait': 0.0, 'opposing_skips': 0}
+    for name, edges, level in zip(table.quantities, table.edges, index[2:]):
+        if level > 0:
+            values[name] = edges[level - 1]
+        elif name == 'queue_margin':
+            values[name] = edges[0] - 1  # Unbounded below; take the top of the bin
+    state = IntersectionState(active_phase=plan.phases[phase], signal_state=SIGNAL_STATES[signal],
+                              phase_plan=plan, lane_layout=table.lane_layout)
+    state.phase_timer = float(values['timer'])
+    # Queue the active phase's vehicles on a lane the next phase does not
+    # serve if there is one, and the rest of the next phase's on a lane of its
+    # own. Phases sharing every lane (e.g. protected lefts on shared lanes)
+    # always have a margin of 0, so other margin bins cannot occur there.
+    phase_lanes = table.lane_layout.phase_lanes(plan)
+    next_index = plan.index_of(plan.next_phase[phase])
+    active_lane = next((lane for lane in phase_lanes[phase] if lane not in phase_lanes[next_index]),
+                       phase_lanes[phase][0])
+    next_lane = next((lane for lane in phase_lanes[next_index] if lane not in phase_lanes[phase]), None)
+    queue = int(values['queue'])
+    _queue_placeholders(state, active_lane, queue)
+    if next_lane is not None:
+        shared = queue if active_lane in phase_lanes[next_index] else 0
+        _queue_placeholders(state, next_lane, max(0, int(queue + values['queue_margin']) - shared))
+    for d in plan.directions[next_index]:
+        state.time_since_green[d] = float(values['opposing_wait'])  # Reset first if the green serves d
+        state.consecutive_skips[d] = int(values['opposing_skips'])
+    return state
+
+
+def compile_controller(controller: TrafficController, dt: float = 1.0,
+                       phase_plan: PhasePlan = None, lane_layout: LaneLayout = None,
+                       verify: bool = True, n_samples: int = 5000, seed: int = 0) -> ControllerTable:
+    """
+    Tabulate a controller's decisions.
+
+    Args:
+        controller: Controller to compile (left unchanged)
+        dt: Time step the table is valid for
+        phase_plan: Phase plan (defaults to two-phase NS/EW)
+        lane_layout: Lane layout (defaults to one shared lane per approach)
+        verify: Check the table against the controller with verify_table
+        n_samples: Random states to verify with
+        seed: Seed of the verification states
+
+    Raises:
+        ValueError: If the controller reports no thresholds, reports an
+            unknown quantity, or the table disagrees with it
+    """
+    thresholds = controller.decision_thresholds(dt)
+    if thresholds is None:
+        raise ValueError(f"{controller.get_name()} does not report decision thresholds; it cannot be tabulated")
+    unknown = set(thresholds) - set(QUANTITIES)
+    if unknown:
+        raise ValueError(f"Unknown quantities {sorted(unknown)} (expected some of {', '.join(QUANTITIES)})")
+    plan = phase_plan or TWO_PHASE_PLAN
+    quantities = tuple(q for q in QUANTITIES if q in thresholds)
+    edges = tuple(np.unique(np.asarray(thresholds[q], dtype=float)) for q in quantities)
+    shape = (len(SIGNAL_STATES), len(plan.phases), *(len(e) + 1 for e in edges))
+    table = ControllerTable(
+        name=controller.get_name(),
+        dt=dt,
+        phase_plan=plan,
+        lane_layout=lane_layout or SINGLE_LANE_LAYOUT,
+        quantities=quantities,
+        edges=edges,
+        decisions=np.empty(shape, dtype=np.int8),
+        tracks_waits=False,
+        tracks_skips=False,
+    )
+    for index in np.ndindex(shape):
+        state = _representative(index, table)
+        waits = dict(state.time_since_green)
+        skips = dict(state.consecutive_skips)
+        phase, signal_state = controller.decide_signal(state, 0.0, dt)
+        table.decisions[index] = plan.index_of(phase) * len(SIGNAL_STATES) + SIGNAL_INDEX[signal_state]
+        table.tracks_waits |= state.time_since_green != waits
+        table.tracks_skips |= state.consecutive_skips != skips
+    if verify:
+        verify_table(table, controller, n_samples, seed)
+    return table
+
+
+def _random_state(rng: np.random.RandomState, table: ControllerTable) -> Tuple[IntersectionState, IntersectionState]:
+    """Two identical random states, spanning every bin of the table."""
+    plan, layout, dt = table.phase_plan, table.lane_layout, table.dt
+    top = {q: (e[-1] if len(e) else 0.0) for q, e in zip(table.quantities, table.edges)}
+    time_steps = int(2 * max(top.get('timer', 0.0), top.get('opposing_wait', 0.0), 10 * dt) / dt) + 2
+    max_queue = int(max(top.get('queue', 0), abs(top.get('queue_margin', 0)), 5)) + 5
+    phase = plan.phases[rng.randint(len(plan.phases))]
+    signal_state = SIGNAL_STATES[rng.randint(len(SIGNAL_STATES))]
+    timer = rng.randint(time_steps) * dt
+    queues = rng.randint(max_queue, size=layout.n_lanes).tolist()
+    waits = (rng.randint(time_steps, size=len(DIRECTIONS)) * dt).tolist()
+    skips = rng.randint(int(top.get('opposing_skips', 0)) + 3, size=len(DIRECTIONS)).tolist()
+    states = []
+    for _ in range(2):
+        state = IntersectionState(active_phase=phase, signal_state=signal_state,
+                                  phase_plan=plan, lane_layout=layout)
+        state.phase_timer = timer
+        for lane, n in enumerate(queues):
+            _queue_placeholders(state, lane, n)
+        state.time_since_green = dict(zip(DIRECTIONS, waits))
+        state.consecutive_skips = dict(zip(DIRECTIONS, skips))
+        states.append(state)
+    return states[0], states[1]
+
+
+def verify_table(table: ControllerTable, controller: TrafficController,
+                 n_samples: int = 5000, seed: int = 0) -> int:
+    """
+    Compare a table with its controller on random states.
+
+    Each state is decided by the controller and by a CompiledController on
+    an identical copy; decisions and the updated timers, waits and skips
+    must all match.
+
+    Returns:
+        Number of states checked
+
+    Raises:
+        ValueError: On any disagreement
+    """
+    compiled = CompiledController(table)
+    rng = np.random.RandomState(seed)
+    mismatches = []
+    for _ in range(n_samples):
+        expected_state, actual_state = _random_state(rng, table)
+        current_time = float(rng.randint(10_000)) * table.dt
+        expected = controller.decide_signal(expected_state, current_time, table.dt)
+        actual = compiled.decide_signal(actual_state, current_time, table.dt)
+        if (expected != actual
+                or expected_state.phase_timer != actual_state.phase_timer
+                or expected_state.time_since_green != actual_state.time_since_green
+                or expected_state.consecutive_skips != actual_state.consecutive_skips):
+            mismatches.append((expected, actual))
+    if mismatches:
+        (phase, signal_state), (table_phase, table_state) = mismatches[0]
+        raise ValueError(
+            f"Table for {table.name} disagrees with the controller on {len(mismatches)} of "
+            f"{n_samples} states (e.g. controller {phase.name}/{signal_state.value}, "
+            f"table {table_phase.name}/{table_state.value}, or a different timer update)"
+        )
+    return n_samples
+
+
+class CompiledController(TrafficController):
+    """Controller that looks its decisions up in a ControllerTable."""
+
+    def __init__(self, table: ControllerTable):
+        """
+        Initialize controller.
+
+        Args:
+            table: Table from compile_controller
+        """
+        self.table = table
+        self._edges = [e.tolist() for e in table.edges]
+        self._strides = [s // table.decisions.itemsize for s in table.decisions.strides]
+        self._decisions = table.decisions.ravel().tolist()
+
+    def get_name(self) -> str:
+        return self.table.name
+
+    def decide_signal(self, state: IntersectionState, current_time: float, dt: float) -> Tuple[Phase, SignalState]:
+        table = self.table
+        plan = state.phase_plan
+        phase = plan.index_of(state.active_phase)
+        signal = SIGNAL_INDEX[state.signal_state]
+        strides = self._strides
+        offset = signal * strides[0] + phase * strides[1]
+        for axis, (name, edges) in enumerate(zip(table.quantities, self._edges), 2):
+            offset += bisect_right(edges, _quantity(name, state, phase)) * strides[axis]
+        next_phase, next_signal = divmod(self._decisions[offset], len(SIGNAL_STATES))
+
+        served = plan.directions[phase]
+        if table.tracks_waits:
+            for d in Direction:
+                if d in served and signal == GREEN:
+                    state.time_since_green[d] = 0.0
+                else:
+                    state.time_since_green[d] += dt
+        if next_phase == phase and next_signal == signal:
+            state.phase_timer += dt
+        else:
+            state.phase_timer = 0.0
+            if table.tracks_skips and signal == GREEN and next_signal == YELLOW:
+                for d in served:
+                    state.consecutive_skips[d] = 0
+                for d in plan.directions[plan.index_of(plan.next_phase[phase])]:
+                    state.consecutive_skips[d] += 1
+            elif table.tracks_skips and signal == YELLOW and next_signal == GREEN:
+                for d in plan.directions[next_phase]:
+                    state.consecutive_skips[d] = 0
+        return plan.phases[next_phase], SIGNAL_STATES[next_signal]
+
+
+@dataclass
+class SignalArrays:
+    """Signal state of many intersections, one row each."""
+    phase: np.ndarray  # Phase index
+    signal: np.ndarray  # Index into SIGNAL_STATES
+    phase_timer: np.ndarray
+    time_since_green: np.ndarray  # [intersection, direction]
+    consecutive_skips: np.ndarray  # [intersection, direction]
+
+    @classmethod
+    def initial(cls, n: int) -> 'SignalArrays':
+        """Intersections at the start of a run: first phase, green, timers zero."""
+        return cls(
+            phase=np.zeros(n, dtype=np.intp),
+            signal=np.full(n, GREEN, dtype=np.intp),
+            phase_timer=np.zeros(n),
+            time_since_green=np.zeros((n, len(DIRECTIONS))),
+            consecutive_skips=np.zeros((n, len(DIRECTIONS)), dtype=np.int64),
+        )
+
+
+class ControllerBank:
+    """Compiled tables of many controllers of one kind, evaluated together."""
+
+    def __init__(self, tables: Sequence[ControllerTable]):
+        """
+        Stack tables.
+
+        Args:
+            tables: Tables over the same quantities, phase plan, lane
+                layout and dt (e.g. one controller type with different
+                parameters); an intersection's controller is its table's
+                position here
+
+        Raises:
+            ValueError: If the tables are not compatible
+        """
+        first = tables[0]
+        for table in tables[1:]:
+            if (table.quantities != first.quantities or table.dt != first.dt
+                    or table.phase_plan is not first.phase_plan or table.lane_layout is not first.lane_layout
+                    or (table.tracks_waits, table.tracks_skips) != (first.tracks_waits, first.tracks_skips)):
+                raise ValueError(f"Table for {table.name} is not compatible with {first.name}")
+        self.tables = list(tables)
+        self.dt = first.dt
+        self.quantities = first.quantities
+        self.tracks_waits = first.tracks_waits
+        self.tracks_skips = first.tracks_skips
+        # Thresholds padded with +inf, so padded bins are never reached
+        self.edges: List[np.ndarray] = []
+        for axis in range(len(self.quantities)):
+            width = max(len(t.edges[axis]) for t in tables)
+            padded = np.full((len(tables), width), np.inf)
+            for i, table in enumerate(tables):
+                padded[i, :len(table.edges[axis])] = table.edges[axis]
+            self.edges.append(padded)
+        shape = (len(tables), *np.max([t.decisions.shape for t in tables], axis=0))
+        self.decisions = np.zeros(shape, dtype=np.int8)
+        for i, table in enumerate(tables):
+            self.decisions[(i, *(slice(0, n) for n in table.decisions.shape))] = table.decisions
+
+        plan, layout = first.phase_plan, first.lane_layout
+        self.next_phase = np.array([plan.index_of(p) for p in plan.next_phase], dtype=np.intp)
+        self.phase_lanes = np.zeros((len(plan.phases), layout.n_lanes), dtype=np.int64)
+        for i, lanes in enumerate(layout.phase_lanes(plan)):
+            self.phase_lanes[i, list(lanes)] = 1
+        self.phase_directions = np.array(
+            [[d in plan.directions[i] for d in DIRECTIONS] for i in range(len(plan.phases))]
+        )
+
+    def _quantities(self, signals: SignalArrays, lane_counts: np.ndarray) -> Dict[str, np.ndarray]:
+        values = {'timer': signals.phase_timer}
+        next_phase = self.next_phase[signals.phase]
+        queue = (lane_counts * self.phase_lanes[signals.phase]).sum(axis=1)
+        if 'queue' in self.quantities:
+            values['queue'] = queue
+        if 'queue_margin' in self.quantities:
+            values['queue_margin'] = (lane_counts * self.phase_lanes[next_phase]).sum(axis=1) - queue
+        opposing = self.phase_directions[next_phase]
+        if 'opposing_wait' in self.quantities:
+            reset = self.phase_directions[signals.phase] & (signals.signal == GREEN)[:, None]  # As _quantity
+            values['opposing_wait'] = np.where(opposing & ~reset, signals.time_since_green, -np.inf).max(axis=1)
+        if 'opposing_skips' in self.quantities:
+            values['opposing_skips'] = np.where(opposing, signals.consecutive_skips, -1).max(axis=1)
+        return values
+
+    def decide(self, controllers: np.ndarray, signals: SignalArrays,
+               lane_counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decisions for every intersection.
+
+        Args:
+            controllers: Table index of each intersection's controller
+            signals: Current signal state of each intersection
+            lane_counts: Vehicles queued per lane [intersection, lane]
+
+        Returns:
+            Tuple of (next phase index, next signal index) arrays
+        """
+        values = self._quantities(signals, lane_counts)
+        levels = [
+            (values[name][:, None] >= edges[controllers]).sum(axis=1)
+            for name, edges in zip(self.quantities, self.edges)
+        ]
+        codes = self.decisions[(controllers, signals.signal, signals.phase, *levels)]
+        return np.divmod(codes.astype(np.intp), len(SIGNAL_STATES))
+
+    def step(self, controllers: np.ndarray, signals: SignalArrays, lane_counts: np.ndarray) -> np.ndarray:
+        """
+        Decide and update the signal state in place, as decide_signal would.
+
+        Args:
+            controllers: Table index of each intersection's controller
+            signals: Signal state to advance by one step of the tables' dt
+            lane_counts: Vehicles queued per lane [intersection, lane]
+
+        Returns:
+            Mask of intersections whose phase or signal changed
+        """
+        next_phase, next_signal = self.decide(controllers, signals, lane_counts)
+        dt = self.dt
+        green = signals.signal == GREEN
+        served = self.phase_directions[signals.phase]
+        if self.tracks_waits:
+            signals.time_since_green[...] = np.where(served & green[:, None], 0.0,
+                                                     signals.time_since_green + dt)
+        changed = (next_phase != signals.phase) | (next_signal != signals.signal)
+        signals.phase_timer[...] = np.where(changed, 0.0, signals.phase_timer + dt)
+        if self.tracks_skips:
+            skips = signals.consecutive_skips
+            to_yellow = (green & (next_signal == YELLOW))[:, None]
+            skips[to_yellow & served] = 0
+            skips += to_yellow & self.phase_directions[self.next_phase[signals.phase]]
+            to_green = ((signals.signal == YELLOW) & (next_signal == GREEN))[:, None]
+            skips[to_green & self.phase_directions[next_phase]] = 0
+        signals.phase[...] = next_phase
+        signals.signal[...] = next_signal
+        return changed
@@ -2,8 +2,12 @@
 Core data structures for traffic signal simulation.
 """
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, Tuple, Sequence, Iterable, FrozenSet, Optional
+from array import array
 from enum import Enum
+from functools import lru_cache
+import copy
+import math
 import numpy as np
 
 
@@ -28,24 +32,662 @@ class SignalState(Enum):
     RED = "R"
 
 
+class Turn(Enum):
+    """Turning movement made by a vehicle at the stop line."""
+    LEFT = "L"
+    THROUGH = "T"
+    RIGHT = "R"
+
+
+class Movement(Enum):
+    """Approach/turn pair (e.g. NL = north approach turning left)."""
+    NORTH_LEFT = "NL"
+    NORTH_THROUGH = "NT"
+    NORTH_RIGHT = "NR"
+    EAST_LEFT = "EL"
+    EAST_THROUGH = "ET"
+    EAST_RIGHT = "ER"
+    SOUTH_LEFT = "SL"
+    SOUTH_THROUGH = "ST"
+    SOUTH_RIGHT = "SR"
+    WEST_LEFT = "WL"
+    WEST_THROUGH = "WT"
+    WEST_RIGHT = "WR"
+
+    @property
+    def direction(self) -> Direction:
+        """Approach the movement starts from."""
+        return Direction(self.value[0])
+
+    @property
+    def turn(self) -> Turn:
+        """Turn made by the movement."""
+        return Turn(self.value[1])
+
+    @classmethod
+    def of(cls, direction: Direction, turn: Turn) -> 'Movement':
+        """Look up the movement for an approach and turn."""
+        return cls(direction.value + turn.value)
+
+
+# Approaches in clockwise order; used to work out where each movement exits.
+_CLOCKWISE = [Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST]
+_EXIT_OFFSET = {Turn.LEFT: 1, Turn.THROUGH: 2, Turn.RIGHT: 3}
+
+
+def _movement_exit(movement: Movement) -> int:
+    """Clockwise index of the leg a movement leaves the intersection on."""
+    return (_CLOCKWISE.index(movement.direction) + _EXIT_OFFSET[movement.turn]) % 4
+
+
+def _movements_conflict(a: Movement, b: Movement) -> bool:
+    """Whether two movements cross or merge (right-hand traffic)."""
+    if a.direction == b.direction:
+        return False
+    offset = (_CLOCKWISE.index(a.direction) - _CLOCKWISE.index(b.direction)) % 4
+    if offset == 2:
+        # Opposing approaches: only a left turn against a non-left conflicts
+        return (a.turn == Turn.LEFT) != (b.turn == Turn.LEFT)
+    # Perpendicular approaches: right turns only conflict when merging
+    if a.turn == Turn.RIGHT or b.turn == Turn.RIGHT:
+        return _movement_exit(a) == _movement_exit(b)
+    return True
+
+
+MOVEMENTS: List[Movement] = list(Movement)
+MOVEMENT_INDEX: Dict[Movement, int] = {m: i for i, m in enumerate(MOVEMENTS)}
+
+# Default movement conflict matrix, indexed by MOVEMENT_INDEX
+DEFAULT_CONFLICTS = np.array(
+    [[_movements_conflict(a, b) for b in MOVEMENTS] for a in MOVEMENTS],
+    dtype=bool
+)
+
+
+@dataclass(frozen=True)
+class Phase:
+    """A signal phase: the set of movements given green together."""
+    name: str
+    movements: FrozenSet[Movement]
+    permissive: FrozenSet[Movement] = frozenset()  # Movements that must yield
+
+    @property
+    def value(self) -> str:
+        """Phase label, mirroring ``SignalPhase.value`` for history records."""
+        return self.name
+
+    @classmethod
+    def build(cls, name: str, movements: Iterable[Movement],
+              permissive: Iterable[Movement] = ()) -> 'Phase':
+        """Create a phase from any iterables of movements."""
+        permissive = frozenset(permissive)
+        return cls(name, frozenset(movements) | permissive, permissive)
+
+
+class PhasePlan:
+    """
+    Ordered set of signal phases with precomputed lookup tables.
+
+    Everything the controllers and simulator need per tick (served
+    directions, next phase, movement masks) is tabulated once here so
+    that phase logic costs a dictionary lookup regardless of phase count.
+    """
+
+    def __init__(self, phases: Sequence[Phase], conflicts: np.ndarray = None):
+        """
+        Initialize phase plan.
+
+        Args:
+            phases: Phases in service order
+            conflicts: Boolean movement conflict matrix indexed by
+                MOVEMENT_INDEX (defaults to DEFAULT_CONFLICTS)
+
+        Raises:
+            ValueError: If the plan is empty, has duplicate names, or a
+                phase contains conflicting protected movements
+        """
+        if not phases:
+            raise ValueError("A phase plan needs at least one phase")
+        names = [phase.name for phase in phases]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate phase names in plan: {names}")
+
+        self.phases: Tuple[Phase, ...] = tuple(phases)
+        self.conflicts = DEFAULT_CONFLICTS if conflicts is None else np.asarray(conflicts, dtype=bool)
+        if self.conflicts.shape != (len(MOVEMENTS), len(MOVEMENTS)):
+            raise ValueError(f"Conflict matrix must be {len(MOVEMENTS)}x{len(MOVEMENTS)}")
+
+        for phase in self.phases:
+            self._validate(phase)
+
+        n = len(self.phases)
+        self.n_phases = n
+        # Phases may be looked up by object or by name (so SignalPhase.NS
+        # resolves against the default two-phase plan)
+        self._index: Dict[object, int] = {}
+        for i, phase in enumerate(self.phases):
+            self._index[phase] = i
+            self._index[phase.name] = i
+
+        # Movement mask per phase: (n_phases, n_movements)
+        self.movement_mask = np.zeros((n, len(MOVEMENTS)), dtype=bool)
+        self.permissive_mask = np.zeros((n, len(MOVEMENTS)), dtype=bool)
+        for i, phase in enumerate(self.phases):
+            for movement in phase.movements:
+                self.movement_mask[i, MOVEMENT_INDEX[movement]] = True
+            for movement in phase.permissive:
+                self.permissive_mask[i, MOVEMENT_INDEX[movement]] = True
+
+        # Directions released by each phase (any protected movement)
+        self.directions: Tuple[Tuple[Direction, ...], ...] = tuple(
+            tuple(d for d in Direction
+                  if any(m.direction == d for m in phase.movements - phase.permissive))
+            for phase in self.phases
+        )
+        self.next_phase: Tuple[Phase, ...] = tuple(
+            self.phases[(i + 1) % n] for i in range(n)
+        )
+
+    def _validate(self, phase: Phase):
+        """Check that no two protected movements in a phase conflict."""
+        protected = [MOVEMENT_INDEX[m] for m in phase.movements - phase.permissive]
+        for a in protected:
+            for b in protected:
+                if self.conflicts[a, b]:
+                    raise ValueError(
+                        f"Phase {phase.name} contains conflicting movements "
+                        f"{MOVEMENTS[a].value} and {MOVEMENTS[b].value}"
+                    )
+
+    def index_of(self, phase) -> int:
+        """Get the position of a phase (Phase, SignalPhase or name)."""
+        index = self._index.get(phase)
+        if index is None:
+            index = self._index[phase.value]
+        return index
+
+    def get(self, phase) -> Phase:
+        """Resolve a phase reference to the plan's Phase object."""
+        return self.phases[self.index_of(phase)]
+
+    @classmethod
+    def two_phase(cls) -> 'PhasePlan':
+        """Classic NS/EW plan with permissive left turns."""
+        return cls([
+            Phase.build(
+                SignalPhase.NS.value,
+                [Movement.NORTH_THROUGH, Movement.NORTH_RIGHT,
+                 Movement.SOUTH_THROUGH, Movement.SOUTH_RIGHT],
+                permissive=[Movement.NORTH_LEFT, Movement.SOUTH_LEFT]
+            ),
+            Phase.build(
+                SignalPhase.EW.value,
+                [Movement.EAST_THROUGH, Movement.EAST_RIGHT,
+                 Movement.WEST_THROUGH, Movement.WEST_RIGHT],
+                permissive=[Movement.EAST_LEFT, Movement.WEST_LEFT]
+            ),
+        ])
+
+    @classmethod
+    def protected_left(cls) -> 'PhasePlan':
+        """Four-phase plan with leading protected lefts on both streets."""
+        return cls([
+            Phase.build("NSL", [Movement.NORTH_LEFT, Movement.SOUTH_LEFT]),
+            Phase.build("NS", [Movement.NORTH_THROUGH, Movement.NORTH_RIGHT,
+                               Movement.SOUTH_THROUGH, Movement.SOUTH_RIGHT]),
+            Phase.build("EWL", [Movement.EAST_LEFT, Movement.WEST_LEFT]),
+            Phase.build("EW", [Movement.EAST_THROUGH, Movement.EAST_RIGHT,
+                               Movement.WEST_THROUGH, Movement.WEST_RIGHT]),
+        ])
+
+    @classmethod
+    def from_ring_pairs(cls,
+                        ring1: Sequence[Sequence[Phase]],
+                        ring2: Sequence[Sequence[Phase]],
+                        conflicts: np.ndarray = None) -> 'PhasePlan':
+        """
+        Build a sequential plan from the phases of a ring-barrier diagram.
+
+        Each ring is a list of barrier groups, each group a list of ring
+        phases. The i-th phase of ring 1 and the i-th phase of ring 2 in a
+        group are merged into one plan phase, and the merged phases run in
+        order. The rings are not timed independently: a pair starts and ends
+        together, so this is the sequential (lead-lead, equal split)
+        approximation of the dual-ring plan, not ring-barrier control.
+
+        Args:
+            ring1: Barrier groups of ring 1
+            ring2: Barrier groups of ring 2 (same number of groups)
+            conflicts: Optional movement conflict matrix
+
+        Returns:
+            PhasePlan with one phase per concurrent pair
+        """
+        if len(ring1) != len(ring2):
+            raise ValueError("Both rings must have the same number of barrier groups")
+        combined = []
+        for group1, group2 in zip(ring1, ring2):
+            if len(group1) != len(group2):
+                raise ValueError("Barrier groups must hold the same number of phases in each ring")
+            for p1, p2 in zip(group1, group2):
+                combined.append(Phase(
+                    f"{p1.name}+{p2.name}",
+                    p1.movements | p2.movements,
+                    p1.permissive | p2.permissive
+                ))
+        return cls(combined, conflicts)
+
+
+# Shared default plan; plans are immutable once built
+TWO_PHASE_PLAN = PhasePlan.two_phase()
+
+TURNS: List[Turn] = [Turn.LEFT, Turn.THROUGH, Turn.RIGHT]
+TURN_INDEX: Dict[Turn, int] = {t: i for i, t in enumerate(TURNS)}
+DIRECTIONS: List[Direction] = list(Direction)
+DIRECTION_INDEX: Dict[Direction, int] = {d: i for i, d in enumerate(DIRECTIONS)}
+THROUGH = TURN_INDEX[Turn.THROUGH]
+SIGNAL_STATES: List[SignalState] = list(SignalState)
+SIGNAL_INDEX: Dict[SignalState, int] = {s: i for i, s in enumerate(SIGNAL_STATES)}
+
+# Movement release status codes used in lane release tables
+RED = 0
+PROTECTED = 1
+PERMISSIVE = 2
+
+
+@dataclass(frozen=True)
+class Lane:
+    """A stop-line lane on one approach."""
+    direction: Direction
+    turns: FrozenSet[Turn] = frozenset(Turn)
+    saturation_flow: Optional[float] = None  # veh/s; None uses the simulator default
+
+
+class LaneLayout:
+    """
+    Lanes at the intersection with precomputed routing tables.
+
+    Lane attributes are stored as parallel arrays indexed by lane number so
+    the simulator can compute discharge for every lane at once.
+    """
+
+    def __init__(self, lanes: Sequence[Lane]):
+        """
+        Initialize lane layout.
+
+        Args:
+            lanes: Lanes in any order; every approach needs at least one
+
+        Raises:
+            ValueError: If an approach has no lanes or a lane allows no turns
+        """
+        self.lanes: Tuple[Lane, ...] = tuple(lanes)
+        self.n_lanes = len(self.lanes)
+        for lane in self.lanes:
+            if not lane.turns:
+                raise ValueError(f"Lane on approach {lane.direction.value} allows no turns")
+
+        self.lanes_by_direction: Dict[Direction, Tuple[int, ...]] = {
+            d: tuple(i for i, lane in enumerate(self.lanes) if lane.direction == d)
+            for d in Direction
+        }
+        missing = [d.value for d, ids in self.lanes_by_direction.items() if not ids]
+        if missing:
+            raise ValueError(f"No lanes defined for approaches: {missing}")
+
+        self.lanes_for_turn: Dict[Tuple[Direction, Turn], Tuple[int, ...]] = {
+            (d, t): tuple(i for i in self.lanes_by_direction[d] if t in self.lanes[i].turns)
+            for d in Direction for t in Turn
+        }
+        self.lane_direction_index = np.array(
+            [DIRECTION_INDEX[lane.direction] for lane in self.lanes], dtype=np.intp
+        )
+        opposing = [2, 3, 0, 1]  # N<->S, E<->W in DIRECTIONS order
+        self.lane_opposing_index = np.array(
+            [opposing[DIRECTION_INDEX[lane.direction]] for lane in self.lanes], dtype=np.intp
+        )
+
+    def saturation_flows(self, default: float) -> np.ndarray:
+        """Per-lane saturation flows (veh/s), filling unset lanes with default."""
+        return np.array([
+            default if lane.saturation_flow is None else lane.saturation_flow
+            for lane in self.lanes
+        ], dtype=float)
+
+    def release_table(self, plan: PhasePlan) -> np.ndarray:
+        """
+        Tabulate movement status for every phase, lane and turn.
+
+        Returns:
+            int8 array of shape (n_phases, n_lanes, 3) holding RED,
+            PROTECTED or PERMISSIVE, indexed by TURN_INDEX on the last axis
+        """
+        return _release_table(plan, self)
+
+    def phase_lanes(self, plan: PhasePlan) -> Tuple[Tuple[int, ...], ...]:
+        """Lanes carrying at least one movement released by each phase."""
+        return _phase_lanes(plan, self)
+
+    @classmethod
+    def single_lane(cls) -> 'LaneLayout':
+        """One shared lane per approach carrying every turn."""
+        return cls([Lane(d) for d in Direction])
+
+    @classmethod
+    def exclusive_left(cls,
+                       through_lanes: int = 1,
+                       saturation_flow: Optional[float] = None,
+                       left_saturation_flow: Optional[float] = None) -> 'LaneLayout':
+        """
+        Left-turn bay plus shared through/right lanes on every approach.
+
+        Args:
+            through_lanes: Number of through/right lanes per approach
+            saturation_flow: Saturation flow of through/right lanes (veh/s)
+            left_saturation_flow: Saturation flow of the left-turn bay (veh/s)
+        """
+        lanes = []
+        for d in Direction:
+            lanes.append(Lane(d, frozenset([Turn.LEFT]), left_saturation_flow))
+            for _ in range(through_lanes):
+                lanes.append(Lane(d, frozenset([Turn.THROUGH, Turn.RIGHT]), saturation_flow))
+        return cls(lanes)
+
+
+@lru_cache(maxsize=None)
+def _release_table(plan: PhasePlan, layout: LaneLayout) -> np.ndarray:
+    """Build (and cache per plan/layout pair) the lane release table."""
+    table = np.full((plan.n_phases, layout.n_lanes, len(TURNS)), RED, dtype=np.int8)
+    for lane_id, lane in enumerate(layout.lanes):
+        for turn in lane.turns:
+            m = MOVEMENT_INDEX[Movement.of(lane.direction, turn)]
+            t = TURN_INDEX[turn]
+            table[plan.movement_mask[:, m], lane_id, t] = PROTECTED
+            table[plan.permissive_mask[:, m], lane_id, t] = PERMISSIVE
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=None)
+def _phase_lanes(plan: PhasePlan, layout: LaneLayout) -> Tuple[Tuple[int, ...], ...]:
+    """Build (and cache per plan/layout pair) the lanes served by each phase."""
+    table = _release_table(plan, layout)
+    return tuple(
+        tuple(int(i) for i in np.flatnonzero((table[p] != RED).any(axis=1)))
+        for p in range(plan.n_phases)
+    )
+
+
+# Shared default layout; layouts are immutable once built
+SINGLE_LANE_LAYOUT = LaneLayout.single_lane()
+
+
+class OverflowBuffer:
+    """
+    FIFO of vehicles held upstream of an approach.
+
+    Held vehicles are stored as packed arrival-time and turn arrays (9 bytes
+    each) rather than Vehicle objects; a vehicle is only materialized when it
+    moves into the approach.
+    """
+    __slots__ = ('arrival_times', 'turns', 'head')
+
+    def __init__(self):
+        self.arrival_times = array('d')
+        self.turns = array('b')
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.turns) - self.head
+
+    def push(self, arrival_time: float, turn: int):
+        """Append a held vehicle (turn given as a TURN_INDEX value)."""
+        self.arrival_times.append(arrival_time)
+        self.turns.append(turn)
+
+    def pop(self) -> Tuple[float, int]:
+        """Remove and return the oldest held vehicle as (arrival_time, turn)."""
+        i = self.head
+        item = (self.arrival_times[i], self.turns[i])
+        self.head = i + 1
+        # Drop the consumed prefix once it dominates the buffer
+        if self.head >= 1024 and self.head * 2 >= len(self.turns):
+            del self.arrival_times[:self.head]
+            del self.turns[:self.head]
+            self.head = 0
+        return item
+
+
+class HandleRing:
+    """
+    FIFO of vehicle handles in a growable int32 ring buffer.
+    
+    Lane queues and the VehicleStore free list are rings rather than deques
+    or lists of Python ints, so a handle costs a 4-byte array slot instead of
+    a pointer to a boxed int, and a queue's handles can be read as one array.
+    """
+    __slots__ = ('buffer', 'head', 'size')
+    
+    def __init__(self, capacity: int = 16):
+        self.buffer = np.zeros(capacity, dtype=np.int32)
+        self.head = 0
+        self.size = 0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __bool__(self) -> bool:
+        return self.size > 0
+    
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("HandleRing index out of range")
+        return self.buffer.item((self.head + index) % len(self.buffer))
+    
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+    
+    def peek(self) -> int:
+        """First handle (the ring must not be empty)."""
+        return self.buffer.item(self.head)
+    
+    def append(self, handle: int):
+        """Add a handle at the back."""
+        capacity = len(self.buffer)
+        if self.size == capacity:
+            self._grow(capacity + 1)
+            capacity = len(self.buffer)
+        tail = self.head + self.size
+        self.buffer[tail - capacity if tail >= capacity else tail] = handle
+        self.size += 1
+    
+    def popleft(self) -> int:
+        """Remove and return the first handle."""
+        if not self.size:
+            raise IndexError("pop from an empty HandleRing")
+        head = self.head
+        handle = self.buffer.item(head)
+        head += 1
+        self.head = 0 if head == len(self.buffer) else head
+        self.size -= 1
+        return handle
+    
+    def extend(self, handles: Iterable[int]):
+        """Add handles at the back, in order."""
+        values = np.fromiter(handles, dtype=np.int32)
+        n = len(values)
+        if self.size + n > len(self.buffer):
+            self._grow(self.size + n)
+        capacity = len(self.buffer)
+        tail = (self.head + self.size) % capacity
+        first = min(n, capacity - tail)
+        self.buffer[tail:tail + first] = values[:first]
+        self.buffer[:n - first] = values[first:]
+        self.size += n
+    
+    def clear(self):
+        self.head = 0
+        self.size = 0
+    
+    def to_array(self, limit: int = None) -> np.ndarray:
+        """
+        Handles in FIFO order as a new array.
+        
+        Args:
+            limit: Return at most this many handles from the front
+        """
+        n = self.size if limit is None else min(limit, self.size)
+        end = self.head + n
+        if end <= len(self.buffer):
+            return self.buffer[self.head:end].copy()
+        return np.concatenate((self.buffer[self.head:], self.buffer[:end - len(self.buffer)]))
+    
+    def _grow(self, needed: int):
+        capacity = max(len(self.buffer), 8)
+        while capacity < needed:
+            capacity *= 2
+        buffer = np.zeros(capacity, dtype=np.int32)
+        buffer[:self.size] = self.to_array()
+        self.buffer = buffer
+        self.head = 0
+
+
+class VehicleStore:
+    """
+    Vehicles as parallel arrays, addressed by integer handles.
+    
+    Lane queues hold handles into the store rather than Vehicle objects. A
+    vehicle takes 24 bytes of columns (sequence id, arrival and departure
+    time, direction, turn and lane), plus 4-byte slots in its lane's
+    HandleRing and in the free list, instead of a ~112-byte dataclass
+    instance. Slots of departed vehicles are reused through the free list, so
+    the columns only grow to the most vehicles present at once. Bulk
+    questions (e.g. the waits of every queued vehicle) are array expressions;
+    Vehicle objects are only materialized on request.
+    """
+    __slots__ = ('ids', 'arrival_time', 'departure_time', 'direction', 'turn', 'lane',
+                 'next_id', '_free')
+    
+    def __init__(self, capacity: int = 64):
+        """
+        Initialize store.
+        
+        Args:
+            capacity: Initial number of slots (doubled whenever full)
+        """
+        self.ids = np.zeros(capacity, dtype=np.uint32)  # Arrival sequence number (wraps at 2**32)
+        self.arrival_time = np.zeros(capacity)
+        self.departure_time = np.full(capacity, np.nan)  # NaN until the vehicle departs
+        self.direction = np.zeros(capacity, dtype=np.int8)  # DIRECTION_INDEX value
+        self.turn = np.zeros(capacity, dtype=np.int8)  # TURN_INDEX value
+        self.lane = np.full(capacity, -1, dtype=np.int16)  # -1 marks a free slot
+        self.next_id = 0
+        self._free = HandleRing(capacity)
+        self._free.extend(range(capacity))
+    
+    def __len__(self) -> int:
+        return len(self.lane) - len(self._free)
+    
+    @property
+    def capacity(self) -> int:
+        return len(self.lane)
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns and the free list (all slots, used or free)."""
+        return (self.ids.nbytes + self.arrival_time.nbytes + self.departure_time.nbytes
+                + self.direction.nbytes + self.turn.nbytes + self.lane.nbytes + self._free.buffer.nbytes)
+    
+    def allocate(self, arrival_time: float, direction: int, turn: int, lane: int) -> int:
+        """
+        Store a vehicle.
+        
+        Args:
+            arrival_time: Arrival time (seconds)
+            direction: DIRECTION_INDEX value
+            turn: TURN_INDEX value
+            lane: Lane the vehicle queues in
+            
+        Returns:
+            Handle of the vehicle
+        """
+        if not self._free.size:
+            self._grow()
+        handle = self._free.popleft()
+        self.ids[handle] = self.next_id & 0xFFFFFFFF
+        self.arrival_time[handle] = arrival_time
+        self.departure_time[handle] = np.nan
+        self.direction[handle] = direction
+        self.turn[handle] = turn
+        self.lane[handle] = lane
+        self.next_id += 1
+        return handle
+    
+    def release(self, handle: int, departure_time: float = np.nan):
+        """
+        Free a vehicle's slot for reuse.
+        
+        Args:
+            handle: Vehicle to free
+            departure_time: When it departed (kept in the slot until reused)
+        """
+        self.departure_time[handle] = departure_time
+        self.lane[handle] = -1
+        self._free.append(handle)
+    
+    def _grow(self):
+        old = len(self.lane)
+        size = max(2 * old, 16)
+        for name, fill in (('ids', 0), ('arrival_time', 0.0), ('departure_time', np.nan),
+                           ('direction', 0), ('turn', 0), ('lane', -1)):
+            values = getattr(self, name)
+            grown = np.full(size, fill, dtype=values.dtype)
+            grown[:old] = values
+            setattr(self, name, grown)
+        self._free.extend(range(old, size))
+    
+    def live(self) -> np.ndarray:
+        """Handles of every stored vehicle."""
+        return np.flatnonzero(self.lane >= 0)
+    
+    def wait_times(self, now: float, handles=None) -> np.ndarray:
+        """
+        Time waited so far by stored vehicles.
+        
+        Args:
+            now: Current time (seconds)
+            handles: Vehicles to report (defaults to every stored vehicle)
+        """
+        if handles is None:
+            handles = self.live()
+        return now - self.arrival_time[np.asarray(handles, dtype=np.int64)]
+    
+    def vehicle(self, handle: int) -> 'Vehicle':
+        """Materialize one stored vehicle as a Vehicle."""
+        departure_time = self.departure_time.item(handle)
+        return Vehicle(
+            arrival_time=self.arrival_time.item(handle),
+            direction=DIRECTIONS[self.direction.item(handle)],
+            departure_time=None if math.isnan(departure_time) else departure_time,
+            turn=TURNS[self.turn.item(handle)]
+        )
+
+
 @dataclass
 class Vehicle:
     """Represents a single vehicle."""
     arrival_time: float
     direction: Direction
     departure_time: float = None
+    turn: Turn = Turn.THROUGH
 
 
 @dataclass
 class IntersectionState:
     """Current state of the intersection."""
-    queues: Dict[Direction, List[Vehicle]] = field(default_factory=lambda: {
-        Direction.NORTH: [],
-        Direction.EAST: [],
-        Direction.SOUTH: [],
-        Direction.WEST: []
-    })
-    active_phase: SignalPhase = SignalPhase.NS
+    active_phase: Phase = None  # Defaults to the plan's first phase
     signal_state: SignalState = SignalState.GREEN
     phase_timer: float = 0.0  # Time in current state
     time_since_green: Dict[Direction, float] = field(default_factory=lambda: {
@@ -60,43 +702,191 @@ class IntersectionState:
         Direction.SOUTH: 0,
         Direction.WEST: 0
     })
+    phase_plan: PhasePlan = field(default_factory=lambda: TWO_PHASE_PLAN)
+    lane_layout: LaneLayout = field(default_factory=lambda: SINGLE_LANE_LAYOUT)
+    lane_queues: List[HandleRing] = None  # One FIFO of VehicleStore handles per lane
+    vehicles: VehicleStore = None  # The vehicles lane_queues refer to
+    discharge_credit: np.ndarray = None  # Fractional departures carried per lane
+    storage_capacity: Dict[Direction, int] = None  # Max queued vehicles per approach (None = unbounded)
+    overflow: Dict[Direction, 'OverflowBuffer'] = None  # Vehicles held upstream of a full approach
+    spillback: Dict[Direction, bool] = field(default_factory=lambda: {
+        Direction.NORTH: False,
+        Direction.EAST: False,
+        Direction.SOUTH: False,
+        Direction.WEST: False
+    })
+    
+    def __post_init__(self):
+        """Resolve the active phase and build per-lane storage."""
+        if self.active_phase is None:
+            self.active_phase = self.phase_plan.phases[0]
+        else:
+            self.active_phase = self.phase_plan.get(self.active_phase)
+        if self.lane_queues is None:
+            self.lane_queues = [HandleRing() for _ in range(self.lane_layout.n_lanes)]
+        if self.vehicles is None:
+            self.vehicles = VehicleStore()
+        if self.discharge_credit is None:
+            self.discharge_credit = np.zeros(self.lane_layout.n_lanes)
+        if self.overflow is None:
+            self.overflow = {d: OverflowBuffer() for d in Direction}
+        self._phase_lanes = self.lane_layout.phase_lanes(self.phase_plan)
+        # Candidate lanes by DIRECTION_INDEX * len(TURNS) + TURN_INDEX
+        self._lane_choices = tuple(
+            self.lane_layout.lanes_for_turn.get((d, t), ()) for d in DIRECTIONS for t in TURNS
+        )
+    
+    def queue_handles(self, direction: Direction, limit: int = None) -> np.ndarray:
+        """
+        Handles of the vehicles waiting on an approach (lanes concatenated).
+        
+        Args:
+            direction: Approach
+            limit: Return at most this many handles
+        """
+        handles = []
+        remaining = limit
+        for lane in self.lane_layout.lanes_by_direction[direction]:
+            lane_handles = self.lane_queues[lane].to_array(remaining)
+            handles.append(lane_handles)
+            if remaining is not None:
+                remaining -= len(lane_handles)
+        return np.concatenate(handles) if handles else np.zeros(0, dtype=np.int32)
+    
+    def queued_vehicles(self, direction: Direction) -> List[Vehicle]:
+        """Vehicles waiting on an approach, materialized as Vehicle objects."""
+        return [self.vehicles.vehicle(h) for h in self.queue_handles(direction).tolist()]
+    
+    def add_vehicle(self, vehicle: Vehicle) -> int:
+        """
+        Queue a vehicle in the shortest lane that allows its turn.
+        
+        Returns:
+            Index of the lane the vehicle joined
+        """
+        return self.enqueue(vehicle.arrival_time, DIRECTION_INDEX[vehicle.direction], TURN_INDEX[vehicle.turn])
+    
+    def enqueue(self, arrival_time: float, direction: int, turn: int) -> int:
+        """
+        Queue a vehicle given by value, without a Vehicle object.
+        
+        Args:
+            arrival_time: Arrival time (seconds)
+            direction: DIRECTION_INDEX value
+            turn: TURN_INDEX value
+            
+        Returns:
+            Index of the lane the vehicle joined (the shortest allowing its turn)
+        """
+        candidates = self._lane_choices[direction * len(TURNS) + turn]
+        if len(candidates) == 1:
+            lane = candidates[0]
+        elif not candidates:
+            raise ValueError(
+                f"No lane on approach {DIRECTIONS[direction].value} allows turn {TURNS[turn].value}"
+            )
+        else:
+            lane = min(candidates, key=lambda i: len(self.lane_queues[i]))
+        self.lane_queues[lane].append(self.vehicles.allocate(arrival_time, direction, turn, lane))
+        return lane
+    
+    def pop_vehicle(self, lane: int) -> Vehicle:
+        """Remove the first vehicle of a lane, returned as a Vehicle."""
+        handle = self.lane_queues[lane].popleft()
+        vehicle = self.vehicles.vehicle(handle)
+        self.vehicles.release(handle)
+        return vehicle
+    
+    def has_storage(self, direction: Direction) -> bool:
+        """Check whether an approach has room for another queued vehicle."""
+        if self.storage_capacity is None:
+            return True
+        capacity = self.storage_capacity.get(direction)
+        return capacity is None or self.get_queue_length(direction) < capacity
+    
+    def hold_vehicle(self, vehicle: Vehicle):
+        """Hold a vehicle upstream of its approach."""
+        self.overflow[vehicle.direction].push(vehicle.arrival_time, TURN_INDEX[vehicle.turn])
+    
+    def get_overflow(self, direction: Direction) -> int:
+        """Get number of vehicles held upstream of an approach."""
+        return len(self.overflow[direction])
+    
+    def release_overflow(self, direction: Direction) -> int:
+        """
+        Move held vehicles into the approach, oldest first, while it has storage.
+        
+        Returns:
+            Number of vehicles released
+        """
+        buffer = self.overflow[direction]
+        released = 0
+        while buffer and self.has_storage(direction):
+            arrival_time, turn = buffer.pop()
+            self.enqueue(arrival_time, DIRECTION_INDEX[direction], turn)
+            released += 1
+        return released
+    
+    def get_lane_lengths(self) -> np.ndarray:
+        """Get number of vehicles waiting in each lane."""
+        return np.fromiter(map(len, self.lane_queues), dtype=np.int64,
+                           count=self.lane_layout.n_lanes)
     
     def get_queue_length(self, direction: Direction) -> int:
         """Get number of vehicles waiting in a direction."""
-        return len(self.queues[direction])
+        return sum(len(self.lane_queues[i]) for i in self.lane_layout.lanes_by_direction[direction])
     
-    def get_phase_queue_length(self, phase: SignalPhase) -> int:
-        """Get total vehicles waiting for a phase."""
-        if phase == SignalPhase.NS:
-            return self.get_queue_length(Direction.NORTH) + self.get_queue_length(Direction.SOUTH)
-        else:
-            return self.get_queue_length(Direction.EAST) + self.get_queue_length(Direction.WEST)
+    def get_queue_lengths(self) -> Dict[Direction, int]:
+        """Get number of vehicles waiting in every direction."""
+        queues = self.lane_queues
+        return {
+            d: sum(len(queues[i]) for i in lanes)
+            for d, lanes in self.lane_layout.lanes_by_direction.items()
+        }
     
-    def get_phase_directions(self, phase: SignalPhase) -> List[Direction]:
+    def get_phase_queue_length(self, phase: Phase) -> int:
+        """Get total vehicles waiting in lanes served by a phase."""
+        lanes = self._phase_lanes[self.phase_plan.index_of(phase)]
+        return sum(len(self.lane_queues[i]) for i in lanes)
+    
+    def get_phase_directions(self, phase: Phase) -> Tuple[Direction, ...]:
         """Get directions served by a phase."""
-        if phase == SignalPhase.NS:
-            return [Direction.NORTH, Direction.SOUTH]
-        else:
-            return [Direction.EAST, Direction.WEST]
+        return self.phase_plan.directions[self.phase_plan.index_of(phase)]
     
-    def get_opposing_phase(self, phase: SignalPhase) -> SignalPhase:
-        """Get the opposing phase."""
-        return SignalPhase.EW if phase == SignalPhase.NS else SignalPhase.NS
+    def get_next_phase(self, phase: Phase) -> Phase:
+        """Get the phase that follows in the plan's sequence."""
+        return self.phase_plan.next_phase[self.phase_plan.index_of(phase)]
+    
+    def get_opposing_phase(self, phase: Phase) -> Phase:
+        """Get the opposing phase (the next phase in a two-phase plan)."""
+        return self.get_next_phase(phase)
 
 
 class ArrivalProcess:
     """Generates vehicle arrivals using Poisson process."""
     
-    def __init__(self, arrival_rates: Dict[Direction, float], seed: int = None):
+    def __init__(self, arrival_rates: Dict[Direction, float], seed: int = None,
+                 turn_ratios: Dict[Direction, Dict[Turn, float]] = None):
         """
         Initialize arrival process.
         
         Args:
             arrival_rates: Dictionary mapping Direction to arrival rate (vehicles/second)
             seed: Random seed for reproducibility
+            turn_ratios: Optional per-direction turning proportions; directions
+                not listed send every vehicle through
         """
         self.arrival_rates = arrival_rates
         self.rng = np.random.RandomState(seed)
+        self.turn_ratios = turn_ratios or {}
+        # Turns use their own stream so arrival counts do not depend on them
+        self.turn_rng = np.random.RandomState(None if seed is None else [seed, 1])
+        self._turn_probs = {}
+        for direction, ratios in self.turn_ratios.items():
+            probs = np.array([ratios.get(t, 0.0) for t in TURNS], dtype=float)
+            if probs.sum() <= 0:
+                raise ValueError(f"Turn ratios for {direction.value} must sum to a positive value")
+            self._turn_probs[direction] = probs / probs.sum()
     
     def generate_arrivals(self, current_time: float, dt: float) -> List[Vehicle]:
         """
@@ -109,16 +899,330 @@ class ArrivalProcess:
         Returns:
             List of new vehicles
         """
-        arrivals = []
+        directions, turns = self.sample_arrivals(current_time, dt)
+        return [
+            Vehicle(arrival_time=current_time, direction=DIRECTIONS[d], turn=TURNS[t])
+            for d, t in zip(directions, turns)
+        ]
+    
+    def sample_arrivals(self, current_time: float, dt: float) -> Tuple[List[int], List[int]]:
+        """
+        Draw the arrivals of a time step by value (what the simulator queues).
+        
+        Args:
+            current_time: Current simulation time
+            dt: Time step duration
+            
+        Returns:
+            (DIRECTION_INDEX values, TURN_INDEX values), one entry per vehicle
+        """
+        directions, turns = [], []
         for direction, rate in self.arrival_rates.items():
             # Poisson: number of arrivals in dt
             n_arrivals = self.rng.poisson(rate * dt)
-            for _ in range(n_arrivals):
-                arrivals.append(Vehicle(
-                    arrival_time=current_time,
-                    direction=direction
-                ))
-        return arrivals
+            if not n_arrivals:
+                continue
+            directions.extend([DIRECTION_INDEX[direction]] * n_arrivals)
+            probs = self._turn_probs.get(direction)
+            if probs is None:
+                turns.extend([THROUGH] * n_arrivals)
+            else:
+                turns.extend(self.turn_rng.choice(len(TURNS), size=n_arrivals, p=probs).tolist())
+        return directions, turns
+    
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Return RNG state as arrays, for checkpoints."""
+        state = {}
+        for name, rng in (('rng', self.rng), ('turn_rng', self.turn_rng)):
+            _, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+            state[f'{name}/keys'] = keys
+            state[f'{name}/scalars'] = np.array([pos, has_gauss, cached_gaussian], dtype=float)
+        return state
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore RNG state returned by get_state."""
+        for name, rng in (('rng', self.rng), ('turn_rng', self.turn_rng)):
+            pos, has_gauss, cached_gaussian = state[f'{name}/scalars'].tolist()
+            rng.set_state(('MT19937', state[f'{name}/keys'], int(pos), int(has_gauss), cached_gaussian))
+
+
+def poisson_inverse_cdf(u: np.ndarray, mean: float) -> np.ndarray:
+    """
+    Poisson counts by inversion of the CDF.
+    
+    Monotone in u, so feeding u and 1 - u gives negatively correlated
+    (antithetic) counts.
+    
+    Args:
+        u: Uniform(0, 1) draws
+        mean: Poisson mean
+    """
+    if mean <= 0:
+        return np.zeros(np.shape(u), dtype=np.int64)
+    k_max = int(mean + 12 * np.sqrt(mean) + 12)
+    k = np.arange(k_max + 1)
+    log_pmf = k * np.log(mean) - mean - np.array([math.lgamma(i + 1) for i in k])
+    cdf = np.cumsum(np.exp(log_pmf))
+    return np.minimum(np.searchsorted(cdf, u, side='right'), k_max)
+
+
+class PresampledArrivalProcess(ArrivalProcess):
+    """
+    Poisson arrivals drawn up front for a fixed horizon.
+    
+    Counts come from stored uniforms by CDF inversion, so every replay of
+    the process delivers exactly the same arrivals (common random numbers
+    across controllers) and the antithetic replay uses 1 - U for every draw.
+    """
+    
+    def __init__(self, arrival_rates: Dict[Direction, float], seed: int = None,
+                 turn_ratios: Dict[Direction, Dict[Turn, float]] = None,
+                 horizon: float = 3600.0, dt: float = 1.0):
+        """
+        Initialize presampled arrival process.
+        
+        Args:
+            arrival_rates: Dictionary mapping Direction to arrival rate (vehicles/second)
+            seed: Random seed for reproducibility
+            turn_ratios: Optional per-direction turning proportions
+            horizon: Simulated time covered by the presampled stream (seconds)
+            dt: Time step the simulator will use (seconds)
+        """
+        super().__init__(arrival_rates, seed, turn_ratios)
+        self.dt = dt
+        self.n_steps = int(round(horizon / dt))
+        self.directions = list(arrival_rates)
+        self.antithetic = False
+        self.cursor = 0  # Next step to deliver
+        
+        uniforms = self.rng.random_sample((self.n_steps, len(self.directions)))
+        counts = {}
+        for antithetic in (False, True):
+            u = 1.0 - uniforms if antithetic else uniforms
+            counts[antithetic] = np.column_stack([
+                poisson_inverse_cdf(u[:, j], arrival_rates[d] * dt)
+                for j, d in enumerate(self.directions)
+            ]).astype(np.int32) if self.directions else np.zeros((self.n_steps, 0), dtype=np.int32)
+        
+        # One turn uniform per vehicle, in arrival order
+        n_vehicles = max(int(c.sum()) for c in counts.values())
+        turn_uniforms = self.turn_rng.random_sample(n_vehicles)
+        turns = {}
+        for antithetic in (False, True):
+            u = 1.0 - turn_uniforms if antithetic else turn_uniforms
+            vehicle_dirs = np.repeat(
+                np.tile(np.arange(len(self.directions)), self.n_steps),
+                counts[antithetic].ravel()
+            )
+            turn_idx = np.full(len(vehicle_dirs), TURN_INDEX[Turn.THROUGH], dtype=np.int8)
+            for j, d in enumerate(self.directions):
+                probs = self._turn_probs.get(d)
+                if probs is not None:
+                    mask = vehicle_dirs == j
+                    turn_idx[mask] = np.searchsorted(np.cumsum(probs), u[:len(vehicle_dirs)][mask], side='right')
+            turns[antithetic] = np.minimum(turn_idx, len(TURNS) - 1)
+        
+        self._counts = counts
+        self._turns = turns
+        self._offsets = {a: np.concatenate([[0], np.cumsum(c.sum(axis=1))]) for a, c in counts.items()}
+    
+    def replay(self, antithetic: bool = False) -> 'PresampledArrivalProcess':
+        """
+        Get a fresh copy of the stream from the start, sharing the draws.
+        
+        Args:
+            antithetic: Deliver the antithetic stream (1 - U) instead
+        """
+        clone = copy.copy(self)
+        clone.antithetic = antithetic
+        clone.cursor = 0
+        return clone
+    
+    def sample_arrivals(self, current_time: float, dt: float) -> Tuple[List[int], List[int]]:
+        """Deliver the presampled arrivals of the next time step."""
+        if dt != self.dt:
+            raise ValueError(f"Stream was presampled for dt={self.dt}, got dt={dt}")
+        if self.cursor >= self.n_steps:
+            raise ValueError(f"Presampled arrival stream exhausted after {self.n_steps} steps")
+        row = self._counts[self.antithetic][self.cursor]
+        turns = self._turns[self.antithetic]
+        offset = int(self._offsets[self.antithetic][self.cursor])
+        self.cursor += 1
+        
+        directions = []
+        for direction, n_arrivals in zip(self.directions, row.tolist()):
+            directions.extend([DIRECTION_INDEX[direction]] * n_arrivals)
+        return directions, turns[offset:offset + len(directions)].tolist()
+    
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Return stream position (the draws themselves are configuration)."""
+        return {'cursor': np.asarray(self.cursor), 'antithetic': np.asarray(self.antithetic)}
+    
+    def set_state(self, state: Dict[str, np.ndarray]):
+        """Restore stream position returned by get_state."""
+        self.cursor = int(state['cursor'])
+        self.antithetic = bool(state['antithetic'])
+
+
+class WaitHistogram:
+    """
+    Wait-time distribution counted in buckets of the simulation step.
+    
+    Vehicles arrive and depart on step boundaries, so every wait is a whole
+    number of steps and bucket k (waits of k * resolution) is exact:
+    percentiles equal np.percentile over the raw waits (linear
+    interpolation). Adding a wait is O(1); percentiles, CDF and tail
+    probabilities are O(buckets), independent of how many vehicles were
+    counted. Histograms of the same resolution merge by adding counts, e.g.
+    to pool replications or workers.
+    """
+    __slots__ = ('resolution', 'counts', 'count', 'total')
+    
+    def __init__(self, resolution: float = 1.0, counts: Sequence[int] = None, total: float = None):
+        """
+        Initialize histogram.
+        
+        Args:
+            resolution: Bucket width (seconds), the simulator's dt
+            counts: Initial count per bucket
+            total: Sum of the counted waits (defaults to the sum of the
+                bucket values)
+        """
+        if resolution <= 0:
+            raise ValueError(f"Histogram resolution must be positive, got {resolution}")
+        self.resolution = float(resolution)
+        self.counts: List[int] = [int(c) for c in counts] if counts is not None else []
+        self.count = sum(self.counts)
+        if total is None:
+            total = sum(k * c for k, c in enumerate(self.counts)) * self.resolution
+        self.total = float(total)  # Exact sum of waits, for the mean
+    
+    @classmethod
+    def from_waits(cls, waits: Iterable[float], resolution: float = 1.0) -> 'WaitHistogram':
+        """Histogram of a sequence of waits."""
+        histogram = cls(resolution)
+        histogram.add_many(waits)
+        return histogram
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __repr__(self):
+        return f'WaitHistogram(resolution={self.resolution:g}, count={self.count}, buckets={len(self.counts)})'
+    
+    def add(self, wait: float):
+        """Count one wait."""
+        k = round(wait / self.resolution)
+        counts = self.counts
+        if k >= len(counts):
+            counts.extend([0] * (k + 1 - len(counts)))
+        counts[k] += 1
+        self.count += 1
+        self.total += wait
+    
+    def add_many(self, waits: Iterable[float]):
+        """Count a batch of waits."""
+        waits = np.asarray(list(waits) if not isinstance(waits, (np.ndarray, list, tuple)) else waits,
+                           dtype=float)
+        if not len(waits):
+            return
+        added = np.bincount(np.rint(waits / self.resolution).astype(np.int64))
+        if len(added) > len(self.counts):
+            self.counts.extend([0] * (len(added) - len(self.counts)))
+        for k in np.flatnonzero(added).tolist():
+            self.counts[k] += int(added[k])
+        self.count += len(waits)
+        self.total += float(waits.sum())
+    
+    def merge(self, other: 'WaitHistogram') -> 'WaitHistogram':
+        """
+        Add another histogram's counts into this one.
+        
+        Raises:
+            ValueError: If the resolutions differ
+        """
+        if other.resolution != self.resolution:
+            raise ValueError(f"Cannot merge histograms with resolutions {self.resolution:g} and {other.resolution:g}")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for k, c in enumerate(other.counts):
+            if c:
+                self.counts[k] += c
+        self.count += other.count
+        self.total += other.total
+        return self
+    
+    def __add__(self, other: 'WaitHistogram') -> 'WaitHistogram':
+        return self.copy().merge(other)
+    
+    def copy(self) -> 'WaitHistogram':
+        histogram = WaitHistogram(self.resolution)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        return histogram
+    
+    def values(self) -> np.ndarray:
+        """Wait of each bucket (seconds)."""
+        return np.arange(len(self.counts)) * self.resolution
+    
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+    
+    def percentiles(self, q: Sequence[float]) -> np.ndarray:
+        """
+        Percentiles of the waits, as np.percentile with linear interpolation.
+        
+        Args:
+            q: Percentiles in [0, 100]
+        """
+        q = np.asarray(q, dtype=float) / 100
+        n = self.count
+        if n == 0:
+            return np.zeros(q.shape)
+        # np.percentile's virtual index and neighbours, then the bucket holding each rank
+        position = n * q + (1 - q) - 1
+        lower = np.floor(position)
+        gamma = position - lower
+        upper = lower + 1
+        above = position >= n - 1
+        lower[above] = upper[above] = n - 1
+        below = position < 0
+        lower[below] = upper[below] = 0
+        cumulative = np.cumsum(self.counts)
+        a = np.searchsorted(cumulative, lower, side='right') * self.resolution
+        b = np.searchsorted(cumulative, upper, side='right') * self.resolution
+        difference = b - a
+        return np.where(gamma >= 0.5, b - difference * (1 - gamma), a + difference * gamma)
+    
+    def percentile(self, q: float) -> float:
+        """One percentile of the waits (0 when empty)."""
+        return float(self.percentiles([q])[0])
+    
+    def cdf(self, wait: float) -> float:
+        """Share of waits at or below `wait`."""
+        if self.count == 0:
+            return 0.0
+        k = math.floor(wait / self.resolution + 1e-9)
+        if k < 0:
+            return 0.0
+        return sum(self.counts[:k + 1]) / self.count
+    
+    def tail(self, wait: float) -> float:
+        """Share of waits longer than `wait`."""
+        return 1.0 - self.cdf(wait) if self.count else 0.0
+    
+    def to_dict(self) -> Dict[str, object]:
+        """Compact JSON-compatible form (counts without trailing empty buckets)."""
+        counts = self.counts
+        end = len(counts)
+        while end and not counts[end - 1]:
+            end -= 1
+        return {'resolution': self.resolution, 'counts': counts[:end], 'total': self.total}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'WaitHistogram':
+        return cls(data['resolution'], data['counts'], data['total'])
 
 
 @dataclass
@@ -133,7 +1237,18 @@ class SimulationMetrics:
         Direction.SOUTH: 0,
         Direction.WEST: 0
     })
-    wait_times: List[float] = field(default_factory=list)
+    wait_times: Optional[List[float]] = None  # Every wait in departure order, only when kept (keep_wait_times)
+    wait_histogram: WaitHistogram = field(default_factory=WaitHistogram)
+    direction_waits: Dict[Direction, WaitHistogram] = field(default_factory=lambda: {
+        Direction.NORTH: WaitHistogram(),
+        Direction.EAST: WaitHistogram(),
+        Direction.SOUTH: WaitHistogram(),
+        Direction.WEST: WaitHistogram()
+    })  # Waits of departed vehicles by approach
+    # Per-phase accumulators indexed like the phase plan (sized by the simulator)
+    phase_green_time: np.ndarray = field(default_factory=lambda: np.zeros(0))  # Seconds of green
+    phase_wasted_green: np.ndarray = field(default_factory=lambda: np.zeros(0))  # Green with no vehicle on the phase's lanes
+    phase_departures: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
     queue_history: List[Dict[Direction, int]] = field(default_factory=list)
     phase_history: List[tuple] = field(default_factory=list)  # (time, phase, state)
     max_consecutive_skips: Dict[Direction, int] = field(default_factory=lambda: {
@@ -142,13 +1257,39 @@ class SimulationMetrics:
         Direction.SOUTH: 0,
         Direction.WEST: 0
     })
+    blocked_time: Dict[Direction, float] = field(default_factory=lambda: {
+        Direction.NORTH: 0.0,
+        Direction.EAST: 0.0,
+        Direction.SOUTH: 0.0,
+        Direction.WEST: 0.0
+    })  # Time each approach spent at storage capacity (seconds)
+    spillback_count: Dict[Direction, int] = field(default_factory=lambda: {
+        Direction.NORTH: 0,
+        Direction.EAST: 0,
+        Direction.SOUTH: 0,
+        Direction.WEST: 0
+    })  # Times each approach filled up
+    total_vehicles_held: int = 0  # Arrivals held upstream of a full approach
+    total_vehicles_blocked: int = 0  # Arrivals turned away by a full approach
+    max_overflow: Dict[Direction, int] = field(default_factory=lambda: {
+        Direction.NORTH: 0,
+        Direction.EAST: 0,
+        Direction.SOUTH: 0,
+        Direction.WEST: 0
+    })
     
     def record_departure(self, vehicle: Vehicle, departure_time: float):
         """Record a vehicle departure."""
-        wait_time = departure_time - vehicle.arrival_time
+        self.record_wait(departure_time - vehicle.arrival_time, vehicle.direction)
+    
+    def record_wait(self, wait_time: float, direction: Direction):
+        """Record a departure by its wait and approach."""
         self.total_vehicles_departed += 1
         self.total_wait_time += wait_time
-        self.wait_times.append(wait_time)
+        if self.wait_times is not None:
+            self.wait_times.append(wait_time)
+        self.wait_histogram.add(wait_time)
+        self.direction_waits[direction].add(wait_time)
     
     def get_average_wait_time(self) -> float:
         """Calculate average wait time."""
@@ -157,11 +1298,105 @@ class SimulationMetrics:
         return self.total_wait_time / self.total_vehicles_departed
     
     def get_percentile_wait_time(self, percentile: float) -> float:
-        """Calculate percentile wait time."""
-        if not self.wait_times:
-            return 0.0
-        return np.percentile(self.wait_times, percentile)
+        """Calculate percentile wait time (from the wait histogram)."""
+        return self.wait_histogram.percentile(percentile)
     
     def get_max_queue_length_total(self) -> int:
         """Get maximum queue length across all directions."""
         return max(self.max_queue_length.values())
+    
+    def queue_array(self) -> np.ndarray:
+        """Queue history as an (n_steps, 4) array, columns in DIRECTIONS order."""
+        n = len(self.queue_history)
+        values = np.fromiter(
+            (snapshot[d] for snapshot in self.queue_history for d in DIRECTIONS),
+            dtype=np.int64, count=n * len(DIRECTIONS)
+        )
+        return values.reshape(n, len(DIRECTIONS))
+    
+    def phase_arrays(self, phase_names: List[str] = None):
+        """
+        Phase history as arrays.
+        
+        Args:
+            phase_names: Phase order for the returned indices (defaults to
+                order of first appearance)
+            
+        Returns:
+            (times, phase indices, phase names, state values) where state
+            values are SignalState values ('G', 'Y', 'R') as a string array
+        """
+        if not self.phase_history:
+            return np.zeros(0), np.zeros(0, dtype=np.int64), list(phase_names or []), np.zeros(0, dtype='<U1')
+        times, phases, states = zip(*self.phase_history)
+        names, inverse = np.unique(np.asarray(phases), return_inverse=True)
+        if phase_names is None:
+            # Order of first appearance rather than alphabetical
+            first = np.full(len(names), len(inverse))
+            np.minimum.at(first, inverse, np.arange(len(inverse)))
+            order = np.argsort(first)
+            phase_names = names[order].tolist()
+        lookup = {name: i for i, name in enumerate(phase_names)}
+        remap = np.array([lookup[name] for name in names.tolist()], dtype=np.int64)
+        return np.asarray(times, dtype=float), remap[inverse], list(phase_names), np.asarray(states)
+    
+    def direction_breakdown(self) -> Dict[Direction, Dict[str, float]]:
+        """
+        Fairness report per approach.
+        
+        Returns:
+            Per direction: departed vehicles, average and 95th percentile
+            wait, max queue and max consecutive skips
+        """
+        return {
+            d: {
+                'departed': self.direction_waits[d].count,
+                'avg_wait_time': self.direction_waits[d].mean(),
+                'p95_wait_time': self.direction_waits[d].percentile(95),
+                'max_queue': self.max_queue_length[d],
+                'max_consecutive_skips': self.max_consecutive_skips[d],
+            }
+            for d in DIRECTIONS
+        }
+    
+    def phase_breakdown(self, phase_names: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """
+        Efficiency report per phase.
+        
+        Args:
+            phase_names: Phase names in plan order
+            
+        Returns:
+            Per phase: green time and wasted green (seconds), green
+            utilization (share of green with vehicles to serve), departures
+            and departures per second of green
+        """
+        report = {}
+        for i, name in enumerate(phase_names):
+            green = float(self.phase_green_time[i]) if i < len(self.phase_green_time) else 0.0
+            wasted = float(self.phase_wasted_green[i]) if i < len(self.phase_wasted_green) else 0.0
+            departures = int(self.phase_departures[i]) if i < len(self.phase_departures) else 0
+            report[name] = {
+                'green_time': green,
+                'wasted_green': wasted,
+                'utilization': 1.0 - wasted / green if green > 0 else 0.0,
+                'departures': departures,
+                'departures_per_green_second': departures / green if green > 0 else 0.0,
+            }
+        return report
+    
+    def summary(self, duration: float) -> Dict[str, float]:
+        """
+        Headline results of a run, keyed as in experiment result tables.
+        
+        Args:
+            duration: Simulated time the metrics cover (seconds)
+        """
+        return {
+            'total_arrived': self.total_vehicles_arrived,
+            'total_departed': self.total_vehicles_departed,
+            'avg_wait_time': self.get_average_wait_time(),
+            'p95_wait_time': self.get_percentile_wait_time(95),
+            'max_queue_total': self.get_max_queue_length_total(),
+            'throughput': self.total_vehicles_departed / duration if duration > 0 else 0.0,
+        }
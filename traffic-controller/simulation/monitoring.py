@@ -0,0 +1,298 @@
+"""
+Live progress metrics for long-running simulation sweeps.
+
+A ``ProgressMonitor`` collects counters from the process driving a sweep:
+simulated steps (reported by ``TrafficSimulator.run(monitor=...)`` every few
+hundred steps), completed replications, the latest queue statistics and
+which worker tasks are running. Two optional exporters publish it:
+
+- ``MetricsServer`` serves the Prometheus text format on a local HTTP port
+  (``/metrics``), for scraping into dashboards.
+- ``JsonLinesWriter`` appends a JSON snapshot to a file at a fixed interval.
+
+Both run in daemon threads and only read the monitor under its lock, so the
+simulation loop never waits on a scrape.
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Hashable, Optional
+from .models import DIRECTIONS, SimulationMetrics
+
+# Window over which steps/sec is measured (seconds)
+RATE_WINDOW = 30.0
+
+
+class ProgressMonitor:
+    """Thread-safe counters describing the progress of a sweep."""
+
+    def __init__(self, workers: int = 1, total_replications: int = None, report_every: int = 500):
+        """
+        Initialize monitor.
+
+        Args:
+            workers: Worker processes available to the sweep
+            total_replications: Replications planned (enables the ETA)
+            report_every: Steps between progress reports from a running simulator
+
+        Raises:
+            ValueError: If report_every is not positive
+        """
+        if report_every <= 0:
+            raise ValueError(f"report_every must be a positive number of steps, got {report_every}")
+        self.workers = workers
+        self.total_replications = total_replications
+        self.report_every = report_every
+        self.steps = 0
+        self.replications_completed = 0
+        self.queue_lengths: Dict[str, int] = {d.value: 0 for d in DIRECTIONS}
+        self.max_queue_total = 0
+        self.avg_wait_time = 0.0
+        self.simulated_time = 0.0
+        self._running: Dict[Hashable, float] = {}  # Task -> wall-clock start
+        self._busy_seconds = 0.0
+        self._started = time.monotonic()
+        self._rate_samples = deque([(self._started, 0)])
+        self._lock = threading.Lock()
+
+    # Updates -----------------------------------------------------------
+
+    def record_progress(self, simulator, steps: int):
+        """
+        Record steps simulated since the last report and the current queues.
+
+        Args:
+            simulator: TrafficSimulator being run
+            steps: Steps simulated since its previous report
+        """
+        metrics: SimulationMetrics = simulator.metrics
+        snapshot = metrics.queue_history[-1] if metrics.queue_history else {}
+        with self._lock:
+            self._add_steps(steps)
+            for direction, length in snapshot.items():
+                self.queue_lengths[direction.value] = length
+            self.max_queue_total = max(self.max_queue_total, sum(snapshot.values()))
+            self.avg_wait_time = metrics.get_average_wait_time()
+            self.simulated_time = simulator.current_time
+
+    def add_steps(self, steps: int):
+        """Count steps simulated elsewhere (e.g. in a worker process)."""
+        with self._lock:
+            self._add_steps(steps)
+
+    def _add_steps(self, steps: int):
+        now = time.monotonic()
+        self.steps += steps
+        self._rate_samples.append((now, self.steps))
+        while len(self._rate_samples) > 2 and now - self._rate_samples[1][0] > RATE_WINDOW:
+            self._rate_samples.popleft()
+
+    def task_started(self, task: Hashable):
+        """Mark a replication as running on a worker."""
+        with self._lock:
+            self._running[task] = time.monotonic()
+
+    def task_finished(self, task: Hashable, steps: int = 0, completed: bool = True):
+        """
+        Mark a replication as no longer running.
+
+        Args:
+            task: Key passed to task_started
+            steps: Steps it simulated, when not already reported
+            completed: False when the task was cancelled instead
+        """
+        with self._lock:
+            started = self._running.pop(task, None)
+            if started is not None:
+                self._busy_seconds += time.monotonic() - started
+            if completed:
+                self.replications_completed += 1
+            if steps:
+                self._add_steps(steps)
+
+    # Reading -----------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, object]:
+        """Current values of all published metrics."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._started
+            first_time, first_steps = self._rate_samples[0]
+            window = now - first_time
+            steps_per_second = (self.steps - first_steps) / window if window > 0 else 0.0
+
+            eta = None
+            if self.total_replications and self.replications_completed:
+                remaining = max(0, self.total_replications - self.replications_completed)
+                eta = elapsed / self.replications_completed * remaining
+
+            running_ages = [now - started for started in self._running.values()]
+            busy = self._busy_seconds + sum(running_ages)
+            return {
+                'timestamp': time.time(),
+                'elapsed_seconds': elapsed,
+                'steps_total': self.steps,
+                'steps_per_second': steps_per_second,
+                'simulated_time_seconds': self.simulated_time,
+                'replications_completed': self.replications_completed,
+                'replications_total': self.total_replications,
+                'eta_seconds': eta,
+                'queue_length': dict(self.queue_lengths),
+                'queue_length_total': sum(self.queue_lengths.values()),
+                'max_queue_total': self.max_queue_total,
+                'avg_wait_time_seconds': self.avg_wait_time,
+                'workers': self.workers,
+                'workers_busy': len(self._running),
+                'worker_utilization': busy / (elapsed * self.workers) if elapsed > 0 else 0.0,
+                'oldest_task_seconds': max(running_ages, default=0.0),
+            }
+
+    def prometheus_text(self) -> str:
+        """Render the snapshot in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, value, labels=None):
+            if value is None:
+                return
+            if not labels:
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+            lines.append(f"{name}{label_text} {value}")
+
+        metric('simulation_steps_total', 'counter', 'Simulated time steps', snap['steps_total'])
+        metric('simulation_steps_per_second', 'gauge',
+               f'Simulated steps per wall-clock second over the last {RATE_WINDOW:.0f}s',
+               snap['steps_per_second'])
+        metric('simulation_replications_completed_total', 'counter', 'Completed replications',
+               snap['replications_completed'])
+        metric('simulation_replications_planned', 'gauge', 'Planned replications',
+               snap['replications_total'])
+        metric('simulation_eta_seconds', 'gauge', 'Estimated wall-clock time to completion',
+               snap['eta_seconds'])
+        lines.extend(["# HELP simulation_queue_length Vehicles queued per approach in the latest report",
+                      "# TYPE simulation_queue_length gauge"])
+        for direction, length in snap['queue_length'].items():
+            metric('simulation_queue_length', 'gauge', '', length, {'direction': direction})
+        metric('simulation_max_queue_total', 'gauge', 'Largest total queue reported',
+               snap['max_queue_total'])
+        metric('simulation_avg_wait_seconds', 'gauge', 'Average wait of the latest reported run',
+               snap['avg_wait_time_seconds'])
+        metric('simulation_workers', 'gauge', 'Worker processes', snap['workers'])
+        metric('simulation_workers_busy', 'gauge', 'Workers running a replication',
+               snap['workers_busy'])
+        metric('simulation_worker_utilization', 'gauge', 'Fraction of worker time spent busy',
+               snap['worker_utilization'])
+        metric('simulation_oldest_task_seconds', 'gauge',
+               'Age of the longest-running replication (stalled workers grow this)',
+               snap['oldest_task_seconds'])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a monitor in Prometheus text format over local HTTP."""
+
+    def __init__(self, monitor: ProgressMonitor, port: int = 9108, host: str = '127.0.0.1'):
+        """
+        Initialize server (call start() to begin serving).
+
+        Args:
+            monitor: Monitor to publish
+            port: TCP port (0 picks a free port; see self.port after start)
+            host: Interface to bind (local only by default)
+        """
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> 'MetricsServer':
+        """Start serving /metrics in a background thread."""
+        monitor = self.monitor
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = monitor.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class JsonLinesWriter:
+    """Periodically appends monitor snapshots to a JSON lines file."""
+
+    def __init__(self, monitor: ProgressMonitor, path: str, interval: float = 10.0):
+        """
+        Initialize writer (call start() to begin writing).
+
+        Args:
+            monitor: Monitor to publish
+            path: File to append snapshots to
+            interval: Wall-clock seconds between snapshots
+        """
+        self.monitor = monitor
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self):
+        """Append one snapshot now."""
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(self.monitor.snapshot()) + "\n")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self) -> 'JsonLinesWriter':
+        """Start writing in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop writing, appending a final snapshot."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.write()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,274 @@
+"""
+Opt-in profiling of the simulation loop.
+
+``StepProfiler.attach`` wraps the stages of ``TrafficSimulator.step`` on one
+simulator instance (arrival generation, the controller decision, departure
+processing and metrics recording) with timers. Nothing in the simulator
+checks for a profiler, so an unprofiled run pays no overhead at all, and
+``detach`` restores the original methods.
+
+Per stage the profiler accumulates call counts and wall time, keeps a
+bounded list of timed events for Chrome-trace export (chrome://tracing,
+Perfetto), and can sample allocations with ``tracemalloc`` every N steps.
+Aggregates also export as collapsed stacks for flamegraph tools.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# Stage name -> (attribute owner, attribute name) on the simulator
+STAGES = {
+    'generate_arrivals': ('arrival_process', 'sample_arrivals'),
+    'decide_signal': ('controller', 'decide_signal'),
+    'departures': (None, '_discharge'),
+    'metrics': (None, '_record_metrics'),
+}
+
+
+@dataclass
+class StageStats:
+    """Accumulated cost of one stage."""
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    memory_samples: int = 0
+    allocated_bytes: int = 0  # Peak traced memory growth within sampled calls
+    retained_bytes: int = 0  # Net traced memory change over sampled calls
+
+    @property
+    def mean_us(self) -> float:
+        """Mean wall time per call (microseconds)."""
+        return self.total_ns / self.calls / 1e3 if self.calls else 0.0
+
+
+class StepProfiler:
+    """Times the stages of TrafficSimulator.step on an attached simulator."""
+
+    def __init__(self, max_events: int = 100_000, memory_every: int = 0):
+        """
+        Initialize profiler.
+
+        Args:
+            max_events: Timed events kept for trace export (0 keeps none;
+                aggregates are always complete)
+            memory_every: Sample allocations with tracemalloc every this
+                many steps (0 disables; tracemalloc slows the whole run
+                several-fold while enabled, so use it for separate runs)
+        """
+        self.max_events = max_events
+        self.memory_every = memory_every
+        self.stats: Dict[str, StageStats] = {name: StageStats() for name in ('step', *STAGES)}
+        self.events: List[Tuple[str, int, int]] = []  # (stage, start_ns, duration_ns)
+        self.simulator = None
+        self._originals = []
+        self._sampling = False
+        self._started_tracemalloc = False
+        self._origin_ns = time.perf_counter_ns()
+
+    # Attaching ---------------------------------------------------------
+
+    def attach(self, simulator) -> 'StepProfiler':
+        """
+        Start profiling a simulator.
+
+        Args:
+            simulator: TrafficSimulator to instrument
+
+        Returns:
+            self, so a profiler can be created and attached in one expression
+        """
+        if self.simulator is not None:
+            raise RuntimeError("Profiler is already attached")
+        if simulator.profiler is not None:
+            raise RuntimeError("Simulator already has a profiler attached")
+        self.simulator = simulator
+        simulator.profiler = self
+        self._wrap(simulator, 'step', self._time_step(simulator.step))
+        for stage, (owner, attribute) in STAGES.items():
+            target = getattr(simulator, owner) if owner else simulator
+            self._wrap(target, attribute, self._time_stage(stage, getattr(target, attribute)))
+        if self.memory_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def detach(self):
+        """Stop profiling and restore the simulator's original methods."""
+        if self.simulator is None:
+            return
+        for target, attribute in reversed(self._originals):
+            del target.__dict__[attribute]
+        self._originals = []
+        self.simulator.profiler = None
+        self.simulator = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def suspended(self):
+        """Temporarily remove the instrumentation (e.g. while copying objects)."""
+        simulator = self.simulator
+        self.detach()
+        try:
+            yield
+        finally:
+            if simulator is not None:
+                self.attach(simulator)
+
+    def _wrap(self, target, attribute: str, wrapper):
+        # Instance attributes shadow the class methods until detach
+        target.__dict__[attribute] = wrapper
+        self._originals.append((target, attribute))
+
+    # Timers ------------------------------------------------------------
+
+    def _time_stage(self, stage: str, func):
+        stats = self.stats[stage]
+        events = self.events
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            if self._sampling:
+                return self._sample_memory(stats, stage, func, args, kwargs)
+            start = clock()
+            result = func(*args, **kwargs)
+            elapsed = clock() - start
+            stats.calls += 1
+            stats.total_ns += elapsed
+            if elapsed > stats.max_ns:
+                stats.max_ns = elapsed
+            if len(events) < self.max_events:
+                events.append((stage, start, elapsed))
+            return result
+        return timed
+
+    def _time_step(self, func):
+        stats = self.stats['step']
+
+        def timed_step():
+            self._sampling = bool(self.memory_every) and stats.calls % self.memory_every == 0
+            if self._sampling:
+                before = tracemalloc.get_traced_memory()[0]
+            self._time_stage_call(stats, 'step', func)
+            if self._sampling:
+                stats.memory_samples += 1
+                stats.retained_bytes += tracemalloc.get_traced_memory()[0] - before
+                self._sampling = False
+        return timed_step
+
+    def _time_stage_call(self, stats: StageStats, stage: str, func, args=(), kwargs=None):
+        start = time.perf_counter_ns()
+        result = func(*args, **(kwargs or {}))
+        elapsed = time.perf_counter_ns() - start
+        stats.calls += 1
+        stats.total_ns += elapsed
+        stats.max_ns = max(stats.max_ns, elapsed)
+        if len(self.events) < self.max_events:
+            self.events.append((stage, start, elapsed))
+        return result
+
+    def _sample_memory(self, stats: StageStats, stage: str, func, args, kwargs):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = self._time_stage_call(stats, stage, func, args, kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+        stats.memory_samples += 1
+        stats.allocated_bytes += peak - before
+        stats.retained_bytes += current - before
+        return result
+
+    # Reporting ---------------------------------------------------------
+
+    def reset(self):
+        """Discard everything recorded so far."""
+        for stats in self.stats.values():
+            stats.__init__()
+        self.events.clear()
+        self._origin_ns = time.perf_counter_ns()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-stage totals, including time spent in step outside the stages.
+
+        Returns:
+            Stage name -> calls, total_s, mean_us, max_us, share (of step
+            time) and, when sampled, allocated/retained bytes per sampled call
+        """
+        step_ns = self.stats['step'].total_ns
+        rows = {}
+        for name, stats in self.stats.items():
+            rows[name] = {
+                'calls': stats.calls,
+                'total_s': stats.total_ns / 1e9,
+                'mean_us': stats.mean_us,
+                'max_us': stats.max_ns / 1e3,
+                'share': stats.total_ns / step_ns if step_ns else 0.0,
+            }
+            if stats.memory_samples:
+                rows[name]['retained_bytes'] = stats.retained_bytes / stats.memory_samples
+                if name != 'step':
+                    rows[name]['allocated_bytes'] = stats.allocated_bytes / stats.memory_samples
+        other_ns = step_ns - sum(self.stats[stage].total_ns for stage in STAGES)
+        rows['other'] = {
+            'calls': self.stats['step'].calls,
+            'total_s': other_ns / 1e9,
+            'mean_us': other_ns / self.stats['step'].calls / 1e3 if self.stats['step'].calls else 0.0,
+            'max_us': float('nan'),
+            'share': other_ns / step_ns if step_ns else 0.0,
+        }
+        return rows
+
+    def print_summary(self):
+        """Print a per-stage timing table."""
+        rows = self.summary()
+        print(f"\n{'Stage':20s} {'Calls':>9s} {'Total (s)':>10s} {'Mean (us)':>10s} {'Share':>7s}")
+        print("-" * 60)
+        for name, row in rows.items():
+            print(f"{name:20s} {row['calls']:9d} {row['total_s']:10.3f} "
+                  f"{row['mean_us']:10.2f} {row['share']:6.1%}")
+            if 'allocated_bytes' in row:
+                print(f"{'':20s} allocated {row['allocated_bytes']:.0f} B/call, "
+                      f"retained {row['retained_bytes']:.0f} B/call")
+            elif 'retained_bytes' in row:
+                print(f"{'':20s} retained {row['retained_bytes']:.0f} B/call")
+
+    def to_chrome_trace(self, path: str):
+        """
+        Write recorded events in Chrome trace format.
+
+        Args:
+            path: Output JSON file (open in chrome://tracing or Perfetto)
+        """
+        trace_events = [
+            {
+                'name': stage,
+                'cat': 'simulation',
+                'ph': 'X',
+                'ts': (start - self._origin_ns) / 1e3,
+                'dur': duration / 1e3,
+                'pid': 0,
+                'tid': 0,
+            }
+            for stage, start, duration in self.events
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+    def to_collapsed_stacks(self, path: str):
+        """
+        Write aggregate stage times as collapsed stacks (microseconds).
+
+        The output feeds flamegraph.pl, speedscope or inferno directly.
+
+        Args:
+            path: Output text file
+        """
+        rows = self.summary()
+        lines = [f"step;{name} {int(rows[name]['total_s'] * 1e6)}" for name in STAGES]
+        lines.append(f"step {max(0, int(rows['other']['total_s'] * 1e6))}")
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
@@ -0,0 +1,296 @@
+"""
+Partitioned columnar store for experiment results.
+
+``ResultsWriter`` appends result rows as they are produced and flushes them
+in batches to a Hive-style partitioned dataset::
+
+    results/experiment_results/
+        _schema.json
+        controller=fixed/scenario=default/part-00000-3f2a9c1e.parquet
+        controller=adaptive/scenario=default/part-00000-7b01d2aa.parquet
+
+Each batch is written to a temporary file and renamed into place, so a
+crashed sweep keeps every batch flushed before the crash. Batches are
+Parquet files when ``pyarrow`` is installed and compressed NumPy archives
+(one array per column) otherwise; both hold typed columns, and a dataset
+may mix the two.
+
+``read_results`` selects partitions from directory names before opening any
+file and loads only the requested columns, so a plot of one controller's
+average wait touches a single column of a single partition.
+"""
+import json
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import quote, unquote
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency; fall back to NumPy archives
+    pa = None
+    pq = None
+
+SCHEMA_FILE = '_schema.json'
+DEFAULT_PARTITION = 'default'
+
+# Column types of run_single_experiment rows; other columns are inferred
+RESULT_SCHEMA: Dict[str, str] = {
+    'controller': 'str',
+    'scenario': 'str',
+    'seed': 'int64',
+    'antithetic': 'bool',
+    'total_arrived': 'int32',
+    'total_departed': 'int32',
+    'avg_wait_time': 'float64',
+    'p95_wait_time': 'float64',
+    'max_queue_total': 'int32',
+    'throughput': 'float64',
+    'duration': 'float64',
+    'expected_arrivals': 'float64',
+    'warmup_time': 'float64',
+    'steady_avg_queue': 'float64',
+    'steady_avg_queue_hw': 'float64',
+    'steady_avg_wait_time': 'float64',
+    'steady_avg_wait_hw': 'float64',
+}
+
+
+def _infer_dtype(value) -> str:
+    """Schema type of a column from its first value."""
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int64'
+    if isinstance(value, (float, np.floating)):
+        return 'float64'
+    return 'str'
+
+
+def _column(values: list, dtype: str) -> np.ndarray:
+    if dtype == 'str':
+        return np.array([str(v) for v in values], dtype=str)
+    return np.asarray(values, dtype=dtype)
+
+
+class ResultsWriter:
+    """Appends result rows to a partitioned columnar dataset."""
+
+    def __init__(self,
+                 root: str,
+                 partition_by: Sequence[str] = ('controller', 'scenario'),
+                 batch_size: int = 256,
+                 format: str = None,
+                 overwrite: bool = False):
+        """
+        Initialize writer.
+
+        Args:
+            root: Dataset directory (created if missing)
+            partition_by: Columns whose values become directories; rows
+                missing one are filed under "default"
+            batch_size: Rows buffered per partition before a file is written
+            format: "parquet" or "npz" (defaults to parquet when pyarrow is installed)
+            overwrite: Delete an existing dataset at root instead of appending to it
+        """
+        if format is None:
+            format = 'parquet' if pq is not None else 'npz'
+        if format not in ('parquet', 'npz'):
+            raise ValueError(f"Unknown results format: {format}")
+        if format == 'parquet' and pq is None:
+            raise ImportError("Writing parquet requires pyarrow")
+        self.root = root
+        self.partition_by = tuple(partition_by)
+        self.batch_size = batch_size
+        self.format = format
+        self.schema = dict(RESULT_SCHEMA)
+        self._buffers: Dict[tuple, List[dict]] = defaultdict(list)
+        self._part_numbers: Dict[tuple, int] = defaultdict(int)
+        self._run_id = uuid.uuid4().hex[:8]
+        if overwrite and os.path.isdir(root):
+            shutil.rmtree(root)
+        os.makedirs(root, exist_ok=True)
+        schema_path = os.path.join(root, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            # Appending to an existing dataset keeps its column types
+            with open(schema_path) as f:
+                stored = json.load(f)
+            stored.pop('partition_by', None)
+            self.schema.update(stored)
+
+    def append(self, row: Dict[str, object]):
+        """Buffer one result row, flushing its partition when the batch is full."""
+        key = tuple(str(row.get(column, DEFAULT_PARTITION)) for column in self.partition_by)
+        buffer = self._buffers[key]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._flush_partition(key)
+
+    def extend(self, rows: Iterable[Dict[str, object]]):
+        """Buffer several result rows."""
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        """Write every buffered row."""
+        for key in list(self._buffers):
+            self._flush_partition(key)
+
+    def close(self):
+        """Flush remaining rows."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush_partition(self, key: tuple):
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        names = [name for name in dict.fromkeys(k for row in rows for k in row)
+                 if name not in self.partition_by]
+        schema_changed = False
+        for name in names:
+            if name not in self.schema:
+                first = next(row[name] for row in rows if name in row)
+                self.schema[name] = _infer_dtype(first)
+                schema_changed = True
+        if schema_changed or not os.path.exists(os.path.join(self.root, SCHEMA_FILE)):
+            self._write_schema()
+
+        columns = {}
+        for name in names:
+            dtype = self.schema[name]
+            missing = '' if dtype == 'str' else (False if dtype == 'bool' else np.nan)
+            if dtype.startswith('int') and any(name not in row for row in rows):
+                dtype = 'float64'  # Missing integers become NaN
+            columns[name] = _column([row.get(name, missing) for row in rows], dtype)
+
+        directory = os.path.join(self.root, *(
+            f'{column}={quote(value, safe="")}' for column, value in zip(self.partition_by, key)
+        ))
+        os.makedirs(directory, exist_ok=True)
+        part = self._part_numbers[key]
+        self._part_numbers[key] += 1
+        path = os.path.join(directory, f'part-{part:05d}-{self._run_id}.{self.format}')
+        tmp_path = f'{path}.tmp'
+        if self.format == 'parquet':
+            pq.write_table(pa.table(columns), tmp_path, compression='zstd')
+        else:
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **columns)
+        os.replace(tmp_path, path)
+
+    def _write_schema(self):
+        path = os.path.join(self.root, SCHEMA_FILE)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'partition_by': list(self.partition_by), **self.schema}, f, indent=1)
+        os.replace(f'{path}.tmp', path)
+
+
+def list_partitions(root: str) -> List[Dict[str, str]]:
+    """
+    Partition values present in a dataset, from directory names only.
+
+    Args:
+        root: Dataset directory
+
+    Returns:
+        One dict of column -> value per partition
+    """
+    partitions = []
+    for directory, subdirectories, files in os.walk(root):
+        if any(name.endswith(('.parquet', '.npz')) for name in files):
+            relative = os.path.relpath(directory, root)
+            parts = [] if relative == '.' else relative.split(os.sep)
+            partitions.append(dict(
+                (name, unquote(value)) for name, value in (part.split('=', 1) for part in parts)
+            ))
+        subdirectories.sort()
+    return partitions
+
+
+def _read_file(path: str, columns: Optional[List[str]]) -> Dict[str, np.ndarray]:
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError(f"Reading {path} requires pyarrow")
+        available = pq.read_schema(path).names
+        wanted = available if columns is None else [c for c in columns if c in available]
+        table = pq.read_table(path, columns=wanted)
+        return {name: table.column(name).to_numpy() for name in wanted}
+    with np.load(path, allow_pickle=False) as archive:
+        # Members are decompressed only when accessed
+        wanted = archive.files if columns is None else [c for c in columns if c in archive.files]
+        return {name: archive[name] for name in wanted}
+
+
+def read_results(root: str,
+                 columns: Sequence[str] = None,
+                 filters: Dict[str, object] = None) -> pd.DataFrame:
+    """
+    Load (part of) a results dataset.
+
+    Args:
+        root: Dataset directory
+        columns: Columns to load (None loads all); partition columns may be
+            requested and are filled from directory names
+        filters: Partition column -> value or list of accepted values;
+            non-matching partitions are never opened
+
+    Returns:
+        DataFrame with string columns as categoricals
+    """
+    schema = {}
+    schema_path = os.path.join(root, SCHEMA_FILE)
+    if os.path.exists(schema_path):
+        with open(schema_path) as f:
+            schema = json.load(f)
+        schema.pop('partition_by', None)
+    accepted = {
+        name: {str(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])}
+        for name, value in (filters or {}).items()
+    }
+
+    frames = []
+    for partition in list_partitions(root):
+        if any(partition.get(name) not in values for name, values in accepted.items()):
+            continue
+        directory = os.path.join(root, *(
+            f'{name}={quote(value, safe="")}' for name, value in partition.items()
+        ))
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(('.parquet', '.npz')):
+                continue
+            path = os.path.join(directory, filename)
+            data = _read_file(path, list(columns) if columns else None)
+            if data:
+                n_rows = len(next(iter(data.values())))
+            else:
+                # Only partition columns requested; count rows from any column
+                n_rows = len(next(iter(_read_file(path, None).values())))
+            for name, value in partition.items():
+                if columns is None or name in columns:
+                    data[name] = np.full(n_rows, value)
+            frames.append(pd.DataFrame(data))
+
+    if not frames:
+        names = list(columns) if columns else list(schema)
+        return pd.DataFrame({
+            name: pd.Series(dtype='object' if schema.get(name, 'str') == 'str' else schema[name])
+            for name in names
+        })
+    df = pd.concat(frames, ignore_index=True)
+    if columns:
+        df = df[[name for name in columns if name in df.columns]]
+    for name in df.columns:
+        if pd.api.types.is_string_dtype(df[name]):
+            df[name] = df[name].astype('category')
+    return df
@@ -0,0 +1,242 @@
+"""
+Cache of finished simulation runs, with background filling.
+
+A ``RunSpec`` names a run completely (controller and its parameters, arrival
+rates, duration, seed), so its result can be stored under a hash of the spec
+and served again without simulating. ``RunCache`` keeps results in memory and
+as small compressed NumPy archives on disk: the spec, the headline summary,
+the total queue per step and the wait histogram, which is everything the explorer
+plots (and what ``simulation.surrogate`` trains on).
+
+``BackgroundRunner`` answers requests from the cache and otherwise simulates
+them in a process pool; callers poll for results as they complete instead of
+blocking, so a UI stays responsive while variants are filled in.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from .models import Direction, WaitHistogram
+from .scenario import Scenario, ControllerConfig
+
+
+@dataclass(frozen=True)
+class RunSpec:
+    """Complete description of one simulation run."""
+    controller: str
+    params: tuple = ()  # Sorted (name, value) pairs
+    arrival_rates: tuple = ()  # (direction value, rate) pairs in Direction order
+    duration: float = 1800.0
+    seed: int = 0
+
+    @classmethod
+    def create(cls, controller: str, params: Dict[str, float], arrival_rates: Dict[Direction, float],
+               duration: float = 1800.0, seed: int = 0) -> 'RunSpec':
+        """Build a spec from dictionaries (values are rounded to keep keys stable)."""
+        return cls(
+            controller=controller,
+            params=tuple(sorted((k, round(float(v), 6)) for k, v in params.items())),
+            arrival_rates=tuple((d.value, round(float(arrival_rates.get(d, 0.0)), 6)) for d in Direction),
+            duration=float(duration),
+            seed=int(seed),
+        )
+
+    def key(self) -> str:
+        """Stable hash used as the cache file name."""
+        text = json.dumps([self.controller, self.params, self.arrival_rates, self.duration, self.seed])
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def rates(self) -> Dict[Direction, float]:
+        return {Direction(d): rate for d, rate in self.arrival_rates}
+
+    def scenario(self) -> Scenario:
+        """One-controller scenario of this run (simulator settings are the scenario defaults)."""
+        return Scenario(
+            name=f'run-{self.key()}',
+            arrival_rates=self.rates(),
+            controllers={self.controller: ControllerConfig(self.controller, dict(self.params))},
+            duration=self.duration,
+            seeds=[self.seed],
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        return {'controller': self.controller, 'params': dict(self.params),
+                'arrival_rates': dict(self.arrival_rates), 'duration': self.duration, 'seed': self.seed}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'RunSpec':
+        return cls.create(data['controller'], data['params'],
+                          {Direction(d): rate for d, rate in data['arrival_rates'].items()},
+                          data['duration'], data['seed'])
+
+
+@dataclass
+class RunResult:
+    """What the explorer needs from a finished run."""
+    spec: RunSpec
+    summary: Dict[str, float]
+    queue_totals: np.ndarray  # Total queued vehicles per step
+    wait_histogram: WaitHistogram
+    dt: float = 1.0
+    cached: bool = field(default=False, compare=False)
+
+
+def simulate(spec: RunSpec) -> RunResult:
+    """Run a spec (module-level so process pools can pickle it)."""
+    simulator = spec.scenario().build_simulator(spec.controller, seed=spec.seed)
+    simulator.run(spec.duration)
+    metrics = simulator.get_metrics()
+    return RunResult(
+        spec=spec,
+        summary=metrics.summary(spec.duration),
+        queue_totals=metrics.queue_array().sum(axis=1).astype(np.int32),
+        wait_histogram=metrics.wait_histogram,
+        dt=simulator.dt,
+    )
+
+
+class RunCache:
+    """Results by spec, in memory and in a directory of .npz files."""
+
+    def __init__(self, directory: Optional[str] = 'results/run_cache'):
+        """
+        Initialize cache.
+
+        Args:
+            directory: Where results persist between sessions (None keeps
+                them in memory only)
+        """
+        self.directory = directory
+        self._memory: Dict[str, RunResult] = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, spec: RunSpec) -> str:
+        return os.path.join(self.directory, f'{spec.key()}.npz')
+
+    def __contains__(self, spec: RunSpec) -> bool:
+        return spec.key() in self._memory or bool(self.directory) and os.path.exists(self._path(spec))
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def get(self, spec: RunSpec) -> Optional[RunResult]:
+        """Cached result of a spec, or None."""
+        result = self._memory.get(spec.key())
+        if result is not None or not self.directory:
+            return result
+        path = self._path(spec)
+        if not os.path.exists(path):
+            return None
+        result = self._load(path, spec)
+        self._memory[spec.key()] = result
+        return result
+
+    @staticmethod
+    def _load(path: str, spec: RunSpec = None) -> RunResult:
+        with np.load(path, allow_pickle=False) as archive:
+            if spec is None:
+                spec = RunSpec.from_dict(json.loads(str(archive['spec'])))
+            dt = float(archive['dt'])
+            return RunResult(
+                spec=spec,
+                summary=json.loads(str(archive['summary'])),
+                queue_totals=archive['queue_totals'],
+                wait_histogram=WaitHistogram(dt, archive['wait_counts'], float(archive['wait_total'])),
+                dt=dt,
+                cached=True,
+            )
+
+    def results(self) -> Iterator[RunResult]:
+        """Every cached result, e.g. as training data for simulation.surrogate."""
+        seen = set()
+        for key, result in list(self._memory.items()):
+            seen.add(key)
+            yield result
+        if not self.directory:
+            return
+        for name in sorted(os.listdir(self.directory)):
+            key, extension = os.path.splitext(name)
+            if extension != '.npz' or key in seen:
+                continue
+            yield self._load(os.path.join(self.directory, name))
+
+    def put(self, result: RunResult):
+        """Store a result (written atomically when the cache has a directory)."""
+        self._memory[result.spec.key()] = result
+        if not self.directory:
+            return
+        path = self._path(result.spec)
+        with open(f'{path}.tmp', 'wb') as f:
+            np.savez_compressed(
+                f,
+                spec=np.array(json.dumps(result.spec.to_dict())),
+                summary=np.array(json.dumps(result.summary)),
+                queue_totals=result.queue_totals,
+                wait_counts=np.asarray(result.wait_histogram.counts, dtype=np.int64),
+                wait_total=np.array(result.wait_histogram.total),
+                dt=np.array(result.dt),
+            )
+        os.replace(f'{path}.tmp', path)
+
+
+class BackgroundRunner:
+    """Serves specs from a cache, simulating misses in a process pool."""
+
+    def __init__(self, cache: RunCache, workers: int = None):
+        """
+        Initialize runner.
+
+        Args:
+            cache: Cache to read from and fill
+            workers: Worker processes (defaults to the CPU count)
+        """
+        self.cache = cache
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._pending: Dict[str, Future] = {}
+
+    @property
+    def pending(self) -> int:
+        """Specs submitted but not yet collected by poll()."""
+        return len(self._pending)
+
+    def request(self, spec: RunSpec) -> Optional[RunResult]:
+        """
+        Result of a spec if cached; otherwise schedule it and return None.
+        """
+        result = self.cache.get(spec)
+        if result is None and spec.key() not in self._pending:
+            self._pending[spec.key()] = self._pool.submit(simulate, spec)
+        return result
+
+    def prefetch(self, specs: Iterable[RunSpec]):
+        """Schedule every uncached spec."""
+        for spec in specs:
+            self.request(spec)
+
+    def poll(self) -> List[RunResult]:
+        """Collect (and cache) the runs that have finished, without waiting."""
+        finished = []
+        for key, future in list(self._pending.items()):
+            if future.done():
+                del self._pending[key]
+                result = future.result()
+                self.cache.put(result)
+                finished.append(result)
+        return finished
+
+    def shutdown(self):
+        """Cancel queued runs and stop the pool."""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
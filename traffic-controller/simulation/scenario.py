@@ -0,0 +1,257 @@
+"""
+Declarative scenario files.
+
+A scenario describes a complete experiment: demand, the controllers to
+compare and their parameters, simulator settings, duration and seeds. It is
+stored as JSON (always available), TOML (Python 3.11+ or ``tomli``) or YAML
+(when ``PyYAML`` is installed)::
+
+    {
+      "name": "asymmetric",
+      "title": "Asymmetric Traffic",
+      "arrival_rates": {"N": 0.4, "S": 0.3, "E": 0.2, "W": 0.15},
+      "controllers": {
+        "fixed": {"type": "fixed", "green_time": 20.0, "yellow_time": 3.0},
+        "adaptive": {"type": "adaptive", "min_green": 5.0, "max_green": 30.0}
+      },
+      "dt": 1.0,
+      "saturation_flow": 1.0,
+      "duration": 1800,
+      "seeds": 5
+    }
+
+``seeds`` is a count (seeds 0..n-1), a list of seeds, or
+``{"start": s, "count": n}``. An optional ``simulator`` table passes further
+keyword arguments to ``TrafficSimulator`` (e.g. ``storage_capacity``).
+
+Scenarios shipped with the project live in ``scenarios/`` and are loaded by
+name (``load_scenario('asymmetric')``); any other file is loaded by path.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List
+from .models import Direction, ArrivalProcess
+from .controllers import TrafficController, FixedTimerController, AdaptiveCountController
+from .simulator import TrafficSimulator
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:  # Optional dependency
+    yaml = None
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scenarios')
+SCENARIO_EXTENSIONS = ('.json', '.toml', '.yaml', '.yml')
+DEFAULT_SCENARIO = 'asymmetric'
+
+CONTROLLER_TYPES = {
+    'fixed': FixedTimerController,
+    'adaptive': AdaptiveCountController,
+}
+# Parameters that must be integers (values from sliders or YAML may be floats)
+_INTEGER_PARAMETERS = {'extension_threshold', 'max_skips'}
+
+
+def build_controller(controller_type: str, params: Dict[str, object] = None) -> TrafficController:
+    """
+    Create a controller from its type name and keyword parameters.
+
+    Args:
+        controller_type: Key of CONTROLLER_TYPES ("fixed" or "adaptive")
+        params: Constructor arguments
+
+    Raises:
+        ValueError: If the type is unknown
+    """
+    if controller_type not in CONTROLLER_TYPES:
+        raise ValueError(f"Unknown controller type: {controller_type!r} "
+                         f"(expected one of {', '.join(CONTROLLER_TYPES)})")
+    params = {
+        key: int(round(value)) if key in _INTEGER_PARAMETERS else value
+        for key, value in (params or {}).items()
+    }
+    return CONTROLLER_TYPES[controller_type](**params)
+
+
+def _parse_seeds(value) -> List[int]:
+    if isinstance(value, int):
+        return list(range(value))
+    if isinstance(value, dict):
+        start = int(value.get('start', 0))
+        return list(range(start, start + int(value['count'])))
+    return [int(seed) for seed in value]
+
+
+@dataclass
+class ControllerConfig:
+    """A controller type and its constructor parameters."""
+    type: str
+    params: Dict[str, object] = field(default_factory=dict)
+
+    def build(self) -> TrafficController:
+        return build_controller(self.type, self.params)
+
+
+@dataclass
+class Scenario:
+    """A complete, file-backed experiment description."""
+    name: str
+    arrival_rates: Dict[Direction, float]
+    controllers: Dict[str, ControllerConfig]
+    dt: float = 1.0
+    saturation_flow: float = 1.0
+    duration: float = 1800.0
+    seeds: List[int] = field(default_factory=lambda: list(range(5)))
+    title: str = ''
+    description: str = ''
+    simulator: Dict[str, object] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object], name: str = None) -> 'Scenario':
+        """
+        Build a scenario from parsed file contents.
+
+        Raises:
+            ValueError: On missing or unknown keys and unknown directions or
+                controller types
+        """
+        data = dict(data)
+        known = {'name', 'title', 'description', 'arrival_rates', 'controllers', 'dt',
+                 'saturation_flow', 'duration', 'seeds', 'simulator'}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown scenario keys: {', '.join(sorted(unknown))}")
+        for key in ('arrival_rates', 'controllers'):
+            if key not in data:
+                raise ValueError(f"Scenario is missing '{key}'")
+        try:
+            rates = {Direction(d): float(rate) for d, rate in data['arrival_rates'].items()}
+        except ValueError as e:
+            raise ValueError(f"Unknown direction in arrival_rates: {e}") from None
+        controllers = {}
+        for label, config in data['controllers'].items():
+            config = dict(config)
+            controller_type = config.pop('type', label)
+            if controller_type not in CONTROLLER_TYPES:
+                raise ValueError(f"Unknown controller type for '{label}': {controller_type!r}")
+            controllers[label] = ControllerConfig(controller_type, config)
+        name = data.get('name', name)
+        return cls(
+            name=name,
+            title=data.get('title', name),
+            description=data.get('description', ''),
+            arrival_rates=rates,
+            controllers=controllers,
+            dt=float(data.get('dt', 1.0)),
+            saturation_flow=float(data.get('saturation_flow', 1.0)),
+            duration=float(data.get('duration', 1800.0)),
+            seeds=_parse_seeds(data.get('seeds', 5)),
+            simulator=dict(data.get('simulator', {})),
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        """Plain representation (the inverse of from_dict)."""
+        return {
+            'name': self.name,
+            'title': self.title,
+            'description': self.description,
+            'arrival_rates': {d.value: rate for d, rate in self.arrival_rates.items()},
+            'controllers': {label: {'type': c.type, **c.params} for label, c in self.controllers.items()},
+            'dt': self.dt,
+            'saturation_flow': self.saturation_flow,
+            'duration': self.duration,
+            'seeds': list(self.seeds),
+            'simulator': dict(self.simulator),
+        }
+
+    def build_controller(self, label: str) -> TrafficController:
+        """Fresh controller of one configured label."""
+        return self.controllers[label].build()
+
+    def build_simulator(self, label: str, arrival_process: ArrivalProcess = None,
+                        seed: int = None) -> TrafficSimulator:
+        """
+        Simulator for one controller of the scenario.
+
+        Args:
+            label: Controller label
+            arrival_process: Arrival stream (e.g. a shared replay); defaults
+                to a fresh ArrivalProcess with the given seed
+            seed: Seed of the default arrival process
+        """
+        if arrival_process is None:
+            arrival_process = ArrivalProcess(self.arrival_rates, seed=seed)
+        return TrafficSimulator(
+            controller=self.build_controller(label),
+            arrival_process=arrival_process,
+            saturation_flow=self.saturation_flow,
+            dt=self.dt,
+            **self.simulator
+        )
+
+
+def _parse_file(path: str) -> Dict[str, object]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as f:
+            return json.load(f)
+    if extension == '.toml':
+        if tomllib is None:
+            raise ImportError(f"Reading {path} requires Python 3.11+ or tomli")
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ImportError(f"Reading {path} requires PyYAML")
+        with open(path) as f:
+            return yaml.safe_load(f)
+    raise ValueError(f"Unknown scenario file type: {path}")
+
+
+def scenario_path(name_or_path: str) -> str:
+    """
+    Resolve a scenario name (in SCENARIO_DIR) or file path.
+
+    Raises:
+        FileNotFoundError: If no matching file exists
+    """
+    if os.path.exists(name_or_path):
+        return name_or_path
+    for extension in SCENARIO_EXTENSIONS:
+        path = os.path.join(SCENARIO_DIR, name_or_path + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No scenario named or at {name_or_path!r} (looked in {SCENARIO_DIR})")
+
+
+def load_scenario(name_or_path: str = DEFAULT_SCENARIO) -> Scenario:
+    """
+    Load a scenario by name or path.
+
+    Args:
+        name_or_path: Name of a file in SCENARIO_DIR (without extension) or a path
+
+    Returns:
+        Scenario
+    """
+    path = scenario_path(name_or_path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return Scenario.from_dict(_parse_file(path), name=name)
+
+
+def list_scenarios() -> List[str]:
+    """Names of the scenarios in SCENARIO_DIR."""
+    if not os.path.isdir(SCENARIO_DIR):
+        return []
+    return sorted(
+        os.path.splitext(filename)[0] for filename in os.listdir(SCENARIO_DIR)
+        if filename.endswith(SCENARIO_EXTENSIONS)
+    )
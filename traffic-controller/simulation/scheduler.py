@@ -0,0 +1,305 @@
+"""
+Sequential replication scheduler for controller comparisons.
+
+Instead of a fixed number of seeds, replications are dispatched (optionally
+to a process pool) only until the comparison is statistically settled:
+
+- Every replication runs all surviving configurations on one shared arrival
+  stream (common random numbers), so comparisons use paired differences.
+- With an indifference zone, clearly inferior configurations are dropped
+  early by the Kim-Nelson fully sequential ranking-and-selection procedure.
+- The run stops once every surviving configuration's paired difference to
+  the current best meets the target half-width, or excludes zero when
+  stopping on significance, or when a single configuration remains.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .models import Direction, PresampledArrivalProcess
+from .controllers import TrafficController
+from .simulator import TrafficSimulator
+from .analysis import mean_confidence_interval
+
+if TYPE_CHECKING:
+    from .monitoring import ProgressMonitor
+
+
+def run_replication(configs: Dict[str, TrafficController],
+                    arrival_rates: Dict[Direction, float],
+                    seed: int,
+                    duration: float,
+                    metric: str,
+                    simulator_kwargs: Dict = None) -> Dict[str, float]:
+    """
+    Run one replication of several controllers on a shared arrival stream.
+
+    Args:
+        configs: Controllers to run, by configuration name
+        arrival_rates: Dictionary of arrival rates per direction
+        seed: Seed of the shared arrival stream
+        duration: Simulation duration (seconds)
+        metric: Key of SimulationMetrics.summary() to report
+        simulator_kwargs: Extra TrafficSimulator arguments
+
+    Returns:
+        Metric value per configuration name
+    """
+    simulator_kwargs = dict(simulator_kwargs or {})
+    dt = simulator_kwargs.get('dt', 1.0)
+    stream = PresampledArrivalProcess(arrival_rates, seed=seed, horizon=duration, dt=dt)
+    results = {}
+    for name, controller in configs.items():
+        simulator = TrafficSimulator(copy.deepcopy(controller), stream.replay(), **simulator_kwargs)
+        simulator.run(duration)
+        results[name] = simulator.get_metrics().summary(duration)[metric]
+    return results
+
+
+@dataclass
+class ComparisonResult:
+    """Outcome of a sequential controller comparison."""
+    best: str
+    survivors: List[str]
+    eliminated: Dict[str, int]  # Configuration -> replications seen when dropped
+    observations: Dict[str, List[float]]  # Metric per replication, per configuration
+    differences: Dict[str, Tuple[float, float]]  # Paired (mean, half-width) vs best
+    n_replications: int
+    stop_reason: str
+    means: Dict[str, float] = field(default_factory=dict)
+
+
+class SequentialComparison:
+    """Dispatches replications until a controller comparison is settled."""
+
+    def __init__(self,
+                 configs: Dict[str, TrafficController],
+                 arrival_rates: Dict[Direction, float],
+                 duration: float = 1800.0,
+                 metric: str = 'avg_wait_time',
+                 minimize: bool = True,
+                 target_half_width: float = None,
+                 relative: bool = False,
+                 stop_on_significance: bool = False,
+                 indifference_zone: float = None,
+                 alpha: float = 0.05,
+                 min_replications: int = 5,
+                 max_replications: int = 100,
+                 workers: int = 1,
+                 base_seed: int = 0,
+                 simulator_kwargs: Dict = None,
+                 on_replication: Callable[[int, List[str]], None] = None,
+                 monitor: 'ProgressMonitor' = None):
+        """
+        Initialize scheduler.
+
+        Args:
+            configs: Controllers to compare, by configuration name (at least two)
+            arrival_rates: Dictionary of arrival rates per direction
+            duration: Simulation duration per replication (seconds)
+            metric: Key of SimulationMetrics.summary() to compare
+            minimize: Whether smaller metric values are better
+            target_half_width: Stop when every paired difference to the best
+                has a confidence half-width at most this large
+            relative: Interpret target_half_width as a fraction of the best mean
+            stop_on_significance: Stop when every paired difference to the
+                best excludes zero
+            indifference_zone: Smallest difference worth detecting; enables
+                Kim-Nelson elimination of inferior configurations
+            alpha: 1 - confidence level (and error rate of the elimination)
+            min_replications: First-stage replications before any decision
+            max_replications: Hard limit on replications
+            workers: Worker processes (1 runs in this process)
+            base_seed: Seed of the first replication; later ones count up
+            simulator_kwargs: Extra TrafficSimulator arguments
+            on_replication: Called with (replications done, survivors) after
+                each replication is processed
+            monitor: ProgressMonitor tracking running and completed replications
+        """
+        if len(configs) < 2:
+            raise ValueError("A comparison needs at least two configurations")
+        if min_replications < 2:
+            raise ValueError("min_replications must be at least 2")
+        self.configs = dict(configs)
+        self.arrival_rates = arrival_rates
+        self.duration = duration
+        self.metric = metric
+        self.minimize = minimize
+        self.target_half_width = target_half_width
+        self.relative = relative
+        self.stop_on_significance = stop_on_significance
+        self.indifference_zone = indifference_zone
+        self.alpha = alpha
+        self.min_replications = min_replications
+        self.max_replications = max_replications
+        self.workers = max(1, workers)
+        self.base_seed = base_seed
+        self.simulator_kwargs = simulator_kwargs or {}
+        self.on_replication = on_replication
+        self.monitor = monitor
+        if monitor is not None and monitor.total_replications is None:
+            # Upper bound; the sequential rule usually stops earlier
+            monitor.total_replications = max_replications
+
+        self.survivors: List[str] = list(self.configs)
+        self.eliminated: Dict[str, int] = {}
+        self.observations: Dict[str, List[float]] = {name: [] for name in self.configs}
+        self.n_replications = 0
+        self._kn_variances: Optional[Dict[Tuple[str, str], float]] = None
+
+    # Decisions ---------------------------------------------------------
+
+    def _signed(self, name: str) -> np.ndarray:
+        """Observations oriented so that smaller is better."""
+        values = np.asarray(self.observations[name][:self.n_replications], dtype=float)
+        return values if self.minimize else -values
+
+    def _current_best(self) -> str:
+        return min(self.survivors, key=lambda name: self._signed(name).mean())
+
+    def _eliminate(self):
+        """Kim-Nelson screening of the surviving configurations."""
+        r = self.n_replications
+        delta = self.indifference_zone
+        if not delta or r < self.min_replications or len(self.survivors) < 2:
+            return
+        if self._kn_variances is None:
+            # First-stage variances of pairwise differences are fixed from here on
+            n0 = self.min_replications
+            k = len(self.configs)
+            self._h2 = (n0 - 1) * ((2 * self.alpha / (k - 1)) ** (-2.0 / (n0 - 1)) - 1)
+            self._kn_variances = {}
+            for i in self.configs:
+                for l in self.configs:
+                    if i != l:
+                        diff = (np.asarray(self.observations[i][:n0])
+                                - np.asarray(self.observations[l][:n0]))
+                        self._kn_variances[(i, l)] = float(diff.var(ddof=1))
+
+        means = {name: self._signed(name).mean() for name in self.survivors}
+        dropped = []
+        for i in self.survivors:
+            for l in self.survivors:
+                if i == l:
+                    continue
+                slack = max(0.0, delta / (2 * r) * (self._h2 * self._kn_variances[(i, l)] / delta ** 2 - r))
+                if means[i] > means[l] + slack:
+                    dropped.append(i)
+                    break
+        for name in dropped:
+            self.survivors.remove(name)
+            self.eliminated[name] = r
+
+    def differences(self) -> Dict[str, Tuple[float, float]]:
+        """Paired (mean, half-width) of each survivor minus the current best."""
+        best = self._current_best()
+        confidence = 1 - self.alpha
+        base = np.asarray(self.observations[best][:self.n_replications], dtype=float)
+        return {
+            name: mean_confidence_interval(
+                np.asarray(self.observations[name][:self.n_replications], dtype=float) - base,
+                confidence
+            )
+            for name in self.survivors if name != best
+        }
+
+    def _stop_reason(self) -> Optional[str]:
+        if len(self.survivors) == 1:
+            return 'single survivor'
+        if self.n_replications >= self.max_replications:
+            return 'max replications'
+        if self.n_replications < self.min_replications:
+            return None
+        differences = self.differences()
+        if self.target_half_width is not None:
+            target = self.target_half_width
+            if self.relative:
+                target *= abs(np.mean(self.observations[self._current_best()][:self.n_replications]))
+            if all(hw <= target for _, hw in differences.values()):
+                return 'precision'
+        if self.stop_on_significance:
+            if all(abs(mean) > hw for mean, hw in differences.values()):
+                return 'significance'
+        return None
+
+    # Dispatch ----------------------------------------------------------
+
+    def _record(self, results: Dict[str, float]) -> Optional[str]:
+        """Process the next replication in seed order."""
+        for name in self.survivors:
+            self.observations[name].append(results[name])
+        self.n_replications += 1
+        self._eliminate()
+        if self.on_replication is not None:
+            self.on_replication(self.n_replications, list(self.survivors))
+        return self._stop_reason()
+
+    def _job(self, index: int):
+        configs = {name: self.configs[name] for name in self.survivors}
+        return (configs, self.arrival_rates, self.base_seed + index,
+                self.duration, self.metric, self.simulator_kwargs)
+
+    def _job_steps(self, job) -> int:
+        """Simulation steps a job runs, across its configurations."""
+        dt = self.simulator_kwargs.get('dt', 1.0)
+        return len(job[0]) * int(self.duration / dt)
+
+    def run(self) -> ComparisonResult:
+        """
+        Dispatch replications until the comparison is settled.
+
+        Returns:
+            ComparisonResult
+        """
+        reason = None
+        monitor = self.monitor
+        if self.workers == 1:
+            while reason is None:
+                index = self.n_replications
+                job = self._job(index)
+                if monitor is not None:
+                    monitor.task_started(index)
+                results = run_replication(*job)
+                if monitor is not None:
+                    monitor.task_finished(index, self._job_steps(job))
+                reason = self._record(results)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                in_flight = {}
+                completed = {}
+                submitted = 0
+                while reason is None:
+                    while len(in_flight) < self.workers and submitted < self.max_replications:
+                        job = self._job(submitted)
+                        in_flight[pool.submit(run_replication, *job)] = (submitted, self._job_steps(job))
+                        if monitor is not None:
+                            monitor.task_started(submitted)
+                        submitted += 1
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, steps = in_flight.pop(future)
+                        completed[index] = future.result()
+                        if monitor is not None:
+                            monitor.task_finished(index, steps)
+                    # Replications are processed in seed order so decisions do
+                    # not depend on worker timing
+                    while reason is None and self.n_replications in completed:
+                        reason = self._record(completed.pop(self.n_replications))
+                for future, (index, _) in in_flight.items():
+                    future.cancel()
+                    if monitor is not None:
+                        monitor.task_finished(index, completed=False)
+
+        best = self._current_best()
+        return ComparisonResult(
+            best=best,
+            survivors=list(self.survivors),
+            eliminated=dict(self.eliminated),
+            observations={name: values[:self.n_replications] if name in self.survivors else values
+                          for name, values in self.observations.items()},
+            differences=self.differences(),
+            n_replications=self.n_replications,
+            stop_reason=reason,
+            means={name: float(np.mean(values)) for name, values in self.observations.items() if values}
+        )
@@ -0,0 +1,418 @@
+"""
+Real-time controller service driven by detector events.
+
+The controllers in ``simulation.controllers`` only read and update an
+``IntersectionState``, so the same objects can drive a real cabinet if that
+state is maintained from detectors instead of by the simulator:
+
+- ``DetectorEvent``s (advance-detector arrivals, stop-bar departures, or
+  absolute queue counts) are applied to an ``IntersectionAgent``'s state as
+  they arrive.
+- On every wall-clock tick the service calls each agent's controller with the
+  elapsed time as ``dt`` and emits a ``PhaseCommand`` whenever an
+  intersection's phase or signal state changes.
+
+One ``ControllerService`` serves any number of intersections from a single
+asyncio loop. Events come from a local ``asyncio.Queue`` (``submit`` /
+``submit_threadsafe``) or from TCP clients speaking newline-delimited JSON::
+
+    -> {"intersection": "main-1st", "type": "arrival", "direction": "N"}
+    -> {"intersection": "main-1st", "type": "queue", "direction": "E", "count": 7}
+    <- {"intersection": "main-1st", "time": 41.0, "phase": "EW", "state": "G", "directions": ["E", "W"]}
+
+Ticks are scheduled on fixed deadlines; the lateness of each tick and the
+time spent deciding are tracked in ``LatencyStats`` so the latency bound can
+be monitored. ``SimulatedDetectors`` is a stand-in roadway for testing: it
+feeds Poisson arrivals and discharges queues while its intersection is green.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+import numpy as np
+from .models import (
+    Direction, SignalState, Turn, Vehicle, IntersectionState, ArrivalProcess,
+    PhasePlan, LaneLayout, TWO_PHASE_PLAN, SINGLE_LANE_LAYOUT
+)
+from .controllers import TrafficController
+
+EVENT_TYPES = ('arrival', 'departure', 'queue')
+
+
+@dataclass
+class DetectorEvent:
+    """One detector report for an intersection approach."""
+    intersection: str
+    type: str  # "arrival", "departure" or "queue" (absolute count)
+    direction: Direction
+    count: int = 1
+    turn: Turn = Turn.THROUGH
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'DetectorEvent':
+        """
+        Parse a JSON message.
+
+        Raises:
+            ValueError: On unknown event types, directions or turns
+        """
+        if data.get('type') not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {data.get('type')!r}")
+        return cls(
+            intersection=str(data['intersection']),
+            type=data['type'],
+            direction=Direction(data['direction']),
+            count=int(data.get('count', 1)),
+            turn=Turn(data.get('turn', Turn.THROUGH.value)),
+        )
+
+
+@dataclass
+class PhaseCommand:
+    """Signal indication an intersection should show from `time` on."""
+    intersection: str
+    time: float  # Controller time (seconds since the service started)
+    phase: str
+    state: SignalState
+    directions: List[Direction]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'intersection': self.intersection,
+            'time': round(self.time, 3),
+            'phase': self.phase,
+            'state': self.state.value,
+            'directions': [d.value for d in self.directions],
+        }
+
+
+@dataclass
+class LatencyStats:
+    """Tick lateness and decision time, in wall-clock seconds."""
+    ticks: int = 0
+    overruns: int = 0  # Ticks whose lateness + decision time exceeded the bound
+    missed_ticks: int = 0  # Deadlines skipped because the loop fell a full tick behind
+    max_lateness: float = 0.0
+    max_decision: float = 0.0
+    _recent: deque = field(default_factory=lambda: deque(maxlen=1000), repr=False)
+
+    def record(self, lateness: float, decision: float, bound: float):
+        self.ticks += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.max_decision = max(self.max_decision, decision)
+        self._recent.append(lateness + decision)
+        if lateness + decision > bound:
+            self.overruns += 1
+
+    def percentile(self, q: float) -> float:
+        """Percentile of lateness + decision time over the last 1000 ticks."""
+        return float(np.percentile(self._recent, q)) if self._recent else 0.0
+
+
+class IntersectionAgent:
+    """Detector-maintained state and controller of one intersection."""
+
+    def __init__(self, name: str, controller: TrafficController,
+                 phase_plan: PhasePlan = None, lane_layout: LaneLayout = None):
+        """
+        Initialize agent.
+
+        Args:
+            name: Intersection identifier used in events and commands
+            controller: Controller deciding the signal
+            phase_plan: Signal phase plan (defaults to two-phase NS/EW)
+            lane_layout: Lane layout (defaults to one shared lane per approach)
+        """
+        self.name = name
+        self.controller = controller
+        self.state = IntersectionState(
+            phase_plan=phase_plan or TWO_PHASE_PLAN,
+            lane_layout=lane_layout or SINGLE_LANE_LAYOUT
+        )
+        self.time = 0.0
+        self.arrivals = 0
+        self.departures = 0
+        self.wait_times: deque = deque(maxlen=10_000)  # Recent detector-to-stop-bar waits
+
+    def apply(self, event: DetectorEvent, now: float):
+        """
+        Update the queues from a detector event.
+
+        Args:
+            event: Detector event for this intersection
+            now: Controller time the event was received at
+        """
+        if event.type == 'arrival':
+            for _ in range(event.count):
+                self.state.add_vehicle(Vehicle(arrival_time=now, direction=event.direction,
+                                               turn=event.turn))
+            self.arrivals += event.count
+        elif event.type == 'departure':
+            for _ in range(event.count):
+                self._depart(event.direction, now)
+        else:
+            # Absolute count from a queue detector: pad or trim to match
+            difference = event.count - self.state.get_queue_length(event.direction)
+            for _ in range(difference):
+                self.state.add_vehicle(Vehicle(arrival_time=now, direction=event.direction))
+            for _ in range(-difference):
+                self._depart(event.direction, None)
+
+    def _depart(self, direction: Direction, now: Optional[float]):
+        """Remove the longest-waiting vehicle of an approach (now=None: not a real departure)."""
+        queues = self.state.lane_queues
+        lanes = [i for i in self.state.lane_layout.lanes_by_direction[direction] if queues[i]]
+        if not lanes:
+            return  # Missed arrival detection; nothing to remove
+        arrival_times = self.state.vehicles.arrival_time
+        vehicle = self.state.pop_vehicle(min(lanes, key=lambda i: arrival_times[queues[i][0]]))
+        if now is not None:
+            self.departures += 1
+            self.wait_times.append(now - vehicle.arrival_time)
+
+    def tick(self, now: float) -> Optional[PhaseCommand]:
+        """
+        Run the controller up to controller time `now`.
+
+        Returns:
+            PhaseCommand if the phase or signal state changed, else None
+        """
+        dt = now - self.time
+        if dt <= 0:
+            return None
+        state = self.state
+        previous = (state.active_phase, state.signal_state)
+        phase, signal_state = self.controller.decide_signal(state, self.time, dt)
+        state.active_phase = phase
+        state.signal_state = signal_state
+        self.time = now
+        if (phase, signal_state) == previous:
+            return None
+        return self.command()
+
+    def command(self) -> PhaseCommand:
+        """Command for the current indication."""
+        state = self.state
+        return PhaseCommand(self.name, self.time, state.active_phase.name, state.signal_state,
+                            list(state.get_phase_directions(state.active_phase)))
+
+
+class ControllerService:
+    """Runs controllers for many intersections on a wall-clock tick."""
+
+    def __init__(self, tick: float = 1.0, latency_bound: float = None, time_scale: float = 1.0):
+        """
+        Initialize service.
+
+        Args:
+            tick: Wall-clock seconds between controller decisions
+            latency_bound: Allowed lateness + decision time per tick
+                (defaults to a tenth of the tick); exceeding it counts an overrun
+            time_scale: Controller seconds per wall-clock second (above 1
+                replays faster than real time, e.g. with SimulatedDetectors)
+        """
+        self.tick = tick
+        self.latency_bound = tick / 10 if latency_bound is None else latency_bound
+        self.time_scale = time_scale
+        self.agents: Dict[str, IntersectionAgent] = {}
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.latency = LatencyStats()
+        self.rejected_events = 0
+        self._listeners: List[Callable[[PhaseCommand], None]] = []
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started: float = None
+        self._stopping: asyncio.Event = None
+
+    def add_intersection(self, name: str, controller: TrafficController, **kwargs) -> IntersectionAgent:
+        """Serve an intersection (kwargs as in IntersectionAgent)."""
+        agent = IntersectionAgent(name, controller, **kwargs)
+        self.agents[name] = agent
+        return agent
+
+    def add_listener(self, listener: Callable[[PhaseCommand], None]):
+        """Call listener(command) for every emitted command."""
+        self._listeners.append(listener)
+
+    @property
+    def now(self) -> float:
+        """Controller time: scaled wall-clock seconds since run() started."""
+        if self._started is None:
+            return 0.0
+        return (time.monotonic() - self._started) * self.time_scale
+
+    # Ingestion ---------------------------------------------------------
+
+    def submit(self, event: DetectorEvent):
+        """Queue an event from code running in the service's loop."""
+        self.events.put_nowait(event)
+
+    def submit_threadsafe(self, event: DetectorEvent):
+        """Queue an event from another thread (e.g. a detector driver)."""
+        self._loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def _apply(self, event: DetectorEvent):
+        agent = self.agents.get(event.intersection)
+        if agent is None:
+            self.rejected_events += 1
+            return
+        agent.apply(event, self.now)
+
+    async def _consume(self):
+        while True:
+            event = await self.events.get()
+            self._apply(event)
+            # Apply any backlog without yielding per event
+            while not self.events.empty():
+                self._apply(self.events.get_nowait())
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        # New feeds first learn the current indication of every intersection
+        for agent in self.agents.values():
+            writer.write((json.dumps(agent.command().to_dict()) + "\n").encode())
+        try:
+            while line := await reader.readline():
+                try:
+                    self._apply(DetectorEvent.from_dict(json.loads(line)))
+                except (ValueError, KeyError) as e:
+                    self.rejected_events += 1
+                    writer.write((json.dumps({'error': str(e)}) + "\n").encode())
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # Client went away, or the loop is shutting down
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve_tcp(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """
+        Accept detector feeds over TCP (JSON lines); commands are broadcast back.
+
+        Returns:
+            The asyncio server (its sockets give the bound port)
+        """
+        return await asyncio.start_server(self._handle_client, host, port)
+
+    # Control loop ------------------------------------------------------
+
+    def _emit(self, command: PhaseCommand):
+        for listener in self._listeners:
+            listener(command)
+        if self._writers:
+            data = (json.dumps(command.to_dict()) + "\n").encode()
+            for writer in list(self._writers):
+                writer.write(data)
+
+    async def run(self, duration: float = None):
+        """
+        Tick every intersection until stop() is called or duration elapses.
+
+        Args:
+            duration: Controller seconds to run for (None runs until stopped)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._started = time.monotonic()
+        for agent in self.agents.values():
+            agent.time = 0.0
+            self._emit(agent.command())
+        consumer = asyncio.create_task(self._consume())
+        deadline = self._started
+        try:
+            while not self._stopping.is_set():
+                deadline += self.tick
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), delay)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                woke = time.monotonic()
+                lateness = woke - deadline
+                if lateness > self.tick:
+                    # Fell behind by whole ticks: skip them rather than burst
+                    missed = int(lateness // self.tick)
+                    self.latency.missed_ticks += missed
+                    deadline += missed * self.tick
+                now = self.now
+                for agent in self.agents.values():
+                    command = agent.tick(now)
+                    if command is not None:
+                        self._emit(command)
+                self.latency.record(max(0.0, lateness), time.monotonic() - woke, self.latency_bound)
+                if duration is not None and now >= duration:
+                    break
+        finally:
+            consumer.cancel()
+
+    def stop(self):
+        """Stop run() after the current tick."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+
+class SimulatedDetectors:
+    """Stand-in roadway feeding a service with detector events for one intersection."""
+
+    def __init__(self, service: ControllerService, intersection: str,
+                 arrival_rates: Dict[Direction, float], saturation_flow: float = 1.0,
+                 seed: int = None, interval: float = None):
+        """
+        Initialize detectors (start with start()).
+
+        Args:
+            service: Service to feed
+            intersection: Intersection name
+            arrival_rates: Poisson arrival rates per direction (vehicles per controller second)
+            saturation_flow: Departures per controller second per green approach
+            seed: Random seed
+            interval: Wall-clock seconds between reports (defaults to the service tick)
+        """
+        self.service = service
+        self.intersection = intersection
+        self.arrivals = ArrivalProcess(arrival_rates, seed=seed)
+        self.saturation_flow = saturation_flow
+        self.interval = interval or service.tick
+        self.queues = {d: 0 for d in Direction}
+        self.green: Set[Direction] = set()
+        self._credit = {d: 0.0 for d in Direction}
+        self._task: Optional[asyncio.Task] = None
+        service.add_listener(self._on_command)
+
+    def _on_command(self, command: PhaseCommand):
+        if command.intersection == self.intersection:
+            self.green = set(command.directions) if command.state == SignalState.GREEN else set()
+
+    async def _run(self):
+        last = self.service.now
+        while True:
+            await asyncio.sleep(self.interval)
+            now = self.service.now
+            dt = now - last
+            last = now
+            for vehicle in self.arrivals.generate_arrivals(now, dt):
+                self.queues[vehicle.direction] += 1
+                self.service.submit(DetectorEvent(self.intersection, 'arrival', vehicle.direction))
+            for direction in Direction:
+                if direction not in self.green:
+                    self._credit[direction] = 0.0
+                    continue
+                self._credit[direction] += self.saturation_flow * dt
+                n = min(int(self._credit[direction]), self.queues[direction])
+                self._credit[direction] -= int(self._credit[direction])
+                if n:
+                    self.queues[direction] -= n
+                    self.service.submit(DetectorEvent(self.intersection, 'departure', direction, count=n))
+
+    def start(self) -> 'SimulatedDetectors':
+        """Start feeding events (call from within the running loop)."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
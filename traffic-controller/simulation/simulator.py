@@ -2,11 +2,44 @@
 Traffic signal simulation engine.
 """
 from .models import (
-    IntersectionState, ArrivalProcess, SimulationMetrics,
-    Direction, SignalState, Vehicle
+    IntersectionState, ArrivalProcess, SimulationMetrics, WaitHistogram,
+    Direction, SignalState, Phase, PhasePlan, TWO_PHASE_PLAN,
+    LaneLayout, SINGLE_LANE_LAYOUT, DIRECTIONS, RED, PROTECTED, PERMISSIVE
 )
 from .controllers import TrafficController
+from .checkpoint import encode_checkpoint, decode_checkpoint, CheckpointWriter
+from .analysis import SteadyStateEstimator, SteadyStateEstimate
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 import copy
+import numpy as np
+
+if TYPE_CHECKING:  # Imported for annotations only; keeps the engine import light
+    from .monitoring import ProgressMonitor
+    from .trajectory import TrajectoryWriter
+    from .clock import Clock
+
+
+def _storage_capacities(storage_capacity) -> Optional[Dict[Direction, Optional[int]]]:
+    """Validate a storage_capacity argument into a capacity (or None) per Direction."""
+    if storage_capacity is None:
+        return None
+    if not isinstance(storage_capacity, dict):
+        storage_capacity = {d: storage_capacity for d in Direction}
+    capacities = {}
+    for key, value in storage_capacity.items():
+        try:
+            direction = Direction(key)
+        except ValueError:
+            raise ValueError(f"Unknown approach in storage_capacity: {key!r}") from None
+        if value is not None:
+            value = int(value)
+            if value < 0:
+                raise ValueError(f"Negative storage capacity for approach {direction.value}: {value}")
+        capacities[direction] = value
+    missing = [d.value for d in Direction if d not in capacities]
+    if missing:
+        raise ValueError(f"storage_capacity is missing approaches {missing} (use None for unbounded)")
+    return capacities
 
 
 class TrafficSimulator:
@@ -16,61 +49,156 @@ class TrafficSimulator:
                  controller: TrafficController,
                  arrival_process: ArrivalProcess,
                  saturation_flow: float = 1.0,
-                 dt: float = 1.0):
+                 dt: float = 1.0,
+                 phase_plan: PhasePlan = None,
+                 lane_layout: LaneLayout = None,
+                 lost_time: float = 0.0,
+                 critical_gap: float = 4.5,
+                 follow_up_time: float = 2.5,
+                 storage_capacity: Union[int, Dict[Direction, int]] = None,
+                 spillback_policy: str = "hold",
+                 keep_wait_times: bool = False):
         """
         Initialize simulator.
         
         Args:
             controller: Traffic signal controller
             arrival_process: Vehicle arrival process
-            saturation_flow: Vehicles that can depart per second during green (per direction)
+            saturation_flow: Vehicles that can depart per second during green
+                (per lane, unless the lane sets its own)
             dt: Time step duration (seconds)
+            phase_plan: Signal phase plan (defaults to two-phase NS/EW)
+            lane_layout: Lane layout (defaults to one shared lane per approach)
+            lost_time: Start-up lost time at the beginning of each green (seconds)
+            critical_gap: Gap in opposing flow accepted by permissive left turns (seconds)
+            follow_up_time: Headway between consecutive permissive left turns (seconds)
+            storage_capacity: Max vehicles queued per approach, as one value or
+                a dict covering every approach (keys are Directions or their
+                values, e.g. "N"; a None value leaves that approach unbounded).
+                None leaves all approaches unbounded
+            spillback_policy: What happens to arrivals at a full approach:
+                "hold" keeps them upstream until space frees, "block" turns them away
+            keep_wait_times: Also keep every departure's wait in
+                metrics.wait_times (O(vehicles) memory); the wait histogram
+                and streaming estimators cover the built-in analyses
+        
+        Raises:
+            ValueError: On an unknown spillback policy, or a storage capacity
+                that is negative or names unknown or misses approaches
         """
+        if spillback_policy not in ("hold", "block"):
+            raise ValueError(f"Unknown spillback policy: {spillback_policy}")
         self.controller = controller
         self.arrival_process = arrival_process
         self.saturation_flow = saturation_flow
         self.dt = dt
-        self.state = IntersectionState()
-        self.metrics = SimulationMetrics()
+        self.phase_plan = phase_plan or TWO_PHASE_PLAN
+        self.lane_layout = lane_layout or SINGLE_LANE_LAYOUT
+        self.lost_time = lost_time
+        self.critical_gap = critical_gap
+        self.follow_up_time = follow_up_time
+        self.storage_capacity = _storage_capacities(storage_capacity)
+        self.spillback_policy = spillback_policy
+        self.keep_wait_times = keep_wait_times
+        
+        # Per-lane tables used by the vectorized discharge
+        self.lane_saturation_flows = self.lane_layout.saturation_flows(saturation_flow)
+        self._release = self.lane_layout.release_table(self.phase_plan)
+        self._lane_capacity = self.lane_saturation_flows * dt
+        self._lane_ids = np.arange(self.lane_layout.n_lanes)
+        # Per-lane departures of the most recent discharge
+        self.last_departures = np.zeros(self.lane_layout.n_lanes, dtype=np.int64)
+        self._phase_lanes = self.lane_layout.phase_lanes(self.phase_plan)
+        
+        self.state = self._new_state()
+        self.metrics = self._new_metrics()
         self.current_time = 0.0
+        # Optional streaming output analysis, keyed by series ("queue" or "wait")
+        self.estimators: Dict[str, SteadyStateEstimator] = {}
+        self._checkpoint_writer: Optional[CheckpointWriter] = None
+        # Attached StepProfiler, if any (see simulation.profiling)
+        self.profiler = None
+    
+    def _new_state(self) -> IntersectionState:
+        """Create an empty intersection for this simulator's plan and layout."""
+        return IntersectionState(
+            phase_plan=self.phase_plan,
+            lane_layout=self.lane_layout,
+            storage_capacity=self.storage_capacity
+        )
+    
+    def _new_metrics(self) -> SimulationMetrics:
+        """Create empty metrics with histograms at this simulator's resolution and per-phase accumulators."""
+        n_phases = self.phase_plan.n_phases
+        return SimulationMetrics(
+            wait_times=[] if self.keep_wait_times else None,
+            wait_histogram=WaitHistogram(self.dt),
+            direction_waits={d: WaitHistogram(self.dt) for d in Direction},
+            phase_green_time=np.zeros(n_phases),
+            phase_wasted_green=np.zeros(n_phases),
+            phase_departures=np.zeros(n_phases, dtype=np.int64)
+        )
     
     def reset(self):
         """Reset simulation to initial state."""
-        self.state = IntersectionState()
-        self.metrics = SimulationMetrics()
+        self.state = self._new_state()
+        self.metrics = self._new_metrics()
         self.current_time = 0.0
+        for name, estimator in self.estimators.items():
+            self.estimators[name] = SteadyStateEstimator(
+                estimator.n_batches, estimator.confidence, estimator.group_size
+            )
     
     def step(self):
         """Execute one simulation time step."""
-        # 1. Generate new arrivals
-        new_arrivals = self.arrival_process.generate_arrivals(self.current_time, self.dt)
-        for vehicle in new_arrivals:
-            self.state.queues[vehicle.direction].append(vehicle)
-            self.metrics.total_vehicles_arrived += 1
-        
-        # 2. Update signal state using controller
+        self.step_arrivals()
         new_phase, new_signal_state = self.controller.decide_signal(
             self.state, self.current_time, self.dt
         )
+        self.complete_step(new_phase, new_signal_state)
+    
+    def step_arrivals(self):
+        """
+        First half of a step: queue this step's arrivals.
+        
+        Together with complete_step this lets a caller decide the signal
+        itself, e.g. for many intersections at once (see simulation.lockstep).
+        """
+        directions, turns = self.arrival_process.sample_arrivals(self.current_time, self.dt)
+        if self.storage_capacity is None:
+            enqueue = self.state.enqueue
+            for direction, turn in zip(directions, turns):
+                enqueue(self.current_time, direction, turn)
+            self.metrics.total_vehicles_arrived += len(directions)
+        else:
+            self._admit_arrivals(directions, turns)
+    
+    def complete_step(self, new_phase: Phase, new_signal_state: SignalState):
+        """
+        Second half of a step: apply the signal decision, discharge and record.
+        
+        Args:
+            new_phase: Phase decided for this step
+            new_signal_state: Signal state decided for this step
+        """
         self.state.active_phase = new_phase
         self.state.signal_state = new_signal_state
+        if new_signal_state == SignalState.GREEN:
+            self._record_green()
         
-        # 3. Process departures (only during green)
-        if self.state.signal_state == SignalState.GREEN:
-            green_directions = self.state.get_phase_directions(self.state.active_phase)
-            for direction in green_directions:
-                queue = self.state.queues[direction]
-                if queue:
-                    # Saturation flow: depart up to saturation_flow * dt vehicles
-                    n_departures = min(len(queue), int(self.saturation_flow * self.dt))
-                    for _ in range(n_departures):
-                        vehicle = queue.pop(0)
-                        vehicle.departure_time = self.current_time
-                        self.metrics.record_departure(vehicle, self.current_time)
-        
-        # 4. Record metrics
-        for direction in Direction:
-            queue_len = self.state.get_queue_length(direction)
+        # Process departures (only during green, after start-up lost time)
+        if self.state.signal_state == SignalState.GREEN and self.state.phase_timer >= self.lost_time:
+            self._discharge()
+        else:
+            self.state.discharge_credit.fill(0.0)
+        
+        self._record_metrics()
+        self.current_time += self.dt
+    
+    def _record_metrics(self):
+        """Record queue, fairness and phase metrics for the current step."""
+        queue_snapshot = self.state.get_queue_lengths()
+        for direction, queue_len in queue_snapshot.items():
             self.metrics.max_queue_length[direction] = max(
                 self.metrics.max_queue_length[direction],
                 queue_len
@@ -80,9 +208,14 @@ class TrafficSimulator:
                 self.state.consecutive_skips[direction]
             )
         
+        if self.storage_capacity is not None:
+            self._record_spillback()
+        
         # Record queue snapshot
-        queue_snapshot = {d: self.state.get_queue_length(d) for d in Direction}
         self.metrics.queue_history.append(queue_snapshot)
+        queue_estimator = self.estimators.get('queue')
+        if queue_estimator is not None:
+            queue_estimator.add(sum(queue_snapshot.values()))
         
         # Record phase/state
         self.metrics.phase_history.append((
@@ -90,21 +223,300 @@ class TrafficSimulator:
             self.state.active_phase.value,
             self.state.signal_state.value
         ))
+    
+    def _record_green(self):
+        """Accumulate green time, and wasted green when the phase has no vehicle to serve."""
+        index = self.phase_plan.index_of(self.state.active_phase)
+        metrics = self.metrics
+        metrics.phase_green_time[index] += self.dt
+        queues = self.state.lane_queues
+        if not any(queues[lane] for lane in self._phase_lanes[index]):
+            metrics.phase_wasted_green[index] += self.dt
+    
+    def _admit_arrivals(self, directions: List[int], turns: List[int]):
+        """Queue arrivals (DIRECTION_INDEX and TURN_INDEX values) on approaches with finite storage."""
+        state = self.state
+        metrics = self.metrics
         
-        # 5. Advance time
-        self.current_time += self.dt
+        # Vehicles already held upstream move up first, keeping FIFO order
+        if self.spillback_policy == "hold":
+            for direction in Direction:
+                state.release_overflow(direction)
+        
+        for index, turn in zip(directions, turns):
+            metrics.total_vehicles_arrived += 1
+            direction = DIRECTIONS[index]
+            if state.has_storage(direction) and not state.get_overflow(direction):
+                state.enqueue(self.current_time, index, turn)
+            elif self.spillback_policy == "hold":
+                state.overflow[direction].push(self.current_time, turn)
+                metrics.total_vehicles_held += 1
+            else:
+                metrics.total_vehicles_blocked += 1
+    
+    def _record_spillback(self):
+        """Accumulate blocked time and spillback events per approach."""
+        state = self.state
+        metrics = self.metrics
+        for direction in Direction:
+            full = not state.has_storage(direction)
+            if full:
+                metrics.blocked_time[direction] += self.dt
+                if not state.spillback[direction]:
+                    metrics.spillback_count[direction] += 1
+            state.spillback[direction] = full
+            metrics.max_overflow[direction] = max(
+                metrics.max_overflow[direction],
+                state.get_overflow(direction)
+            )
     
-    def run(self, duration: float):
+    def _discharge(self):
+        """
+        Discharge every lane at once from per-lane arrays.
+        
+        Each lane accrues departure credit at its saturation flow while the
+        movement of its head vehicle is released; permissive movements accrue
+        at the gap-acceptance capacity left by the opposing flow. Whole units
+        of credit become departures.
+        """
+        state = self.state
+        queues = state.lane_queues
+        credit = state.discharge_credit
+        phase_index = self.phase_plan.index_of(state.active_phase)
+        release = self._release[phase_index]
+        
+        lengths = state.get_lane_lengths()
+        heads = [q.peek() if q else 0 for q in queues]  # Handles (any for empty lanes, masked below)
+        head_turns = state.vehicles.turn[heads]
+        status = release[self._lane_ids, head_turns] * (lengths > 0)
+        
+        # Protected movements discharge at saturation flow
+        protected = status == PROTECTED
+        credit += self._lane_capacity * protected
+        departures = np.minimum(lengths, credit.astype(np.int64)) * protected
+        self._pop_departures(departures, release, PROTECTED)
+        
+        # Permissive movements discharge through gaps in opposing departures
+        permissive = status == PERMISSIVE
+        if permissive.any():
+            by_direction = np.bincount(self.lane_layout.lane_direction_index,
+                                       weights=departures, minlength=len(Direction))
+            opposing_flow = by_direction[self.lane_layout.lane_opposing_index] / self.dt
+            capacity = np.full(len(queues), 1.0 / self.follow_up_time)
+            np.divide(opposing_flow * np.exp(-opposing_flow * self.critical_gap),
+                      1.0 - np.exp(-opposing_flow * self.follow_up_time),
+                      out=capacity, where=opposing_flow > 0)
+            capacity = np.minimum(capacity, self.lane_saturation_flows)
+            credit[permissive] += capacity[permissive] * self.dt
+            permissive_departures = np.minimum(lengths, credit.astype(np.int64)) * permissive
+            self._pop_departures(permissive_departures, release, PERMISSIVE)
+            departures += permissive_departures
+        
+        # Unused credit does not carry over once a lane empties or is stopped
+        credit -= departures
+        credit[(lengths == departures) | (status == RED)] = 0.0
+        self.last_departures = departures
+        self.metrics.phase_departures[phase_index] += departures.sum()
+    
+    def _pop_departures(self, departures: np.ndarray, release: np.ndarray, status: int):
+        """
+        Remove departing vehicles from the lanes and record them.
+        
+        A lane stops early if a following vehicle's movement is not released
+        with the given status, so the recorded count is written back.
+        """
+        queues = self.state.lane_queues
+        store = self.state.vehicles
+        turns = store.turn
+        arrival_times = store.arrival_time
+        lanes = self.lane_layout.lanes
+        record_wait = self.metrics.record_wait
+        wait_estimator = self.estimators.get('wait')
+        for lane in np.flatnonzero(departures):
+            queue = queues[lane]
+            lane_release = release[lane]
+            direction = lanes[lane].direction
+            n = 0
+            for _ in range(departures[lane]):
+                handle = queue.peek()
+                if lane_release[turns[handle]] != status:
+                    break
+                queue.popleft()
+                wait = self.current_time - arrival_times.item(handle)
+                store.release(handle, self.current_time)
+                record_wait(wait, direction)
+                if wait_estimator is not None:
+                    wait_estimator.add(wait)
+                n += 1
+            departures[lane] = n
+    
+    def run(self, duration: float,
+            reset: bool = True,
+            checkpoint_path: str = None,
+            checkpoint_every: float = None,
+            monitor: 'ProgressMonitor' = None,
+            trajectory: 'TrajectoryWriter' = None,
+            clock: 'Clock' = None):
         """
         Run simulation for specified duration.
         
         Args:
             duration: Simulation duration (seconds)
+            reset: Start from an empty intersection; pass False to continue
+                from the current (e.g. restored) state
+            checkpoint_path: File to checkpoint to while running (histories
+                are written incrementally, see CheckpointWriter)
+            checkpoint_every: Simulated seconds between checkpoints
+                (defaults to once at the end when checkpoint_path is set)
+            monitor: ProgressMonitor to report steps and queues to
+                (see simulation.monitoring)
+            trajectory: TrajectoryWriter recording every step (see
+                simulation.trajectory); flushed when the run ends
+            clock: Clock pacing the steps against wall time, e.g.
+                RealTimeClock(speed=100) (see simulation.clock); by default
+                steps run as fast as possible
         """
-        self.reset()
-        n_steps = int(duration / self.dt)
-        for _ in range(n_steps):
+        if reset:
+            self.reset()
+        self._run_steps(int(duration / self.dt), checkpoint_path, checkpoint_every, monitor, trajectory, clock)
+    
+    def _run_steps(self, n_steps: int,
+                   checkpoint_path: str = None,
+                   checkpoint_every: float = None,
+                   monitor: 'ProgressMonitor' = None,
+                   trajectory: 'TrajectoryWriter' = None,
+                   clock: 'Clock' = None):
+        """Continue for a number of steps (arguments as in run)."""
+        steps_per_checkpoint = None
+        if checkpoint_path and checkpoint_every:
+            steps_per_checkpoint = max(1, int(checkpoint_every / self.dt))
+        steps_per_report = monitor.report_every if monitor is not None else None
+        if clock is not None:
+            clock.start(self.current_time)
+        for i in range(n_steps):
             self.step()
+            if clock is not None:
+                clock.wait_until(self.current_time)
+            if trajectory is not None:
+                trajectory.record(self)
+            if steps_per_checkpoint and (i + 1) % steps_per_checkpoint == 0:
+                self.write_checkpoint(checkpoint_path)
+            if steps_per_report and (i + 1) % steps_per_report == 0:
+                monitor.record_progress(self, steps_per_report)
+        if checkpoint_path:
+            self.write_checkpoint(checkpoint_path)
+        if trajectory is not None:
+            trajectory.flush()
+        if monitor is not None:
+            monitor.record_progress(self, n_steps % steps_per_report)
+    
+    def run_until_precision(self,
+                            half_width: float,
+                            metric: str = "wait",
+                            relative: bool = True,
+                            confidence: float = 0.95,
+                            min_duration: float = 600.0,
+                            max_duration: float = 86400.0,
+                            check_every: float = 300.0,
+                            reset: bool = True,
+                            checkpoint_path: str = None,
+                            monitor: 'ProgressMonitor' = None,
+                            trajectory: 'TrajectoryWriter' = None) -> SteadyStateEstimate:
+        """
+        Run until the steady-state confidence interval is tight enough.
+        
+        The warm-up transient is removed with MSER-5 and the interval comes
+        from batch means, both updated from observations streamed during the
+        run. The run stops at the first check where the target is met.
+        
+        Args:
+            half_width: Target confidence interval half-width
+            metric: Output series, "wait" (per vehicle) or "queue" (total per step)
+            relative: Interpret half_width as a fraction of the mean
+            confidence: Confidence level of the interval
+            min_duration: Never stop before this much simulated time (seconds)
+            max_duration: Stop here even if the target is not met (seconds)
+            check_every: Simulated seconds between stopping checks
+            reset: Start a new run; pass False to resume one restored with
+                load_checkpoint, keeping its estimator
+            checkpoint_path: File to checkpoint to at every check
+            monitor: ProgressMonitor to report progress to (as in run)
+            trajectory: TrajectoryWriter recording every step (as in run)
+            
+        Returns:
+            Final SteadyStateEstimate for the metric
+        """
+        if metric not in ("wait", "queue"):
+            raise ValueError(f"Unknown metric: {metric}")
+        if reset or metric not in self.estimators:
+            self.estimators = {metric: SteadyStateEstimator(confidence=confidence)}
+            self.reset()
+        estimator = self.estimators[metric]
+        
+        # Count in whole steps: accumulated float time can stop short of max_duration
+        steps_done = int(round(self.current_time / self.dt))
+        max_steps = int(round(max_duration / self.dt))
+        steps_per_check = max(1, int(round(check_every / self.dt)))
+        while steps_done < max_steps:
+            chunk = min(steps_per_check, max_steps - steps_done)
+            self._run_steps(chunk, checkpoint_path, monitor=monitor, trajectory=trajectory)
+            steps_done += chunk
+            if self.current_time < min_duration:
+                continue
+            estimate = estimator.estimate()
+            achieved = estimate.relative_half_width if relative else estimate.half_width
+            if achieved <= half_width:
+                break
+        return estimator.estimate()
+    
+    def write_checkpoint(self, path: str):
+        """
+        Checkpoint to a file, writing history rows saved by earlier calls
+        with the same path only once (see CheckpointWriter).
+        
+        Args:
+            path: Checkpoint file; restore with load_checkpoint
+        """
+        if self._checkpoint_writer is None or self._checkpoint_writer.path != path:
+            self._checkpoint_writer = CheckpointWriter(path)
+        self._checkpoint_writer.write(self)
+    
+    def checkpoint(self) -> bytes:
+        """Serialize the running state (see simulation.checkpoint)."""
+        return encode_checkpoint(self)
+    
+    def restore(self, data: bytes, restore_controller: bool = True):
+        """
+        Replace the running state with a checkpoint.
+        
+        Args:
+            data: Bytes returned by checkpoint()
+            restore_controller: Also restore controller internal state
+        """
+        decode_checkpoint(self, data, restore_controller)
+    
+    def fork(self, controller: TrafficController = None) -> 'TrafficSimulator':
+        """
+        Create an independent copy continuing from the current state.
+        
+        Args:
+            controller: Controller for the branch (defaults to a copy of
+                this simulator's controller)
+            
+        Returns:
+            New TrafficSimulator sharing this one's configuration
+        """
+        if self.profiler is not None:
+            # Branches are not profiled; copy the uninstrumented objects
+            with self.profiler.suspended():
+                return self.fork(controller)
+        child = copy.copy(self)
+        child.arrival_process = copy.deepcopy(self.arrival_process)
+        child.controller = controller if controller is not None else copy.deepcopy(self.controller)
+        child.estimators = copy.deepcopy(self.estimators)
+        child._checkpoint_writer = None
+        child.restore(self.checkpoint(), restore_controller=controller is None)
+        return child
     
     def get_metrics(self) -> SimulationMetrics:
         """Get simulation metrics."""
@@ -122,6 +534,10 @@ class TrafficSimulator:
         print(f"\nWait Time Statistics:")
         print(f"  Average Wait Time: {self.metrics.get_average_wait_time():.2f} seconds")
         print(f"  95th Percentile Wait: {self.metrics.get_percentile_wait_time(95):.2f} seconds")
+        print(f"  Average / 95th Percentile Wait by Direction:")
+        for direction, row in self.metrics.direction_breakdown().items():
+            print(f"    {direction.value}: {row['avg_wait_time']:.2f}s / {row['p95_wait_time']:.2f}s "
+                  f"({row['departed']} vehicles)")
         print(f"\nQueue Statistics:")
         print(f"  Max Queue Lengths:")
         for direction in Direction:
@@ -130,4 +546,18 @@ class TrafficSimulator:
         print(f"  Max Consecutive Skips:")
         for direction in Direction:
             print(f"    {direction.value}: {self.metrics.max_consecutive_skips[direction]}")
+        print(f"\nGreen Utilization:")
+        print(f"  Green / Wasted Green / Departures per Green Second:")
+        phase_names = [phase.name for phase in self.phase_plan.phases]
+        for name, row in self.metrics.phase_breakdown(phase_names).items():
+            print(f"    {name}: {row['green_time']:.0f}s / {row['wasted_green']:.0f}s / "
+                  f"{row['departures_per_green_second']:.2f}")
+        if self.storage_capacity is not None:
+            print(f"\nSpillback Statistics:")
+            print(f"  Vehicles Held Upstream: {self.metrics.total_vehicles_held}")
+            print(f"  Vehicles Blocked: {self.metrics.total_vehicles_blocked}")
+            print(f"  Blocked Time / Spillback Events / Max Overflow:")
+            for direction in Direction:
+                print(f"    {direction.value}: {self.metrics.blocked_time[direction]:.0f}s / "
+                      f"{self.metrics.spillback_count[direction]} / {self.metrics.max_overflow[direction]}")
         print(f"{'='*60}\n")
@@ -0,0 +1,445 @@
+"""
+Surrogate models of simulation outcomes, for instant what-if answers.
+
+A ``Surrogate`` learns the map from (arrival rates, controller parameters,
+duration) to the headline metrics of one controller type from finished runs,
+typically those in a ``RunCache`` (which ``explore.py`` and ``sample_specs``
+fill). It is a Gaussian-process regressor in plain NumPy, one per metric:
+
+- Features are scaled to the training bounding box. Every metric is
+  nonnegative and waits grow steeply towards saturation, so the process
+  models log(1 + metric), scaled to zero mean and unit variance; predictions
+  are mapped back and never fall below zero.
+- A squared-exponential kernel with one length scale per feature (so
+  irrelevant features are learned to matter little), a signal variance and a
+  noise variance, the last absorbing seed-to-seed variation.
+- Hyperparameters maximise the log marginal likelihood by gradient ascent
+  (Adam on the log parameters) over a random subset of the training runs;
+  the final model conditions on up to ``max_points`` runs.
+
+Predictions come with the standard deviation of the mean (model uncertainty)
+and the noise standard deviation (the spread of single runs), both carried
+over from log space to first order; ``Prediction.interval`` is computed in
+log space, so it is asymmetric and nonnegative. A query is
+flagged out of domain when it lies outside the training bounding box or where
+the model has too little data (relative standard deviation above
+``max_relative_std``): those deserve a real simulation, whose result can be
+cached and trained on next time.
+
+    cache = RunCache()
+    surrogate = Surrogate.fit(cache.results(), 'adaptive')
+    prediction = surrogate.predict(rates, {'min_green': 5, 'max_green': 40, 'extension_threshold': 2})
+    if not prediction.in_domain:
+        result = simulate(RunSpec.create('adaptive', params, rates))
+
+Batches of queries go through ``predict_many``; a model with a few hundred
+runs answers tens of thousands of queries per second.
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from .models import Direction
+from .run_cache import RunResult, RunSpec
+
+METRICS = ('avg_wait_time', 'p95_wait_time', 'max_queue_total', 'throughput')
+
+# Parameter ranges of sample_specs (as the explorer's sliders, whole-number steps)
+PARAMETER_RANGES = {
+    'fixed': {'green_time': (5, 60)},
+    'adaptive': {'min_green': (2, 20), 'max_green': (10, 90), 'extension_threshold': (0, 10)},
+}
+RATE_RANGE = (0.02, 0.5)  # Arrivals per second per approach
+
+_BOUNDS = {  # Log hyperparameter limits: length scale, signal variance, noise variance
+    'length': (math.log(0.02), math.log(50.0)),
+    'signal': (math.log(1e-2), math.log(1e2)),
+    'noise': (math.log(1e-6), math.log(1.0)),
+}
+
+
+class GaussianProcess:
+    """Gaussian-process regression with a squared-exponential ARD kernel."""
+
+    def __init__(self, log_lengths: np.ndarray, log_signal: float = 0.0, log_noise: float = math.log(0.1)):
+        """
+        Initialize process.
+
+        Args:
+            log_lengths: Log length scale per feature
+            log_signal: Log signal variance
+            log_noise: Log noise variance
+        """
+        self.log_lengths = np.asarray(log_lengths, dtype=float)
+        self.log_signal = float(log_signal)
+        self.log_noise = float(log_noise)
+        self.x: np.ndarray = None
+        self.y: np.ndarray = None
+        self.alpha: np.ndarray = None
+        self._l_inv: np.ndarray = None
+
+    @property
+    def signal_variance(self) -> float:
+        return math.exp(self.log_signal)
+
+    @property
+    def noise_variance(self) -> float:
+        return math.exp(self.log_noise)
+
+    def kernel(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Noise-free covariance between the rows of a and b."""
+        scale = np.exp(-self.log_lengths)
+        a = a * scale
+        b = b * scale
+        distances = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2 * a @ b.T
+        return self.signal_variance * np.exp(-0.5 * np.maximum(distances, 0.0))
+
+    def _cholesky(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        k = self.kernel(x, x)
+        jitter = self.noise_variance + 1e-8 * self.signal_variance
+        return k, np.linalg.cholesky(k + jitter * np.eye(len(x)))
+
+    def log_likelihood(self, x: np.ndarray, y: np.ndarray) -> Tuple[float, np.ndarray]:
+        """
+        Log marginal likelihood and its gradient.
+
+        Returns:
+            (value, gradient over [log lengths..., log signal, log noise])
+        """
+        k, chol = self._cholesky(x)
+        l_inv = np.linalg.inv(chol)
+        k_inv = l_inv.T @ l_inv
+        alpha = k_inv @ y
+        value = -0.5 * y @ alpha - np.log(np.diag(chol)).sum() - 0.5 * len(y) * math.log(2 * math.pi)
+        w = np.outer(alpha, alpha) - k_inv  # d value / dK = W / 2
+        wk = w * k
+        gradient = np.empty(len(self.log_lengths) + 2)
+        for d, log_length in enumerate(self.log_lengths):
+            column = x[:, d]
+            squared = (column[:, None] - column[None, :]) ** 2
+            gradient[d] = 0.5 * (wk * squared).sum() * math.exp(-2 * log_length)
+        gradient[-2] = 0.5 * wk.sum()
+        gradient[-1] = 0.5 * np.trace(w) * self.noise_variance
+        return value, gradient
+
+    def optimize(self, x: np.ndarray, y: np.ndarray, iterations: int = 150, learning_rate: float = 0.05):
+        """Fit the hyperparameters by Adam ascent of the log marginal likelihood."""
+        theta = np.concatenate([self.log_lengths, [self.log_signal, self.log_noise]])
+        low = np.array([_BOUNDS['length'][0]] * len(self.log_lengths) + [_BOUNDS['signal'][0], _BOUNDS['noise'][0]])
+        high = np.array([_BOUNDS['length'][1]] * len(self.log_lengths) + [_BOUNDS['signal'][1], _BOUNDS['noise'][1]])
+        m = np.zeros_like(theta)
+        v = np.zeros_like(theta)
+        best = (-math.inf, theta.copy())
+        for t in range(1, iterations + 1):
+            self._set(theta)
+            try:
+                value, gradient = self.log_likelihood(x, y)
+            except np.linalg.LinAlgError:
+                break
+            if value > best[0]:
+                best = (value, theta.copy())
+            m = 0.9 * m + 0.1 * gradient
+            v = 0.999 * v + 0.001 * gradient ** 2
+            step = learning_rate * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+            theta = np.clip(theta + step, low, high)
+        self._set(best[1])
+
+    def _set(self, theta: np.ndarray):
+        self.log_lengths = theta[:-2].copy()
+        self.log_signal = float(theta[-2])
+        self.log_noise = float(theta[-1])
+
+    def condition(self, x: np.ndarray, y: np.ndarray):
+        """Condition on training data with the current hyperparameters."""
+        _, chol = self._cholesky(x)
+        self._l_inv = np.linalg.inv(chol)
+        self.alpha = self._l_inv.T @ (self._l_inv @ y)
+        self.x = x
+        self.y = y
+
+    def predict(self, x: np.ndarray, return_std: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Posterior mean and standard deviation of the noise-free function.
+
+        Returns:
+            (mean, std); std is None without return_std
+        """
+        k = self.kernel(x, self.x)
+        mean = k @ self.alpha
+        if not return_std:
+            return mean, None
+        v = k @ self._l_inv.T
+        variance = np.maximum(self.signal_variance - (v * v).sum(axis=1), 0.0)
+        return mean, np.sqrt(variance)
+
+
+@dataclass
+class Prediction:
+    """Surrogate answer for one query, in the metrics' own units."""
+    mean: Dict[str, float]
+    std: Dict[str, float]  # Uncertainty of the mean
+    noise: Dict[str, float]  # Spread of single runs (seed to seed)
+    in_domain: bool
+    reason: str = ''  # Why the query is out of domain
+
+    def interval(self, metric: str, z: float = 1.96) -> Tuple[float, float]:
+        """Confidence interval of the mean of a metric (in log(1 + metric) space, see module docs)."""
+        center = math.log1p(self.mean[metric])
+        half_width = z * self.std[metric] / (1.0 + self.mean[metric])
+        return max(math.expm1(center - half_width), 0.0), math.expm1(center + half_width)
+
+
+def training_data(results: Iterable[RunResult], controller: str,
+                  parameters: Sequence[str] = None) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Feature and target matrices of one controller type's runs.
+
+    Args:
+        results: Finished runs (e.g. RunCache.results())
+        controller: Controller type to keep
+        parameters: Parameter names used as features (defaults to those of
+            the first matching run); runs lacking one are skipped
+
+    Returns:
+        (parameter names, features, targets) with features ordered as
+        arrival rates in Direction order, parameters, duration and targets
+        as METRICS
+    """
+    rows, targets = [], []
+    for result in results:
+        spec = result.spec
+        if spec.controller != controller:
+            continue
+        params = dict(spec.params)
+        if parameters is None:
+            parameters = sorted(params)
+        if any(name not in params for name in parameters):
+            continue
+        rows.append([rate for _, rate in spec.arrival_rates] + [params[name] for name in parameters]
+                    + [spec.duration])
+        targets.append([result.summary[metric] for metric in METRICS])
+    return (list(parameters or []), np.array(rows, dtype=float).reshape(-1, len(Direction) + len(parameters or []) + 1),
+            np.array(targets, dtype=float).reshape(-1, len(METRICS)))
+
+
+class Surrogate:
+    """Predicts a controller type's headline metrics from cached runs."""
+
+    def __init__(self, controller: str, parameters: Sequence[str], lower: np.ndarray, upper: np.ndarray,
+                 processes: Dict[str, GaussianProcess], target_mean: np.ndarray, target_scale: np.ndarray,
+                 max_relative_std: float = 0.5):
+        """
+        Initialize surrogate (use Surrogate.fit or Surrogate.load).
+
+        Args:
+            controller: Controller type
+            parameters: Controller parameter names, in feature order
+            lower: Lower corner of the training domain per feature
+            upper: Upper corner of the training domain per feature
+            processes: Conditioned process per metric (on scaled data)
+            target_mean: Mean per metric of the training targets (log(1 + metric))
+            target_scale: Standard deviation per metric of the training targets
+            max_relative_std: Flag queries whose model standard deviation
+                exceeds this fraction of the prior's (1 means no data nearby)
+        """
+        self.controller = controller
+        self.parameters = list(parameters)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.processes = processes
+        self.target_mean = np.asarray(target_mean, dtype=float)
+        self.target_scale = np.asarray(target_scale, dtype=float)
+        self.max_relative_std = max_relative_std
+        self._span = np.where(self.upper > self.lower, self.upper - self.lower, 1.0)
+
+    @property
+    def feature_names(self) -> List[str]:
+        return [f'rate_{d.value}' for d in Direction] + self.parameters + ['duration']
+
+    @property
+    def n_training(self) -> int:
+        return len(next(iter(self.processes.values())).x)
+
+    @classmethod
+    def fit(cls, results: Iterable[RunResult], controller: str, parameters: Sequence[str] = None,
+            max_points: int = 1000, optimize_points: int = 300, iterations: int = 150,
+            seed: int = 0, **kwargs) -> 'Surrogate':
+        """
+        Train on finished runs.
+
+        Args:
+            results: Finished runs (runs of other controller types are ignored)
+            controller: Controller type to model
+            parameters: Parameter names used as features (see training_data)
+            max_points: Runs the model conditions on (a random subset beyond);
+                prediction cost grows with it
+            optimize_points: Runs used to fit the hyperparameters
+            iterations: Gradient steps of the hyperparameter fit
+            seed: Seed of the subset choices
+            kwargs: Passed on to Surrogate (max_relative_std)
+
+        Raises:
+            ValueError: If there are too few runs of the controller type
+        """
+        parameters, x, y = training_data(results, controller, parameters)
+        if len(x) < 10:
+            raise ValueError(f"Need at least 10 runs of {controller!r} to fit a surrogate, got {len(x)}")
+        rng = np.random.default_rng(seed)
+        if len(x) > max_points:
+            keep = rng.choice(len(x), max_points, replace=False)
+            x, y = x[keep], y[keep]
+        lower, upper = x.min(axis=0), x.max(axis=0)
+        span = np.where(upper > lower, upper - lower, 1.0)
+        scaled = (x - lower) / span
+        y = np.log1p(np.maximum(y, 0.0))
+        target_mean = y.mean(axis=0)
+        target_scale = np.where(y.std(axis=0) > 0, y.std(axis=0), 1.0)
+        targets = (y - target_mean) / target_scale
+        subset = rng.choice(len(x), min(optimize_points, len(x)), replace=False)
+
+        processes = {}
+        for i, metric in enumerate(METRICS):
+            process = GaussianProcess(np.full(x.shape[1], math.log(0.5)))
+            process.optimize(scaled[subset], targets[subset, i], iterations)
+            process.condition(scaled, targets[:, i])
+            processes[metric] = process
+        return cls(controller, parameters, lower, upper, processes, target_mean, target_scale, **kwargs)
+
+    def features(self, arrival_rates: Dict[Direction, float], params: Dict[str, float],
+                 duration: float = None) -> np.ndarray:
+        """
+        Feature row of one query (for predict_many).
+
+        Args:
+            arrival_rates: Arrivals per second per approach
+            params: Controller parameters (every name in self.parameters)
+            duration: Simulated seconds (defaults to the training duration
+                when all runs had the same)
+
+        Raises:
+            ValueError: If a parameter is missing
+        """
+        missing = [name for name in self.parameters if name not in params]
+        if missing:
+            raise ValueError(f"Missing controller parameters {missing}")
+        if duration is None:
+            duration = self.upper[-1]
+        return np.array([arrival_rates.get(d, 0.0) for d in Direction]
+                        + [params[name] for name in self.parameters] + [duration], dtype=float)
+
+    def predict_many(self, features: np.ndarray, return_std: bool = True
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Predict a batch of queries.
+
+        Args:
+            features: One row per query, columns as feature_names
+            return_std: Also compute standard deviations (the costlier part)
+
+        Returns:
+            (means, stds, in_domain): means and stds of shape (queries,
+            metrics) in METRICS order, stds None without return_std;
+            in_domain per query (the box test alone without return_std)
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+        scaled = (features - self.lower) / self._span
+        means = np.empty((len(features), len(METRICS)))
+        stds = np.empty_like(means) if return_std else None
+        relative = np.zeros(len(features))
+        for i, metric in enumerate(METRICS):
+            process = self.processes[metric]
+            mean, std = process.predict(scaled, return_std)
+            means[:, i] = self.target_mean[i] + self.target_scale[i] * mean
+            if return_std:
+                stds[:, i] = self.target_scale[i] * std
+                relative = np.maximum(relative, std / math.sqrt(process.signal_variance))
+        growth = np.exp(means)  # d metric / d log(1 + metric)
+        means = np.maximum(growth - 1.0, 0.0)
+        if return_std:
+            stds *= growth
+        in_box = np.all((features >= self.lower - 1e-9) & (features <= self.upper + 1e-9), axis=1)
+        return means, stds, in_box & (relative <= self.max_relative_std)
+
+    def predict(self, arrival_rates: Dict[Direction, float], params: Dict[str, float],
+                duration: float = None) -> Prediction:
+        """
+        Predict one query (arguments as in features).
+        """
+        features = self.features(arrival_rates, params, duration)
+        means, stds, in_domain = self.predict_many(features)
+        reason = ''
+        outside = [name for name, value, low, high in zip(self.feature_names, features, self.lower, self.upper)
+                   if not low - 1e-9 <= value <= high + 1e-9]
+        if outside:
+            reason = f"outside the training range of {', '.join(outside)}"
+        elif not in_domain[0]:
+            reason = 'too few training runs nearby'
+        return Prediction(
+            mean=dict(zip(METRICS, means[0].tolist())),
+            std=dict(zip(METRICS, stds[0].tolist())),
+            noise={metric: float(self.target_scale[i]) * math.sqrt(self.processes[metric].noise_variance)
+                   * (1.0 + float(means[0, i]))
+                   for i, metric in enumerate(METRICS)},
+            in_domain=bool(in_domain[0]),
+            reason=reason,
+        )
+
+    def save(self, path: str):
+        """Write the model to a .npz file."""
+        process = self.processes[METRICS[0]]
+        meta = {'controller': self.controller, 'parameters': self.parameters, 'metrics': list(METRICS),
+                'max_relative_std': self.max_relative_std}
+        arrays = {}
+        for metric, p in self.processes.items():
+            arrays[f'{metric}_hyper'] = np.concatenate([p.log_lengths, [p.log_signal, p.log_noise]])
+            arrays[f'{metric}_y'] = p.y
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), x=process.x, lower=self.lower,
+                                upper=self.upper, target_mean=self.target_mean,
+                                target_scale=self.target_scale, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'Surrogate':
+        """Read a model written by save."""
+        with np.load(path, allow_pickle=False) as archive:
+            meta = json.loads(str(archive['meta']))
+            x = archive['x']
+            processes = {}
+            for metric in meta['metrics']:
+                hyper = archive[f'{metric}_hyper']
+                process = GaussianProcess(hyper[:-2], hyper[-2], hyper[-1])
+                process.condition(x, archive[f'{metric}_y'])
+                processes[metric] = process
+            return cls(meta['controller'], meta['parameters'], archive['lower'], archive['upper'], processes,
+                       archive['target_mean'], archive['target_scale'], meta['max_relative_std'])
+
+
+def sample_specs(controller: str, n: int, ranges: Dict[str, Tuple[float, float]] = None,
+                 rate_range: Tuple[float, float] = RATE_RANGE, duration: float = 1800.0,
+                 seed: int = 0) -> List[RunSpec]:
+    """
+    Latin-hypercube design of runs to train a surrogate on.
+
+    Args:
+        controller: Controller type
+        n: Number of runs
+        ranges: (low, high) per controller parameter (defaults to
+            PARAMETER_RANGES); parameters are rounded to whole numbers
+        rate_range: (low, high) arrival rate of every approach
+        duration: Simulated seconds per run
+        seed: Seed of the design; run i uses arrival seed `seed + i`
+    """
+    ranges = PARAMETER_RANGES[controller] if ranges is None else ranges
+    names = sorted(ranges)
+    bounds = np.array([rate_range] * len(Direction) + [ranges[name] for name in names], dtype=float)
+    rng = np.random.default_rng(seed)
+    strata = np.argsort(rng.random((len(bounds), n)), axis=1).T  # One stratum per run and dimension
+    unit = (strata + rng.random(strata.shape)) / n
+    values = bounds[:, 0] + unit * (bounds[:, 1] - bounds[:, 0])
+    specs = []
+    for i, row in enumerate(values):
+        rates = dict(zip(Direction, row[:len(Direction)]))
+        params = {name: round(value) for name, value in zip(names, row[len(Direction):])}
+        specs.append(RunSpec.create(controller, params, rates, duration, seed + i))
+    return specs
@@ -0,0 +1,249 @@
+"""
+Per-tick trajectory files.
+
+``TrajectoryWriter`` records, for every simulation step, the queue length
+and departures of each approach and the active phase and signal state. Rows
+are buffered into fixed-size chunks; each full chunk is appended to a ZIP
+container as one ``.npy`` member per field::
+
+    meta.json                   directions, phase names, dt, chunk size, ...
+    chunk-000000/time.npy       (chunk_size,) float64
+    chunk-000000/queues.npy     (chunk_size, 4) int32
+    chunk-000000/departures.npy (chunk_size, 4) int32
+    chunk-000000/phase.npy      (chunk_size,) int16, index into meta phases
+    chunk-000000/state.npy      (chunk_size,) int8, index into meta states
+    chunk-000001/...
+
+Only one chunk is held in memory while writing, and the container is valid
+after every chunk, so a crashed run keeps everything but the last partial
+chunk. ``TrajectoryReader`` memory-maps uncompressed members in place and
+decompresses compressed ones a chunk at a time, so slices of very long
+trajectories, or of thousands of them, load without reading whole files.
+"""
+import json
+import zipfile
+from functools import lru_cache
+from typing import Dict, Iterator, List
+import numpy as np
+from .models import DIRECTIONS, DIRECTION_INDEX, SIGNAL_STATES, SIGNAL_INDEX
+
+FIELDS = {
+    'time': ((), np.float64),
+    'queues': ((len(DIRECTIONS),), np.int32),
+    'departures': ((len(DIRECTIONS),), np.int32),
+    'phase': ((), np.int16),
+    'state': ((), np.int8),
+}
+
+
+class TrajectoryWriter:
+    """Streams per-tick simulator state to a chunked trajectory file."""
+
+    def __init__(self, path: str, simulator, chunk_size: int = 4096, compress: bool = True):
+        """
+        Create a trajectory file for a simulator.
+
+        Args:
+            path: Output file (conventionally ``*.traj.zip``)
+            simulator: TrafficSimulator whose steps will be recorded
+            chunk_size: Ticks per chunk
+            compress: Deflate chunks (smaller files); uncompressed chunks
+                can be memory-mapped by the reader
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self.n_ticks = 0
+        self.n_chunks = 0
+        self._phase_index = simulator.phase_plan.index_of
+        self._lane_direction_index = simulator.lane_layout.lane_direction_index
+        self._buffers = {
+            name: np.zeros((chunk_size, *shape), dtype=dtype) for name, (shape, dtype) in FIELDS.items()
+        }
+        self._row = 0
+        self._departed = simulator.metrics.total_vehicles_departed
+
+        meta = {
+            'directions': [d.value for d in DIRECTIONS],
+            'phases': [phase.name for phase in simulator.phase_plan.phases],
+            'states': [state.value for state in SIGNAL_STATES],
+            'dt': simulator.dt,
+            'chunk_size': chunk_size,
+            'controller': simulator.controller.get_name(),
+        }
+        with zipfile.ZipFile(path, 'w', self.compression) as archive:
+            archive.writestr('meta.json', json.dumps(meta))
+
+    def record(self, simulator):
+        """Record the step the simulator has just executed."""
+        row = self._row
+        buffers = self._buffers
+        state = simulator.state
+        metrics = simulator.metrics
+
+        buffers['time'][row] = simulator.current_time - simulator.dt
+        queues = buffers['queues'][row]
+        for direction, length in metrics.queue_history[-1].items():
+            queues[DIRECTION_INDEX[direction]] = length
+        departed = metrics.total_vehicles_departed
+        if departed != self._departed:
+            buffers['departures'][row] = np.bincount(
+                self._lane_direction_index, weights=simulator.last_departures,
+                minlength=len(DIRECTIONS)
+            )
+            self._departed = departed
+        else:
+            buffers['departures'][row] = 0
+        buffers['phase'][row] = self._phase_index(state.active_phase)
+        buffers['state'][row] = SIGNAL_INDEX[state.signal_state]
+
+        self._row += 1
+        if self._row == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Append buffered ticks as a (possibly partial) chunk."""
+        if self._row == 0:
+            return
+        with zipfile.ZipFile(self.path, 'a', self.compression) as archive:
+            for name, buffer in self._buffers.items():
+                with archive.open(f'chunk-{self.n_chunks:06d}/{name}.npy', 'w') as f:
+                    np.lib.format.write_array(f, buffer[:self._row], allow_pickle=False)
+        self.n_ticks += self._row
+        self.n_chunks += 1
+        self._row = 0
+
+    def close(self):
+        """Write the final partial chunk."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    """Lazy, chunk-wise access to a trajectory file."""
+
+    def __init__(self, path: str, cache_chunks: int = 8):
+        """
+        Open a trajectory file.
+
+        Args:
+            path: File written by TrajectoryWriter
+            cache_chunks: Decompressed chunks kept in memory per reader
+        """
+        self.path = path
+        self._archive = zipfile.ZipFile(path, 'r')
+        self.meta = json.loads(self._archive.read('meta.json'))
+        self.directions: List[str] = self.meta['directions']
+        self.phases: List[str] = self.meta['phases']
+        self.states: List[str] = self.meta['states']
+        self.dt: float = self.meta['dt']
+
+        members = {info.filename: info for info in self._archive.infolist()}
+        self._chunks = sorted({name.split('/')[0] for name in members if name.startswith('chunk-')})
+        self._members = members
+        lengths = [self._shape(f'{chunk}/time.npy')[0] for chunk in self._chunks]
+        self._starts = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._load = lru_cache(maxsize=cache_chunks)(self._load_member)
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    @property
+    def n_chunks(self) -> int:
+        return len(self._chunks)
+
+    def close(self):
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _header(self, name: str):
+        """Shape, dtype and data offset (within the member) of a .npy member."""
+        with self._archive.open(name) as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            return shape, dtype, f.tell()
+
+    def _shape(self, name: str):
+        return self._header(name)[0]
+
+    def _load_member(self, name: str) -> np.ndarray:
+        info = self._members[name]
+        if info.compress_type == zipfile.ZIP_STORED:
+            shape, dtype, header_length = self._header(name)
+            # Stored members are contiguous in the file after their local header
+            with open(self.path, 'rb') as f:
+                f.seek(info.header_offset + 26)
+                name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+            offset = info.header_offset + 30 + int(name_length) + int(extra_length) + header_length
+            return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        with self._archive.open(name) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    def chunk(self, index: int, field: str) -> np.ndarray:
+        """One field of one chunk."""
+        return self._load(f'{self._chunks[index]}/{field}.npy')
+
+    def iter_chunks(self, field: str) -> Iterator[np.ndarray]:
+        """Yield one field chunk by chunk (constant memory)."""
+        for index in range(self.n_chunks):
+            yield self.chunk(index, field)
+
+    def read(self, field: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        Ticks [start, stop) of one field, touching only the chunks involved.
+
+        Args:
+            field: One of time, queues, departures, phase, state
+            start: First tick
+            stop: End tick (defaults to the end of the trajectory)
+        """
+        if field not in FIELDS:
+            raise KeyError(f"Unknown trajectory field: {field}")
+        stop = len(self) if stop is None else min(stop, len(self))
+        shape, dtype = FIELDS[field]
+        if start >= stop:
+            return np.zeros((0, *shape), dtype=dtype)
+        first = int(np.searchsorted(self._starts, start, side='right')) - 1
+        last = int(np.searchsorted(self._starts, stop, side='left')) - 1
+        parts = []
+        for index in range(first, last + 1):
+            offset = self._starts[index]
+            data = self.chunk(index, field)
+            parts.append(data[max(0, start - offset):stop - offset])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.read(field)
+
+    def queue(self, direction: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """Queue length of one approach ("N", "E", "S" or "W") per tick."""
+        return self.read('queues', start, stop)[:, self.directions.index(direction)]
+
+    def summary(self) -> Dict[str, float]:
+        """Totals computed in one streaming pass over the chunks."""
+        departures = np.zeros(len(self.directions), dtype=np.int64)
+        max_queue = np.zeros(len(self.directions), dtype=np.int64)
+        queue_sum = 0.0
+        for queues, departed in zip(self.iter_chunks('queues'), self.iter_chunks('departures')):
+            departures += departed.sum(axis=0)
+            max_queue = np.maximum(max_queue, queues.max(axis=0))
+            queue_sum += float(queues.sum())
+        return {
+            'ticks': len(self),
+            'total_departed': int(departures.sum()),
+            'avg_queue_total': queue_sum / len(self) if len(self) else 0.0,
+            **{f'max_queue_{d}': int(m) for d, m in zip(self.directions, max_queue)},
+        }
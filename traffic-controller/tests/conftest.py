@@ -0,0 +1,16 @@
+"""Shared fixtures: small simulators on a fixed, moderate arrival stream."""
+import pytest
+from simulation.controllers import AdaptiveCountController
+from simulation.models import ArrivalProcess, Direction
+from simulation.simulator import TrafficSimulator
+
+RATES = {Direction.NORTH: 0.15, Direction.SOUTH: 0.15, Direction.EAST: 0.1, Direction.WEST: 0.1}
+
+
+@pytest.fixture
+def make_simulator():
+    """Factory of adaptive-controller simulators: make_simulator(dt=1.0, seed=0, controller=None, **options)."""
+    def make(dt: float = 1.0, seed: int = 0, controller=None, **options) -> TrafficSimulator:
+        return TrafficSimulator(controller or AdaptiveCountController(), ArrivalProcess(RATES, seed=seed),
+                                dt=dt, **options)
+    return make
@@ -0,0 +1,77 @@
+"""Output analysis: replication aggregates, MSER warm-up and batch-means intervals."""
+import math
+import numpy as np
+import pytest
+from simulation.analysis import ReplicationAggregate, SteadyStateEstimator, mser, t_quantile
+from simulation.models import WaitHistogram
+
+
+@pytest.mark.parametrize('df, exact', [(1, 12.7062), (2, 4.3027), (3, 3.1824), (5, 2.5706),
+                                       (19, 2.0930), (100, 1.9840)])
+def test_t_quantile_matches_tables(df, exact):
+    assert t_quantile(0.975, df) == pytest.approx(exact, abs=0.01)
+
+
+def test_mser_matches_its_definition():
+    rng = np.random.default_rng(1)
+    y = np.concatenate([np.linspace(0.0, 5.0, 30), 5.0 + rng.normal(size=170)])
+    errors = [np.var(y[d:]) / (len(y) - d) for d in range(len(y) // 2 + 1)]
+    assert mser(y) == int(np.argmin(errors))
+
+
+def test_mser_removes_the_transient():
+    rng = np.random.default_rng(2)
+    y = np.concatenate([np.full(40, 20.0), rng.normal(size=400)])
+    assert 40 <= mser(y) <= 45
+
+
+def test_streaming_estimator_matches_series():
+    y = np.random.default_rng(3).exponential(size=1003)
+    streamed = SteadyStateEstimator()
+    streamed.add_many(y)
+    assert streamed.estimate() == SteadyStateEstimator.from_series(y).estimate()
+
+
+def test_batch_means_interval():
+    rng = np.random.default_rng(4)
+    y = np.concatenate([np.zeros(100), 5.0 + rng.normal(size=10000)])
+    estimate = SteadyStateEstimator.from_series(y).estimate()
+    assert estimate.warmup == 100
+    kept = y[100:].reshape(20, -1).mean(axis=1)
+    assert estimate.n_batches == 20
+    assert estimate.mean == pytest.approx(kept.mean())
+    assert estimate.half_width == pytest.approx(t_quantile(0.975, 19) * kept.std(ddof=1) / math.sqrt(20))
+    assert abs(estimate.mean - 5.0) < estimate.half_width * 2
+
+
+def test_batch_means_coverage():
+    rng = np.random.default_rng(5)
+    covered = 0
+    for _ in range(400):
+        estimate = SteadyStateEstimator.from_series(rng.normal(size=1000)).estimate()
+        covered += abs(estimate.mean) <= estimate.half_width
+    assert 0.90 <= covered / 400 <= 0.99
+
+
+def test_wait_rows_count_each_wait_once():
+    # 600 s is the top edge: it belongs to the overflow bin only
+    waits = [0.0, 1.0, 599.0, 600.0, 600.0, 750.0]
+    aggregate = ReplicationAggregate(duration=60.0)
+    aggregate.add_waits(waits)
+    aggregate.add_wait_histogram(WaitHistogram.from_waits(waits))
+    for row in aggregate.wait_rows:
+        assert row.sum() == len(waits)
+        assert row[-1] == 3
+        assert row[599] == 1
+
+
+def test_estimator_state_round_trip():
+    y = np.random.default_rng(6).normal(size=503)
+    estimator = SteadyStateEstimator.from_series(y, n_batches=10, confidence=0.9)
+    restored = SteadyStateEstimator()
+    restored.set_state(estimator.get_state())
+    restored.group_means = list(estimator.group_means)
+    for value in (1.0, 2.0, 3.0):
+        estimator.add(value)
+        restored.add(value)
+    assert restored.estimate() == estimator.estimate()
@@ -0,0 +1,107 @@
+"""Checkpoints: restored, forked and resumed runs continue exactly."""
+import os
+import numpy as np
+import pytest
+from simulation.checkpoint import decode_checkpoint, load_checkpoint, save_checkpoint
+from simulation.controllers import FixedTimerController
+
+OPTIONS = [
+    {},
+    {'keep_wait_times': True},
+    {'storage_capacity': 1, 'spillback_policy': 'hold'},  # Vehicles are held upstream at SPLIT
+]
+SPLIT = 620.0  # Checkpoint time of a 1200 s run
+
+
+def snapshot(simulator):
+    """Everything a continued run must reproduce."""
+    metrics = simulator.metrics
+    return (
+        simulator.current_time,
+        metrics.total_vehicles_arrived,
+        metrics.total_vehicles_departed,
+        metrics.wait_histogram.counts,
+        metrics.wait_histogram.total,
+        metrics.wait_times,
+        metrics.queue_history,
+        metrics.phase_history,
+        # Handles are store slots, renumbered on restore; compare the vehicles
+        [simulator.state.vehicles.arrival_time[queue.to_array()].tolist() for queue in simulator.state.lane_queues],
+        [list(held.arrival_times[held.head:]) for held in simulator.state.overflow.values()],
+        simulator.state.active_phase,
+        simulator.state.signal_state,
+    )
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_restore_continues_exactly(make_simulator, options):
+    reference = make_simulator(**options)
+    reference.run(1200)
+    simulator = make_simulator(**options)
+    simulator.run(SPLIT)
+    data = simulator.checkpoint()
+    # Another seed: the arrival stream must come from the checkpoint
+    restored = make_simulator(seed=99, **options)
+    restored.restore(data)
+    restored.run(1200 - SPLIT, reset=False)
+    assert snapshot(restored) == snapshot(reference)
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_fork_is_exact_and_independent(make_simulator, options):
+    reference = make_simulator(**options)
+    reference.run(1200)
+    simulator = make_simulator(**options)
+    simulator.run(SPLIT)
+    branch = simulator.fork()
+    other = simulator.fork(FixedTimerController(green_time=15.0))
+    for continued in (branch, other, simulator):
+        continued.run(1200 - SPLIT, reset=False)
+    assert snapshot(branch) == snapshot(simulator) == snapshot(reference)
+    assert snapshot(other) != snapshot(reference)
+
+
+def test_saved_file_round_trip(make_simulator, tmp_path):
+    path = str(tmp_path / 'run.npz')
+    simulator = make_simulator(keep_wait_times=True)
+    simulator.run(900)
+    save_checkpoint(simulator, path)
+    restored = make_simulator(keep_wait_times=True)
+    load_checkpoint(restored, path)
+    assert snapshot(restored) == snapshot(simulator)
+
+
+def test_periodic_checkpoints_resume_exactly(make_simulator, tmp_path):
+    path = str(tmp_path / 'run.npz')
+    reference = make_simulator(keep_wait_times=True)
+    reference.run(1500)
+    simulator = make_simulator(keep_wait_times=True)
+    simulator.run(1000, checkpoint_path=path, checkpoint_every=100)
+    # One segment per checkpoint with new rows; the checkpoint file stays small
+    assert len(os.listdir(path + '.history')) == 10
+    restored = make_simulator(keep_wait_times=True)
+    load_checkpoint(restored, path)
+    assert snapshot(restored) == snapshot(simulator)
+    restored.run(500, reset=False)
+    assert snapshot(restored) == snapshot(reference)
+
+    with open(path, 'rb') as f:
+        with pytest.raises(ValueError):
+            decode_checkpoint(make_simulator(), f.read())
+    save_checkpoint(restored, path)  # Self-contained again
+    assert not os.path.exists(path + '.history')
+
+
+def test_run_until_precision_resumes_with_its_estimator(make_simulator, tmp_path):
+    path = str(tmp_path / 'run.npz')
+    settings = dict(min_duration=600.0, max_duration=3000.0, check_every=300.0)
+    reference = make_simulator()
+    expected = reference.run_until_precision(0.0, **settings)
+    interrupted = make_simulator()
+    interrupted.run_until_precision(0.0, **dict(settings, max_duration=1200.0), checkpoint_path=path)
+    resumed = make_simulator()
+    load_checkpoint(resumed, path)
+    assert resumed.estimators['wait'].n_observations == interrupted.estimators['wait'].n_observations
+    assert resumed.run_until_precision(0.0, reset=False, **settings) == expected
+    assert snapshot(resumed) == snapshot(reference)
+    np.testing.assert_array_equal(resumed.estimators['wait'].group_means, reference.estimators['wait'].group_means)
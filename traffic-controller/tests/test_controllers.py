@@ -0,0 +1,15 @@
+"""Controller timing."""
+from simulation.controllers import FixedTimerController
+from simulation.models import PhasePlan
+
+
+def test_cycle_time_is_the_two_phase_cycle():
+    controller = FixedTimerController(green_time=30.0, yellow_time=4.0)
+    assert controller.cycle_time == 2 * (30.0 + 4.0)
+    assert controller.cycle_time == controller.get_cycle_time()
+
+
+def test_cycle_time_sums_the_plan_phases():
+    plan = PhasePlan.protected_left()
+    controller = FixedTimerController(green_time=20.0, yellow_time=3.0, green_times={plan.phases[0].value: 10.0})
+    assert controller.get_cycle_time(plan) == 10.0 + 3.0 + (len(plan.phases) - 1) * (20.0 + 3.0)
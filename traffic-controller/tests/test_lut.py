@@ -0,0 +1,69 @@
+"""Lookup-table controllers decide exactly as the controllers they were compiled from."""
+import numpy as np
+import pytest
+from simulation.controllers import AdaptiveCountController, FixedTimerController
+from simulation.lut import CompiledController, ControllerBank, SignalArrays, compile_controller
+from simulation.models import ArrivalProcess, Direction, Movement, Phase, PhasePlan, SIGNAL_INDEX
+from simulation.simulator import TrafficSimulator
+
+RATES = {Direction.NORTH: 0.35, Direction.SOUTH: 0.3, Direction.EAST: 0.2, Direction.WEST: 0.1}
+CONTROLLERS = [
+    lambda: FixedTimerController(),
+    lambda: FixedTimerController(green_time=25.0, yellow_time=4.0, green_times={'EW': 12.0}),
+    lambda: AdaptiveCountController(),
+    lambda: AdaptiveCountController(min_green=3.0, max_green=45.0, extension_threshold=4,
+                                    max_wait_time=40.0, max_skips=1),
+]
+# A north lead phase followed by both through movements: consecutive phases
+# share some directions (waits reset by one green count for the next)
+LEAD_PLAN = PhasePlan([
+    Phase.build('N', [Movement.NORTH_LEFT, Movement.NORTH_THROUGH, Movement.NORTH_RIGHT]),
+    Phase.build('NS', [Movement.NORTH_THROUGH, Movement.SOUTH_THROUGH, Movement.NORTH_RIGHT, Movement.SOUTH_RIGHT]),
+    Phase.build('EW', [Movement.EAST_THROUGH, Movement.WEST_THROUGH, Movement.EAST_RIGHT, Movement.WEST_RIGHT]),
+])
+PLANS = [PhasePlan.protected_left(), LEAD_PLAN]
+
+
+def run(controller, phase_plan=None, seed=0):
+    simulator = TrafficSimulator(controller, ArrivalProcess(RATES, seed=seed), phase_plan=phase_plan)
+    simulator.run(1800)
+    metrics = simulator.metrics
+    return metrics.phase_history, metrics.queue_history, metrics.wait_histogram.counts
+
+
+@pytest.mark.parametrize('make', CONTROLLERS)
+def test_compiled_run_equals_controller(make):
+    table = compile_controller(make())
+    assert run(CompiledController(table)) == run(make())
+
+
+@pytest.mark.parametrize('plan', PLANS)
+def test_compiled_run_equals_controller_with_overlapping_phases(plan):
+    make = lambda: AdaptiveCountController(max_wait_time=20.0)  # Waits force many switches
+    table = compile_controller(make(), phase_plan=plan)
+    assert run(CompiledController(table), plan) == run(make(), plan)
+
+
+@pytest.mark.parametrize('plan', [None] + PLANS)
+def test_bank_steps_like_each_controller(plan):
+    params = [(5.0, 30.0, 2, 90.0), (3.0, 45.0, 4, 20.0), (8.0, 20.0, 1, 60.0), (5.0, 60.0, 6, 30.0)]
+    controllers = [AdaptiveCountController(min_green=a, max_green=b, extension_threshold=c, max_wait_time=w)
+                   for a, b, c, w in params]
+    tables = [compile_controller(c, phase_plan=plan, verify=False) for c in controllers]  # Checked below
+    bank = ControllerBank(tables)
+    simulators = [TrafficSimulator(c, ArrivalProcess(RATES, seed=i), phase_plan=plan)
+                  for i, c in enumerate(controllers)]
+    index = np.arange(len(simulators))
+    signals = SignalArrays.initial(len(simulators))
+    for _ in range(1500):
+        for simulator in simulators:
+            simulator.step_arrivals()
+        lane_counts = np.array([[len(q) for q in s.state.lane_queues] for s in simulators])
+        bank.step(index, signals, lane_counts)
+        for i, simulator in enumerate(simulators):
+            state = simulator.state
+            phase, signal_state = simulator.controller.decide_signal(state, simulator.current_time, simulator.dt)
+            assert (signals.phase[i], signals.signal[i]) == (state.phase_plan.index_of(phase),
+                                                             SIGNAL_INDEX[signal_state])
+            assert signals.phase_timer[i] == state.phase_timer
+            simulator.complete_step(phase, signal_state)
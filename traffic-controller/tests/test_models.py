@@ -0,0 +1,94 @@
+"""Core data structures: wait histograms, vehicle store and handle rings."""
+from collections import deque
+import math
+import numpy as np
+import pytest
+from simulation.models import HandleRing, VehicleStore, WaitHistogram
+
+PERCENTILES = [0, 1, 5, 25, 33.3, 50, 75, 90, 95, 99, 99.9, 100]
+
+
+@pytest.mark.parametrize('resolution', [1.0, 0.5, 0.1])
+def test_histogram_percentiles_equal_numpy(resolution):
+    rng = np.random.default_rng(0)
+    waits = rng.geometric(0.05, size=2001) * resolution
+    histogram = WaitHistogram.from_waits(waits, resolution)
+    np.testing.assert_allclose(histogram.percentiles(PERCENTILES), np.percentile(waits, PERCENTILES),
+                               rtol=0, atol=1e-9)
+    assert histogram.mean() == pytest.approx(waits.mean())
+
+
+@pytest.mark.parametrize('n', [1, 2, 3, 10])
+def test_histogram_percentiles_of_few_waits(n):
+    waits = np.arange(n, 0, -1) * 3.0
+    histogram = WaitHistogram()
+    for wait in waits:
+        histogram.add(wait)
+    np.testing.assert_allclose(histogram.percentiles(PERCENTILES), np.percentile(waits, PERCENTILES))
+
+
+@pytest.mark.parametrize('dt', [1.0, 0.5])
+def test_simulated_percentiles_equal_numpy(make_simulator, dt):
+    simulator = make_simulator(dt, keep_wait_times=True)
+    simulator.run(1800)
+    metrics = simulator.metrics
+    waits = np.asarray(metrics.wait_times)
+    assert metrics.wait_histogram.count == len(waits) == metrics.total_vehicles_departed
+    for q in PERCENTILES:
+        assert metrics.get_percentile_wait_time(q) == pytest.approx(np.percentile(waits, q), abs=1e-9)
+    assert metrics.get_average_wait_time() == pytest.approx(waits.mean())
+
+
+def test_histogram_merge_cdf_and_round_trip():
+    rng = np.random.default_rng(1)
+    a, b = rng.integers(0, 50, 300), rng.integers(0, 80, 200)
+    merged = WaitHistogram.from_waits(a) + WaitHistogram.from_waits(b)
+    both = np.concatenate([a, b])
+    assert merged.counts == WaitHistogram.from_waits(both).counts
+    assert merged.cdf(20) == pytest.approx(np.mean(both <= 20))
+    assert merged.tail(20) == pytest.approx(np.mean(both > 20))
+    restored = WaitHistogram.from_dict(merged.to_dict())
+    assert restored.percentile(95) == merged.percentile(95) == np.percentile(both, 95)
+    with pytest.raises(ValueError):
+        merged.merge(WaitHistogram(0.5))
+
+
+def test_handle_ring_behaves_as_deque():
+    rng = np.random.default_rng(2)
+    ring, reference = HandleRing(capacity=2), deque()
+    next_handle = 0
+    for _ in range(5000):
+        action = rng.integers(4)
+        if action == 0 or not reference:
+            ring.append(next_handle)
+            reference.append(next_handle)
+            next_handle += 1
+        elif action == 1:
+            batch = list(range(next_handle, next_handle + int(rng.integers(0, 12))))
+            ring.extend(batch)
+            reference.extend(batch)
+            next_handle += len(batch)
+        else:
+            assert ring.peek() == reference[0]
+            assert ring.popleft() == reference.popleft()
+        assert len(ring) == len(reference)
+        assert ring.to_array().tolist() == list(reference)
+        if reference:
+            assert ring[-1] == reference[-1]
+            assert ring.to_array(3).tolist() == list(reference)[:3]
+    ring.clear()
+    with pytest.raises(IndexError):
+        ring.popleft()
+
+
+def test_vehicle_store_reuses_slots():
+    store = VehicleStore(capacity=2)
+    handles = [store.allocate(float(t), direction=t % 4, turn=0, lane=t % 4) for t in range(5)]
+    assert len(set(handles)) == 5 and len(store) == 5 and store.capacity >= 5
+    store.release(handles[1], departure_time=9.0)
+    assert store.vehicle(handles[1]).departure_time == 9.0
+    assert len(store) == 4 and handles[1] not in store.live().tolist()
+    np.testing.assert_array_equal(store.wait_times(10.0, handles[2:]), [8.0, 7.0, 6.0])
+    reused = store.allocate(7.0, direction=0, turn=0, lane=0)
+    assert math.isnan(store.departure_time[reused])
+    assert store.ids[reused] == 5
@@ -0,0 +1,14 @@
+"""Progress reports from running simulators."""
+import pytest
+from simulation.monitoring import ProgressMonitor
+
+
+def test_reports_cover_every_step(make_simulator):
+    monitor = ProgressMonitor(report_every=7)
+    make_simulator().run(100, monitor=monitor)
+    assert monitor.steps == 100
+
+
+def test_report_every_must_be_positive():
+    with pytest.raises(ValueError):
+        ProgressMonitor(report_every=0)
@@ -0,0 +1,126 @@
+"""Kim-Nelson screening and sequential stopping of controller comparisons."""
+import numpy as np
+import pytest
+from simulation.controllers import AdaptiveCountController, FixedTimerController
+from simulation.models import Direction
+from simulation.scheduler import SequentialComparison
+
+HEAVY_RATES = {Direction.NORTH: 0.4, Direction.SOUTH: 0.3, Direction.EAST: 0.2, Direction.WEST: 0.15}
+
+
+def comparison(names, **options) -> SequentialComparison:
+    configs = {name: FixedTimerController() for name in names}
+    return SequentialComparison(configs, HEAVY_RATES, **options)
+
+
+def kn_elimination(good, bad, n0, alpha, delta):
+    """Replication at which Kim-Nelson drops `bad` against `good` (two systems), or None."""
+    h2 = (n0 - 1) * ((2 * alpha) ** (-2.0 / (n0 - 1)) - 1)
+    variance = np.var(bad[:n0] - good[:n0], ddof=1)
+    for r in range(n0, len(good) + 1):
+        slack = max(0.0, delta / (2 * r) * (h2 * variance / delta ** 2 - r))
+        if bad[:r].mean() - good[:r].mean() > slack:
+            return r
+    return None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_inferior_configuration_dropped_where_the_bound_predicts(seed):
+    rng = np.random.default_rng(seed)
+    common = rng.normal(30.0, 5.0, 60)
+    good = common + rng.normal(0.0, 1.0, 60)
+    bad = common + 1.5 + rng.normal(0.0, 1.0, 60)
+    expected = kn_elimination(good, bad, n0=5, alpha=0.05, delta=1.0)
+    assert expected is not None
+
+    scheduler = comparison(['good', 'bad'], indifference_zone=1.0, alpha=0.05,
+                           min_replications=5, max_replications=60)
+    for r, (g, b) in enumerate(zip(good, bad), start=1):
+        reason = scheduler._record({'good': g, 'bad': b})
+        if r < expected:
+            assert scheduler.survivors == ['good', 'bad']
+            assert reason is None
+        else:
+            break
+    assert scheduler.survivors == ['good']
+    assert scheduler.eliminated == {'bad': expected}
+    assert reason == 'single survivor'
+
+
+def test_maximizing_drops_the_smaller_configuration():
+    rng = np.random.default_rng(0)
+    scheduler = comparison(['low', 'high'], minimize=False, indifference_zone=1.0,
+                           min_replications=5, max_replications=100)
+    reason = None
+    while reason is None:
+        noise = rng.normal(0.0, 1.0)
+        reason = scheduler._record({'low': 10.0 + noise, 'high': 15.0 + noise + rng.normal(0.0, 0.5)})
+    assert list(scheduler.eliminated) == ['low']
+    assert scheduler.eliminated['low'] >= 5
+
+
+def test_better_configuration_survives_at_the_indifference_zone():
+    # Kim-Nelson keeps the best with probability at least 1 - alpha when it leads by delta
+    alpha, delta = 0.05, 1.0
+    rng = np.random.default_rng(1)
+    lost = 0
+    trials = 300
+    for _ in range(trials):
+        scheduler = comparison(['a', 'b', 'c'], indifference_zone=delta, alpha=alpha,
+                               min_replications=10, max_replications=200)
+        reason = None
+        while reason is None:
+            common = rng.normal(20.0, 3.0)
+            reason = scheduler._record({'a': common + rng.normal(0.0, 2.0),
+                                        'b': common + delta + rng.normal(0.0, 2.0),
+                                        'c': common + delta + rng.normal(0.0, 2.0)})
+        lost += 'a' in scheduler.eliminated
+    assert lost / trials <= alpha
+
+
+def test_nothing_dropped_before_first_stage_or_without_indifference_zone():
+    for options in ({'indifference_zone': None}, {'indifference_zone': 1.0, 'min_replications': 8}):
+        scheduler = comparison(['good', 'bad'], max_replications=20, **options)
+        n0 = scheduler.min_replications
+        for r in range(1, n0):
+            assert scheduler._record({'good': 0.0 + r % 2, 'bad': 100.0 + r % 3}) is None
+            assert scheduler.survivors == ['good', 'bad']
+        scheduler._record({'good': 0.0, 'bad': 100.0})
+        expected = ['good'] if options['indifference_zone'] else ['good', 'bad']
+        assert scheduler.survivors == expected
+
+
+def test_stops_on_precision_and_significance():
+    rng = np.random.default_rng(2)
+    precision = comparison(['a', 'b'], target_half_width=0.5, max_replications=500)
+    significance = comparison(['a', 'b'], stop_on_significance=True, max_replications=500)
+    for scheduler, expected in ((precision, 'precision'), (significance, 'significance')):
+        reason = None
+        while reason is None:
+            common = rng.normal(20.0, 3.0)
+            reason = scheduler._record({'a': common + rng.normal(0.0, 1.0),
+                                        'b': common + 1.0 + rng.normal(0.0, 1.0)})
+        assert reason == expected
+        mean, half_width = scheduler.differences()['b']
+        if expected == 'precision':
+            assert half_width <= 0.5
+        else:
+            assert abs(mean) > half_width
+        assert scheduler.n_replications < 500
+
+
+def test_run_screens_simulated_controllers():
+    configs = {'fixed': FixedTimerController(green_time=40.0), 'adaptive': AdaptiveCountController()}
+    seen = []
+    scheduler = SequentialComparison(configs, HEAVY_RATES, duration=600.0, indifference_zone=1.0,
+                                     min_replications=3, max_replications=12,
+                                     on_replication=lambda n, survivors: seen.append((n, survivors)))
+    result = scheduler.run()
+
+    assert result.best == 'adaptive'
+    assert result.survivors == ['adaptive']
+    assert result.stop_reason == 'single survivor'
+    assert result.n_replications == result.eliminated['fixed'] >= 3
+    assert [n for n, _ in seen] == list(range(1, result.n_replications + 1))
+    assert all(len(values) == result.n_replications for values in result.observations.values())
+    assert result.means['fixed'] > result.means['adaptive']
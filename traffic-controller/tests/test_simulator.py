@@ -0,0 +1,49 @@
+"""Simulator runs: stopping rules and reproducibility."""
+import pytest
+from simulation.controllers import AdaptiveCountController, FixedTimerController
+from simulation.models import ArrivalProcess, Direction
+from simulation.simulator import TrafficSimulator
+
+# Results of the original object-per-vehicle simulator (arrived, departed,
+# total wait, p95 wait, max queue and summed queue per approach in Direction
+# order, signal changes) for 1800 s; storage changes must reproduce them exactly
+HEAVY_RATES = {Direction.NORTH: 0.4, Direction.SOUTH: 0.3, Direction.EAST: 0.2, Direction.WEST: 0.15}
+REFERENCE_RUNS = [
+    (FixedTimerController, 0, 1857, 1838, 24449.0, 32.15, [28, 9, 13, 11], [12929, 3274, 5544, 2846], 156),
+    (FixedTimerController, 1, 1814, 1795, 25431.0, 33.0, [23, 9, 20, 7], [12943, 3654, 6920, 2087], 156),
+    (AdaptiveCountController, 0, 1857, 1841, 12278.0, 16.0, [14, 8, 8, 7], [5082, 2650, 2424, 2213], 370),
+    (AdaptiveCountController, 1, 1814, 1802, 12531.0, 16.0, [9, 7, 9, 5], [5332, 3002, 2700, 1565], 371),
+]
+
+
+@pytest.mark.parametrize('controller, seed, arrived, departed, total_wait, p95, max_queues, queue_sums, changes',
+                         REFERENCE_RUNS)
+def test_results_match_reference(controller, seed, arrived, departed, total_wait, p95, max_queues,
+                                 queue_sums, changes):
+    simulator = TrafficSimulator(controller(), ArrivalProcess(HEAVY_RATES, seed=seed))
+    simulator.run(1800)
+    metrics = simulator.metrics
+    assert metrics.total_vehicles_arrived == arrived
+    assert metrics.total_vehicles_departed == departed
+    assert metrics.wait_histogram.total == total_wait
+    assert metrics.get_percentile_wait_time(95) == pytest.approx(p95, abs=1e-9)
+    assert [metrics.max_queue_length[d] for d in Direction] == max_queues
+    assert metrics.queue_array().sum(axis=0).tolist() == queue_sums
+    history = metrics.phase_history
+    assert sum(a[1:] != b[1:] for a, b in zip(history, history[1:])) == changes
+    # Queued vehicles are the ones the store holds, in arrival order per lane
+    state = simulator.state
+    queued = sum(len(queue) for queue in state.lane_queues)
+    assert queued == len(state.vehicles) == arrived - departed
+    for queue in state.lane_queues:
+        times = state.vehicles.arrival_time[queue.to_array()]
+        assert (times[1:] >= times[:-1]).all()
+
+
+@pytest.mark.parametrize('dt', [0.1, 0.7])
+def test_run_until_precision_stops_at_max_duration(make_simulator, dt):
+    # Unreachable target: the run must end at max_duration even though
+    # accumulated float time stops just short of it
+    simulator = make_simulator(dt)
+    simulator.run_until_precision(0.0, min_duration=20.0, max_duration=100.0, check_every=30.0)
+    assert simulator.current_time == pytest.approx(100.0, abs=dt)
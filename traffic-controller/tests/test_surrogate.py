@@ -0,0 +1,38 @@
+"""Surrogate predictions of nonnegative metrics stay nonnegative."""
+import itertools
+import numpy as np
+import pytest
+from simulation.models import Direction
+from simulation.run_cache import simulate
+from simulation.surrogate import METRICS, Surrogate, sample_specs
+
+
+@pytest.fixture(scope='module')
+def surrogate():
+    results = [simulate(spec) for spec in sample_specs('adaptive', 40, duration=300, seed=0)]
+    return Surrogate.fit(results, 'adaptive', iterations=50)
+
+
+def test_predictions_and_intervals_are_nonnegative(surrogate):
+    # Corners of the training box, where light traffic pushes waits and queues towards zero
+    corners = np.array(list(itertools.product(*zip(surrogate.lower, surrogate.upper))))
+    means, stds, _ = surrogate.predict_many(corners)
+    assert np.all(means >= 0)
+    assert np.all(stds >= 0)
+
+    low = surrogate.lower
+    n_rates = len(Direction)
+    prediction = surrogate.predict(dict(zip(Direction, low[:n_rates])),
+                                   dict(zip(surrogate.parameters, low[n_rates:-1])), low[-1])
+    for metric in METRICS:
+        assert prediction.mean[metric] >= 0
+        lower, upper = prediction.interval(metric)
+        assert 0 <= lower <= prediction.mean[metric] <= upper
+
+
+def test_save_and_load_keep_predictions(surrogate, tmp_path):
+    path = tmp_path / 'surrogate.npz'
+    surrogate.save(str(path))
+    loaded = Surrogate.load(str(path))
+    features = (surrogate.lower + surrogate.upper) / 2
+    np.testing.assert_allclose(loaded.predict_many(features)[0], surrogate.predict_many(features)[0])